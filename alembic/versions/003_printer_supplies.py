@@ -0,0 +1,35 @@
+"""printer supplies table
+
+Revision ID: 003
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "003"
+down_revision: Union[str, None] = "002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if "printer_supplies" in insp.get_table_names():
+        return
+    op.create_table(
+        "printer_supplies",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("printer_id", sa.Integer(), sa.ForeignKey("printers.id", ondelete="CASCADE"), nullable=False),
+        sa.Column("supply_index", sa.Integer(), nullable=False),
+        sa.Column("kind", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("level_percent", sa.Integer(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=True),
+        sa.UniqueConstraint("printer_id", "supply_index", name="uq_printer_supplies_printer_index"),
+    )
+    op.create_index("ix_printer_supplies_printer_id", "printer_supplies", ["printer_id"])
+
+
+def downgrade() -> None:
+    op.drop_table("printer_supplies")
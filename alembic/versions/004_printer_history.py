@@ -0,0 +1,77 @@
+"""printer reading history and rollups
+
+Revision ID: 004
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "004"
+down_revision: Union[str, None] = "003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(dt: datetime) -> datetime:
+    return (_month_start(dt) + timedelta(days=32)).replace(day=1)
+
+
+def _create_month_partition(month: datetime) -> None:
+    # Same naming as services.history, whose maintenance job takes over from here
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS printer_readings_y{month.year:04d}m{month.month:02d} "
+        f"PARTITION OF printer_readings "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    )
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    tables = set(insp.get_table_names())
+    postgres = conn.dialect.name == "postgresql"
+
+    if "printer_readings" not in tables:
+        # Postgres: range-partitioned by month so retention drops whole partitions
+        op.create_table(
+            "printer_readings",
+            sa.Column("printer_id", sa.Integer(), primary_key=True),
+            sa.Column("ts", sa.DateTime(), primary_key=True),
+            sa.Column("source", sa.String(), nullable=False),
+            sa.Column("ok", sa.Boolean(), nullable=False),
+            sa.Column("toner_level", sa.Integer(), nullable=True),
+            sa.Column("status", sa.String(), nullable=True),
+            sa.Column("status_detail", sa.String(), nullable=True),
+            postgresql_partition_by="RANGE (ts)",
+        )
+        op.create_index("ix_printer_readings_ts", "printer_readings", ["ts"])
+        if postgres:
+            # DEFAULT catches rows if maintenance ever falls behind on creating months
+            op.execute("CREATE TABLE IF NOT EXISTS printer_readings_default PARTITION OF printer_readings DEFAULT")
+            month = _month_start(datetime.utcnow())
+            _create_month_partition(month)
+            _create_month_partition(_next_month(month))
+
+    if "printer_reading_rollups" not in tables:
+        op.create_table(
+            "printer_reading_rollups",
+            sa.Column("printer_id", sa.Integer(), primary_key=True),
+            sa.Column("resolution", sa.String(), primary_key=True),
+            sa.Column("bucket", sa.DateTime(), primary_key=True),
+            sa.Column("toner_min", sa.Integer(), nullable=True),
+            sa.Column("toner_max", sa.Integer(), nullable=True),
+            sa.Column("toner_last", sa.Integer(), nullable=True),
+            sa.Column("status_last", sa.String(), nullable=True),
+            sa.Column("samples", sa.Integer(), nullable=False, server_default="0"),
+            sa.Column("failures", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("printer_reading_rollups")
+    op.drop_table("printer_readings")
@@ -0,0 +1,32 @@
+"""printer depletion forecasts
+
+Revision ID: 005
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "005"
+down_revision: Union[str, None] = "004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if "printer_forecasts" in insp.get_table_names():
+        return
+    op.create_table(
+        "printer_forecasts",
+        sa.Column("printer_id", sa.Integer(), sa.ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("forecast_empty_at", sa.DateTime(), nullable=True),
+        sa.Column("slope_per_day", sa.Float(), nullable=True),
+        sa.Column("confidence", sa.Float(), nullable=True),
+        sa.Column("samples", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("computed_at", sa.DateTime(), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("printer_forecasts")
@@ -0,0 +1,43 @@
+"""indexes for keyset pagination and list filters
+
+Revision ID: 006
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "006"
+down_revision: Union[str, None] = "005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if "printers" not in insp.get_table_names():
+        return
+
+    # Expression indexes must match models.PRINTER_SORT_KEYS verbatim to be used.
+    # IF NOT EXISTS: the inspector does not report expression indexes on SQLite.
+    for name, columns in (
+        ("ix_printers_location", "location"),
+        ("ix_printers_connection_mode", "connection_mode"),
+        ("ix_printers_department", "department"),
+        ("ix_printers_name_id", "name, id"),
+        ("ix_printers_toner_sort", "coalesce(toner_level, -1), id"),
+        ("ix_printers_verified_sort", "coalesce(last_verified_at, '0001-01-01 00:00:00'), id"),
+    ):
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON printers ({columns})")
+
+
+def downgrade() -> None:
+    for name in (
+        "ix_printers_verified_sort",
+        "ix_printers_toner_sort",
+        "ix_printers_name_id",
+        "ix_printers_department",
+        "ix_printers_connection_mode",
+        "ix_printers_location",
+    ):
+        op.drop_index(name, table_name="printers")
@@ -0,0 +1,59 @@
+"""materialized effective status columns on printers
+
+Revision ID: 007
+"""
+from datetime import datetime, timedelta
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "007"
+down_revision: Union[str, None] = "006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if "printers" not in insp.get_table_names():
+        return
+    cols = {c["name"] for c in insp.get_columns("printers")}
+    indexes = {ix["name"] for ix in insp.get_indexes("printers")}
+
+    if "effective_status" not in cols:
+        op.add_column("printers", sa.Column("effective_status", sa.String(), server_default="unknown", nullable=False))
+    if "is_stale" not in cols:
+        op.add_column("printers", sa.Column("is_stale", sa.Boolean(), server_default=sa.false(), nullable=False))
+    if "ix_printers_effective_status" not in indexes:
+        op.create_index("ix_printers_effective_status", "printers", ["effective_status"])
+    if "ix_printers_is_stale" not in indexes:
+        op.create_index("ix_printers_is_stale", "printers", ["is_stale"])
+
+    # Backfill with the CASE the write paths use (services.printer_status),
+    # frozen here as of this revision: stale after 7 days, failing after
+    # 3 unreachable attempts, low toner at or below 20%.
+    verified = "COALESCE(last_verified_at, last_checked)"
+    raw = "LOWER(COALESCE(status, 'unknown'))"
+    op.execute(
+        sa.text(
+            f"UPDATE printers SET "
+            f"effective_status = CASE "
+            f"WHEN {verified} < :stale_before THEN 'unknown' "
+            f"WHEN status_detail = 'unreachable' AND fail_streak >= 3 THEN 'unknown' "
+            f"WHEN toner_level IS NOT NULL AND toner_level <= 20 AND {verified} IS NOT NULL THEN 'low' "
+            f"WHEN {raw} = 'ok' THEN 'online' "
+            f"WHEN {raw} IN ('low', 'offline', 'online', 'unknown') THEN {raw} "
+            f"ELSE 'unknown' END, "
+            f"is_stale = CASE WHEN {verified} < :stale_before THEN TRUE ELSE FALSE END"
+        ).bindparams(
+            sa.bindparam("stale_before", datetime.utcnow() - timedelta(days=7), type_=sa.DateTime())
+        )
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_printers_is_stale", table_name="printers")
+    op.drop_index("ix_printers_effective_status", table_name="printers")
+    op.drop_column("printers", "is_stale")
+    op.drop_column("printers", "effective_status")
@@ -0,0 +1,51 @@
+"""fleet summary counters
+
+Revision ID: 008
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "008"
+down_revision: Union[str, None] = "007"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if "fleet_counters" not in insp.get_table_names():
+        op.create_table(
+            "fleet_counters",
+            sa.Column("dimension", sa.String(), primary_key=True),
+            sa.Column("key", sa.String(), primary_key=True),
+            sa.Column("metric", sa.String(), primary_key=True),
+            sa.Column("count", sa.Integer(), nullable=False, server_default="0"),
+        )
+
+    # Seed from the current fleet so the summary is right before the first
+    # reconcile: one INSERT ... SELECT per (dimension, metric), zero counts omitted
+    if "printers" not in insp.get_table_names():
+        return
+    status = (
+        "CASE WHEN effective_status IN ('online', 'low', 'offline', 'unknown') "
+        "THEN effective_status ELSE 'unknown' END"
+    )
+    op.execute("DELETE FROM fleet_counters")
+    metrics = [("total", "1 = 1"), ("stale", "is_stale")]
+    metrics += [(m, f"{status} = '{m}'") for m in ("online", "low", "offline", "unknown")]
+    for dimension, key in (("all", None), ("department", "COALESCE(department, '')"),
+                           ("location", "COALESCE(location, '')")):
+        group_by = f" GROUP BY {key}" if key else ""
+        for metric, cond in metrics:
+            op.execute(
+                f"INSERT INTO fleet_counters (dimension, key, metric, count) "
+                f"SELECT '{dimension}', t.k, '{metric}', t.n FROM ("
+                f"SELECT {key or repr('')} AS k, COUNT(*) AS n FROM printers WHERE {cond}{group_by}"
+                f") t WHERE t.n > 0"
+            )
+
+
+def downgrade() -> None:
+    op.drop_table("fleet_counters")
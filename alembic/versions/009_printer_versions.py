@@ -0,0 +1,34 @@
+"""printer row version and fleet version for conditional GETs
+
+Revision ID: 009
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "009"
+down_revision: Union[str, None] = "008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    conn = op.get_bind()
+    insp = sa.inspect(conn)
+    if "printers" in insp.get_table_names():
+        cols = {c["name"] for c in insp.get_columns("printers")}
+        if "version" not in cols:
+            op.add_column("printers", sa.Column("version", sa.Integer(), server_default="1", nullable=False))
+    if "fleet_version" not in insp.get_table_names():
+        op.create_table(
+            "fleet_version",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+        )
+    if not conn.execute(sa.text("SELECT 1 FROM fleet_version WHERE id = 1")).first():
+        conn.execute(sa.text("INSERT INTO fleet_version (id, version) VALUES (1, 1)"))
+
+
+def downgrade() -> None:
+    op.drop_table("fleet_version")
+    op.drop_column("printers", "version")
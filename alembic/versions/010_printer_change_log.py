@@ -0,0 +1,31 @@
+"""printer change log for delta sync
+
+Revision ID: 010
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "010"
+down_revision: Union[str, None] = "009"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    insp = sa.inspect(op.get_bind())
+    if "printer_change_log" in insp.get_table_names():
+        return
+    op.create_table(
+        "printer_change_log",
+        sa.Column("version", sa.Integer(), primary_key=True),
+        sa.Column("printer_id", sa.Integer(), primary_key=True),
+        sa.Column("deleted", sa.Boolean(), nullable=False, server_default=sa.false()),
+        sa.Column("changed_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_printer_change_log_printer_id", "printer_change_log", ["printer_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_printer_change_log_printer_id", table_name="printer_change_log")
+    op.drop_table("printer_change_log")
@@ -0,0 +1,27 @@
+"""alert engine: open-alert lookup index and resolved_at
+
+Revision ID: 011
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "011"
+down_revision: Union[str, None] = "010"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    insp = sa.inspect(op.get_bind())
+    if "alerts" not in insp.get_table_names():
+        return
+    if "resolved_at" not in {c["name"] for c in insp.get_columns("alerts")}:
+        op.add_column("alerts", sa.Column("resolved_at", sa.DateTime(), nullable=True))
+    if "ix_alerts_printer_type_resolved" not in {ix["name"] for ix in insp.get_indexes("alerts")}:
+        op.create_index("ix_alerts_printer_type_resolved", "alerts", ["printer_id", "alert_type", "resolved"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_alerts_printer_type_resolved", table_name="alerts")
+    op.drop_column("alerts", "resolved_at")
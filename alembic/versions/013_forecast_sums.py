@@ -0,0 +1,44 @@
+"""running regression sums for the toner forecast, rollup bucket index
+
+Revision ID: 013
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+revision: str = "013"
+down_revision: Union[str, None] = "012"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    insp = sa.inspect(op.get_bind())
+    # Covering index for the forecast's per-hour reads across the fleet
+    if "ix_printer_reading_rollups_bucket" not in {ix["name"] for ix in insp.get_indexes("printer_reading_rollups")}:
+        op.create_index(
+            "ix_printer_reading_rollups_bucket",
+            "printer_reading_rollups",
+            ["resolution", "bucket", "printer_id", "toner_last"],
+        )
+    if "printer_forecast_sums" in insp.get_table_names():
+        return
+    # Filled by the first forecast run (one pass over the window), then incremental
+    op.create_table(
+        "printer_forecast_sums",
+        sa.Column("printer_id", sa.Integer(), primary_key=True),
+        sa.Column("segment_start", sa.BigInteger(), nullable=False),
+        sa.Column("last_hour", sa.BigInteger(), nullable=False),
+        sa.Column("last_level", sa.Integer(), nullable=False),
+        sa.Column("n", sa.BigInteger(), nullable=False),
+        sa.Column("sx", sa.BigInteger(), nullable=False),
+        sa.Column("sy", sa.BigInteger(), nullable=False),
+        sa.Column("sxx", sa.BigInteger(), nullable=False),
+        sa.Column("sxy", sa.BigInteger(), nullable=False),
+        sa.Column("syy", sa.BigInteger(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("printer_forecast_sums")
+    op.drop_index("ix_printer_reading_rollups_bucket", table_name="printer_reading_rollups")
@@ -1,5 +1,8 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, tuple_
 from datetime import datetime, timezone
+import base64
+import json
 import models
 from schemas import PrinterCreate, UserCreate, JobCreate, AlertCreate
 from auth import get_password_hash
@@ -35,23 +38,22 @@ def get_users(db: Session):
     return db.query(models.User).all()
 
 
-def create_printer(db: Session, printer: PrinterCreate):
+def _printer_row(printer: PrinterCreate, now: datetime, status_detail: str | None = None) -> dict:
+    """Column values for a new printer (everything but id and version)."""
     data = printer.model_dump() if hasattr(printer, "model_dump") else printer.dict()
     # Creation is not verification — clocks stay null until first status/toner write
     data["last_checked"] = None
     data["last_verified_at"] = None
     data["last_attempt_at"] = None
     data["fail_streak"] = 0
-    data["status_detail"] = None
+    data["status_detail"] = status_detail
 
     # Toner/status rules apply for every connection_mode on create
     if data.get("toner_level") is not None:
         from services.printer_status import normalize_toner_status
-        from datetime import datetime
         tl, st = normalize_toner_status(data["toner_level"], data.get("status"))
         data["toner_level"] = tl
         data["status"] = st or "online"
-        now = datetime.utcnow()
         data["last_verified_at"] = now
         data["last_checked"] = now
     else:
@@ -59,36 +61,238 @@ def create_printer(db: Session, printer: PrinterCreate):
         data["toner_level"] = None
 
     allowed = {c.name for c in models.Printer.__table__.columns}
-    payload = {k: v for k, v in data.items() if k in allowed}
-    db_printer = models.Printer(**payload)
+    row = {k: v for k, v in data.items() if k in allowed}
+    from services.printer_status import materialize_status
+    probe = models.Printer(**row)
+    materialize_status(probe)
+    row["effective_status"] = probe.effective_status
+    row["is_stale"] = probe.is_stale
+    return row
+
+
+def create_printer(db: Session, printer: PrinterCreate, status_detail: str | None = None):
+    db_printer = models.Printer(**_printer_row(printer, datetime.utcnow(), status_detail))
+    from services.printer_changes import fleet_version, stage_changes
+    # Start above any version an earlier printer could have reached, so a
+    # reused id (SQLite) never matches a cached ETag/body of the deleted one
+    db_printer.version = fleet_version(db) + 1
     db.add(db_printer)
+    db.flush()  # id for the change hook
+    stage_changes(db, [(db_printer.id, None, db_printer)])
     db.commit()
     db.refresh(db_printer)
     return db_printer
 
 
+def create_printers(db: Session, printers, batch: int = 500) -> list[int]:
+    """
+    Many new printers in one transaction: multi-row INSERTs of `batch` rows
+    and a single change hook. printers: (PrinterCreate, status_detail or None)
+    pairs. Returns the new ids in input order.
+    """
+    from sqlalchemy import insert
+    from services.printer_changes import fleet_version, stage_changes
+    now = datetime.utcnow()
+    version = fleet_version(db) + 1  # see create_printer
+    rows = [{**_printer_row(p, now, detail), "version": version} for p, detail in printers]
+    if not rows:
+        return []
+    stmt = insert(models.Printer).returning(models.Printer.id, sort_by_parameter_order=True)
+    ids: list[int] = []
+    for i in range(0, len(rows), batch):
+        ids.extend(db.execute(stmt, rows[i:i + batch]).scalars())
+    stage_changes(db, [(pid, None, row) for pid, row in zip(ids, rows)])
+    db.commit()
+    return ids
+
+
+def count_printers(db: Session) -> int:
+    return db.query(func.count(models.Printer.id)).scalar()
+
+
 def get_printers(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Printer).offset(skip).limit(limit).all()
+    return db.query(models.Printer).order_by(models.Printer.id).offset(skip).limit(limit).all()
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(sort: str, descending: bool, value, printer_id: int) -> str:
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([sort, descending, value, printer_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, descending: bool):
+    """Returns (value, id). Raises InvalidCursor if malformed or from another sort."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        c_sort, c_desc, value, printer_id = json.loads(base64.urlsafe_b64decode(padded))
+        if sort == "last_verified_at":
+            value = datetime.fromisoformat(value)
+        printer_id = int(printer_id)
+    except Exception:
+        raise InvalidCursor("Malformed cursor")
+    if c_sort != sort or bool(c_desc) != descending:
+        raise InvalidCursor("Cursor does not match sort/order")
+    return value, printer_id
+
+
+def printer_sort_value(printer: models.Printer, sort: str):
+    """Python twin of models.PRINTER_SORT_KEYS, for building the next cursor."""
+    if sort == "toner_level":
+        return -1 if printer.toner_level is None else printer.toner_level
+    if sort == "last_verified_at":
+        return printer.last_verified_at or models.NEVER_VERIFIED
+    return getattr(printer, sort)
+
+
+def filter_printers(
+    q,
+    *,
+    status: str | None = None,
+    department: str | None = None,
+    location: str | None = None,
+    connection_mode: str | None = None,
+    stale: bool | None = None,
+    toner_below: int | None = None,
+):
+    """GET /printers filters, applied to any query/select over printers."""
+    p = models.Printer
+    if status is not None:
+        q = q.filter(p.effective_status == status)
+    if department is not None:
+        q = q.filter(p.department == department)
+    if location is not None:
+        q = q.filter(p.location == location)
+    if connection_mode is not None:
+        q = q.filter(p.connection_mode == connection_mode)
+    if stale is not None:
+        q = q.filter(p.is_stale.is_(stale))
+    if toner_below is not None:
+        q = q.filter(p.toner_level < toner_below)
+    return q
+
+
+def iter_printers(db: Session, *, after_id: int | None = None, batch: int = 1000, **filters):
+    """Filtered printers in id order, streamed in batches (server-side cursor on Postgres)."""
+    p = models.Printer
+    q = filter_printers(db.query(p), **filters)
+    if after_id is not None:
+        q = q.filter(p.id > after_id)
+    return q.order_by(p.id).yield_per(batch)
+
+
+def list_printers_page(
+    db: Session,
+    *,
+    limit: int = 100,
+    cursor: str | None = None,
+    sort: str = "id",
+    descending: bool = False,
+    status: str | None = None,
+    department: str | None = None,
+    location: str | None = None,
+    connection_mode: str | None = None,
+    stale: bool | None = None,
+    toner_below: int | None = None,
+):
+    """
+    Keyset page of printers. Returns (rows, next_cursor or None).
+
+    Order is (sort key, id) — total and stable — and the cursor carries the
+    last row's key, so page N costs the same index range scan as page 1.
+    """
+    p = models.Printer
+    key = models.PRINTER_SORT_KEYS[sort]
+    q = filter_printers(
+        db.query(p),
+        status=status,
+        department=department,
+        location=location,
+        connection_mode=connection_mode,
+        stale=stale,
+        toner_below=toner_below,
+    )
+
+    if cursor:
+        value, after_id = decode_cursor(cursor, sort, descending)
+        if sort == "last_verified_at" and value == models.NEVER_VERIFIED:
+            value = models.NEVER_VERIFIED_SQL
+        if sort == "id":
+            q = q.filter(p.id < after_id if descending else p.id > after_id)
+        elif descending:
+            q = q.filter(tuple_(key, p.id) < tuple_(value, after_id))
+        else:
+            q = q.filter(tuple_(key, p.id) > tuple_(value, after_id))
+
+    if sort == "id":
+        order = [p.id.desc() if descending else p.id]
+    else:
+        order = [key.desc(), p.id.desc()] if descending else [key, p.id]
+    rows = q.order_by(*order).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort, descending, printer_sort_value(last, sort), last.id)
+    return rows, next_cursor
 
 
 def get_printer(db: Session, printer_id: int):
     return db.query(models.Printer).filter(models.Printer.id == printer_id).first()
 
 
+def get_printers_by_ids(db: Session, printer_ids):
+    """Printers with the given ids in one IN query, ordered by id (missing ids are absent)."""
+    ids = list(set(printer_ids))
+    if not ids:
+        return []
+    return db.query(models.Printer).filter(models.Printer.id.in_(ids)).order_by(models.Printer.id).all()
+
+
+def get_printer_ips(db: Session, printer_ids) -> dict:
+    """{id: ip_address} for the given ids in one IN query (missing ids are absent)."""
+    ids = list(set(printer_ids))
+    if not ids:
+        return {}
+    rows = (
+        db.query(models.Printer.id, models.Printer.ip_address)
+        .filter(models.Printer.id.in_(ids))
+        .all()
+    )
+    return {pid: ip for pid, ip in rows}
+
+
 def update_printer(db: Session, printer: models.Printer, updates: dict):
     """Metadata-only updates.
 
-    Never sets last_verified_at, last_attempt_at, last_checked, or fail_streak.
+    Never sets last_verified_at, last_attempt_at, last_checked, or fail_streak
+    (nor the materialized effective_status/is_stale or the row version, which
+    are recomputed/bumped here).
     Those belong exclusively to services.printer_status (direct ORM or atomic SQL).
     Passing them here is ignored so a dict-based call cannot fake verification
     or silently drop a streak reset that the caller thought was applied.
     """
-    protected = {"last_checked", "last_verified_at", "last_attempt_at", "fail_streak"}
+    from services.printer_status import PROTECTED_FIELDS, materialize_status
+    from services import fleet_counters
+    from services.printer_changes import stage_changes
+    before = fleet_counters.snapshot(printer)
     for key, value in updates.items():
-        if key in protected:
+        if key in PROTECTED_FIELDS:
             continue
         if hasattr(printer, key):
             setattr(printer, key, value)
+    # Bumped in SQL, not from the loaded value: a stale object would otherwise
+    # write a version another request already used (and a wrong 304 follows).
+    # The flush expires it; stage_changes reads the real one back.
+    printer.version = models.Printer.version + 1
+    materialize_status(printer)
+    db.flush()
+    stage_changes(db, [(printer.id, before, printer)])
     db.commit()
     db.refresh(printer)
     return printer
@@ -97,6 +301,14 @@ def update_printer(db: Session, printer: models.Printer, updates: dict):
 def delete_printer(db: Session, printer_id: int):
     printer = get_printer(db, printer_id)
     if printer:
+        from services import fleet_counters
+        from services.printer_changes import stage_changes
+        stage_changes(db, [(printer_id, fleet_counters.snapshot(printer), None)])
+        # SQLite does not enforce ON DELETE CASCADE without PRAGMA foreign_keys
+        for dependent in (models.PrinterSupply, models.PrinterForecast, models.Alert):
+            db.query(dependent).filter(
+                dependent.printer_id == printer_id
+            ).delete(synchronize_session=False)
         db.delete(printer)
         db.commit()
         return True
@@ -1,4 +1,6 @@
+import asyncio
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import FastAPI, Depends, HTTPException, status
@@ -29,6 +31,7 @@ from schemas import UserCreate, UserResponse, Token, TrustInfo, TrustChoice, Tru
 from crud import create_user, get_user_by_login, get_users, get_trust, set_trust
 from routers.printers import router as printers_router
 from routers.agent import router as agent_router
+from routers.export import router as export_router
 
 # Fail fast if secrets missing (production)
 _env = os.getenv("ENV", os.getenv("RENDER", "") and "production" or "development")
@@ -53,7 +56,27 @@ except Exception as _mig_err:
     import logging
     logging.getLogger("uvicorn.error").warning("Alembic upgrade skipped: %s", _mig_err)
 
-app = FastAPI(title="TonerTrack", version="1.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    from services.maintenance import MAINTENANCE_INTERVAL_SECONDS, maintenance_loop
+    from services.read_cache import read_cache
+    from services import notifications
+
+    tasks = []
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        tasks.append(asyncio.create_task(maintenance_loop()))
+    if notifications.enabled():
+        tasks.append(asyncio.create_task(notifications.dispatcher_loop()))
+    read_cache.start_listener(engine)
+    yield
+    read_cache.stop_listener()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+app = FastAPI(title="TonerTrack", version="1.0.0", lifespan=lifespan)
 
 _cors = os.getenv(
     "CORS_ORIGINS",
@@ -71,6 +94,7 @@ app.add_middleware(
 
 app.include_router(printers_router)
 app.include_router(agent_router)
+app.include_router(export_router)
 
 
 @app.get("/health")
@@ -1,5 +1,7 @@
-from sqlalchemy import Column, Integer, String, JSON, DateTime, Float, ForeignKey, Boolean
+from sqlalchemy import BigInteger, Column, Integer, String, JSON, DateTime, Float, ForeignKey, Boolean, UniqueConstraint, Index, literal_column
+from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime
 from database import Base
 
 
@@ -15,7 +17,7 @@ class Printer(Base):
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=False)
     ip_address = Column(String, index=True)
-    location = Column(String, default="")
+    location = Column(String, default="", index=True)
     status = Column(String, default="unknown")
     status_detail = Column(String, nullable=True)  # unreachable | device_reported | None
     toner_level = Column(Integer, nullable=True)
@@ -26,13 +28,171 @@ class Printer(Base):
     last_verified_at = Column(DateTime, nullable=True)
     last_attempt_at = Column(DateTime, nullable=True)
     fail_streak = Column(Integer, default=0, nullable=False)
-    connection_mode = Column(String, default="manual")
+    # Materialized effective_status()/stale — kept current by every status write
+    # and the stale sweeper so filters and counts are plain indexed SQL
+    effective_status = Column(String, default="unknown", nullable=False, index=True)
+    is_stale = Column(Boolean, default=False, nullable=False, index=True)
+    # Row version for ETags; every write path bumps it (see services.printer_changes)
+    version = Column(Integer, default=1, nullable=False)
+    connection_mode = Column(String, default="manual", index=True)
     snmp_community = Column(String, default="public")
-    department = Column(String, default="")
+    department = Column(String, default="", index=True)
     access_type = Column(String, default="public")
     allowed_users = Column(JSON, default=list)
     notes = Column(String, default="")
 
+    # Precomputed by services.forecast; loaded with the row so serialization never fits
+    forecast = relationship("PrinterForecast", uselist=False, lazy="joined", viewonly=True)
+
+
+# Keyset sort keys for GET /printers. NULLs are coalesced to a literal sentinel
+# (sorts first ascending) so (key, id) is total; the indexes below are built
+# on exactly these expressions — queries must use them verbatim to hit them.
+# NEVER_VERIFIED_SQL is the one sentinel in SQL: cursors compare against it too,
+# since a bound NEVER_VERIFIED renders as different text on SQLite.
+NEVER_VERIFIED = datetime(1, 1, 1)
+NEVER_VERIFIED_SQL = literal_column("'0001-01-01 00:00:00'")
+PRINTER_SORT_KEYS = {
+    "id": Printer.id,
+    "name": Printer.name,
+    "toner_level": func.coalesce(Printer.toner_level, literal_column("-1")),
+    "last_verified_at": func.coalesce(Printer.last_verified_at, NEVER_VERIFIED_SQL),
+}
+Index("ix_printers_name_id", PRINTER_SORT_KEYS["name"], Printer.id)
+Index("ix_printers_toner_sort", PRINTER_SORT_KEYS["toner_level"], Printer.id)
+Index("ix_printers_verified_sort", PRINTER_SORT_KEYS["last_verified_at"], Printer.id)
+
+
+class PrinterSupply(Base):
+    """Latest Printer-MIB supply reading, one row per (printer, supply index).
+
+    Replaced wholesale on each agent report that carries supplies, so this
+    stays one small row per cartridge/drum/waste box rather than a log.
+    """
+    __tablename__ = "printer_supplies"
+    __table_args__ = (UniqueConstraint("printer_id", "supply_index", name="uq_printer_supplies_printer_index"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), nullable=False, index=True)
+    supply_index = Column(Integer, nullable=False)
+    kind = Column(String, default="other")  # black | cyan | magenta | yellow | drum | waste | other
+    description = Column(String, default="")
+    level_percent = Column(Integer, nullable=True)  # None = device reports unknown
+    updated_at = Column(DateTime, nullable=True)
+
+
+class PrinterReading(Base):
+    """Append-only status/toner observation, written by human and agent paths.
+
+    Primary key (printer_id, ts) doubles as the per-printer time index. On
+    Postgres the table is range-partitioned by month on ts so retention can
+    drop whole partitions (see services.history).
+    """
+    __tablename__ = "printer_readings"
+    __table_args__ = (
+        Index("ix_printer_readings_ts", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+    printer_id = Column(Integer, primary_key=True)
+    ts = Column(DateTime, primary_key=True)
+    source = Column(String, nullable=False)  # human | agent
+    ok = Column(Boolean, nullable=False, default=True)
+    toner_level = Column(Integer, nullable=True)
+    status = Column(String, nullable=True)
+    status_detail = Column(String, nullable=True)
+
+
+class PrinterReadingRollup(Base):
+    """Hourly/daily min/max/last aggregates of printer_readings.
+
+    ix_printer_reading_rollups_bucket covers the forecast's reads (one hour
+    across the fleet) so they never touch the table.
+    """
+    __tablename__ = "printer_reading_rollups"
+    __table_args__ = (
+        Index("ix_printer_reading_rollups_bucket", "resolution", "bucket", "printer_id", "toner_last"),
+    )
+
+    printer_id = Column(Integer, primary_key=True)
+    resolution = Column(String, primary_key=True)  # hour | day
+    bucket = Column(DateTime, primary_key=True)
+    toner_min = Column(Integer, nullable=True)
+    toner_max = Column(Integer, nullable=True)
+    toner_last = Column(Integer, nullable=True)
+    status_last = Column(String, nullable=True)
+    samples = Column(Integer, nullable=False, default=0)
+    failures = Column(Integer, nullable=False, default=0)
+
+
+class PrinterForecast(Base):
+    """Cached toner depletion forecast, recomputed fleet-wide by services.forecast."""
+    __tablename__ = "printer_forecasts"
+
+    printer_id = Column(Integer, ForeignKey("printers.id", ondelete="CASCADE"), primary_key=True)
+    forecast_empty_at = Column(DateTime, nullable=True)  # None = not depleting / not enough data
+    slope_per_day = Column(Float, nullable=True)  # toner points per day (negative = using toner)
+    confidence = Column(Float, nullable=True)  # 0..1
+    samples = Column(Integer, nullable=False, default=0)
+    computed_at = Column(DateTime, nullable=True)
+
+
+class PrinterForecastSums(Base):
+    """Running least-squares sums per printer for services.forecast.
+
+    Over the hourly rollups in the forecast window since the printer's last
+    refill; x is whole hours since forecast.EPOCH and y the toner level, so
+    every sum is an exact integer and adding/expiring hours never drifts.
+    """
+    __tablename__ = "printer_forecast_sums"
+
+    printer_id = Column(Integer, primary_key=True)
+    segment_start = Column(BigInteger, nullable=False)  # hour of the first point after the last refill
+    last_hour = Column(BigInteger, nullable=False)
+    last_level = Column(Integer, nullable=False)
+    n = Column(BigInteger, nullable=False)
+    sx = Column(BigInteger, nullable=False)
+    sy = Column(BigInteger, nullable=False)
+    sxx = Column(BigInteger, nullable=False)
+    sxy = Column(BigInteger, nullable=False)
+    syy = Column(BigInteger, nullable=False)
+
+
+class FleetCounter(Base):
+    """Incremental fleet summary counts (see services.fleet_counters).
+
+    dimension: all | department | location; key: department/location value
+    ("" for all); metric: total | online | low | offline | unknown | stale.
+    """
+    __tablename__ = "fleet_counters"
+
+    dimension = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    metric = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class FleetVersion(Base):
+    """Single row (id=1): bumped once per transaction that changes any printer."""
+    __tablename__ = "fleet_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+
+class PrinterChange(Base):
+    """Change log (outbox) for delta sync: which printers changed at which fleet version.
+
+    Written in the same transaction as the change (services.printer_changes);
+    compaction keeps only each printer's latest entry plus recent tombstones.
+    """
+    __tablename__ = "printer_change_log"
+
+    version = Column(Integer, primary_key=True)
+    printer_id = Column(Integer, primary_key=True, index=True)
+    deleted = Column(Boolean, nullable=False, default=False)
+    changed_at = Column(DateTime, nullable=False)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -58,7 +218,11 @@ class Job(Base):
 
 
 class Alert(Base):
+    """Raised and auto-resolved by services.alerts; at most one open per (printer, type)."""
     __tablename__ = "alerts"
+    __table_args__ = (
+        Index("ix_alerts_printer_type_resolved", "printer_id", "alert_type", "resolved"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     printer_id = Column(Integer, ForeignKey("printers.id"))
@@ -66,6 +230,30 @@ class Alert(Base):
     alert_type = Column(String, default="low_toner", index=True)
     timestamp = Column(DateTime, default=func.now())
     resolved = Column(Boolean, default=False)
+    resolved_at = Column(DateTime, nullable=True)
+
+
+class Notification(Base):
+    """Outbox: one row per (alert event, target), written with the alert and
+    delivered later by services.notifications. payload is self-contained so a
+    deleted alert/printer does not strand its notification.
+    """
+    __tablename__ = "notification_outbox"
+    __table_args__ = (
+        Index("ix_notification_outbox_due", "state", "next_attempt_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    alert_id = Column(Integer, nullable=True)
+    event = Column(String, nullable=False)  # raised | resolved
+    target = Column(String, nullable=False)  # mailto:addr | http(s)://url
+    payload = Column(JSON, nullable=False)
+    state = Column(String, nullable=False, default="pending")  # pending | sent | failed
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False)
+    last_error = Column(String, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    sent_at = Column(DateTime, nullable=True)
 
 
 class Setting(Base):
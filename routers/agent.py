@@ -7,14 +7,16 @@ from sqlalchemy.orm import Session
 
 from database import get_db
 from auth import get_current_user, UserInDB
-from crud import get_printer
+from crud import get_printer, get_printer_ips
 from schemas import (
     AgentReportRequest,
+    AgentReportBatch,
+    AgentReportBatchResponse,
     AgentTokenCreate,
     AgentTokenPublic,
     AgentTokenCreated,
 )
-from services.printer_status import apply_agent_result
+from services.printer_status import apply_agent_result, apply_agent_results
 from services.agent_tokens import (
     create_agent_token,
     revoke_agent_token,
@@ -126,6 +128,8 @@ def agent_report(
     if not printer.ip_address:
         raise HTTPException(status_code=400, detail="Printer has no IP on allow-list")
 
+    # Rides on the status write's commit — one transaction per report
+    touch_last_used(db, agent, commit=False)
     updated = apply_agent_result(
         db,
         printer,
@@ -133,6 +137,43 @@ def agent_report(
         status=body.status,
         toner_level=body.toner_level,
         status_detail=body.status_detail,
+        supplies=body.supplies,
     )
-    touch_last_used(db, agent)
     return _serialize(updated)
+
+
+@router.post("/reports", response_model=AgentReportBatchResponse, response_model_exclude_none=True)
+def agent_reports(
+    body: AgentReportBatch,
+    db: Session = Depends(get_db),
+    agent: models.AgentToken = Depends(get_agent_from_header),
+):
+    """
+    Batched agent ingest: one auth check, one printer lookup, one transaction.
+    Same allow-list rules as /agent/report, reported per item instead of as
+    HTTP errors so one bad row does not sink the sweep.
+    """
+    reports = body.reports
+    ips = get_printer_ips(db, (r.printer_id for r in reports))
+
+    errors: list[Optional[str]] = [None] * len(reports)
+    valid: list[int] = []
+    for i, r in enumerate(reports):
+        if r.printer_id not in ips:
+            errors[i] = "printer_not_found"
+        elif not ips[r.printer_id]:
+            errors[i] = "no_ip"
+        else:
+            valid.append(i)
+
+    touch_last_used(db, agent, commit=False)
+    applied = apply_agent_results(db, [reports[i] for i in valid])
+    for i, err in zip(valid, applied):
+        errors[i] = err
+
+    results = [
+        {"printer_id": r.printer_id, "accepted": err is None, "error": err}
+        for r, err in zip(reports, errors)
+    ]
+    accepted = sum(1 for err in errors if err is None)
+    return {"accepted": accepted, "rejected": len(reports) - accepted, "results": results}
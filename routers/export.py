@@ -0,0 +1,231 @@
+"""Streaming exports (NDJSON / CSV) — memory stays flat regardless of row count."""
+import csv
+import io
+import os
+import tempfile
+from datetime import datetime
+from typing import Callable, Iterable, Iterator, Optional
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import FileResponse, StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+
+from auth import get_current_user, UserInDB
+from crud import filter_printers, iter_printers
+from database import SessionLocal, get_db
+from routers.printers import _naive_utc, _serialize
+from schemas import PrinterResponse
+from services import columnar
+from services.history import RAW_EXPORT_FIELDS, RESOLUTIONS, ROLLUP_EXPORT_FIELDS, iter_export
+import models
+
+router = APIRouter(prefix="/export", tags=["export"])
+
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+PRINTER_EXPORT_FIELDS = tuple(PrinterResponse.model_fields)
+CHUNK_ROWS = 500  # rows per write to the socket
+
+
+def _csv_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, list):
+        return ";".join(str(v) for v in value)
+    return "" if value is None else value
+
+
+def _encode(rows: Iterable[dict], fields: tuple, fmt: str) -> Iterator[bytes]:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(fields)
+        for i, row in enumerate(rows, 1):
+            writer.writerow([_csv_value(row[f]) for f in fields])
+            if i % CHUNK_ROWS == 0:
+                yield buf.getvalue().encode()
+                buf.seek(0)
+                buf.truncate()
+        yield buf.getvalue().encode()
+        return
+
+    chunk: list[bytes] = []
+    for row in rows:
+        chunk.append(orjson.dumps(row))
+        if len(chunk) >= CHUNK_ROWS:
+            yield b"\n".join(chunk) + b"\n"
+            chunk = []
+    if chunk:
+        yield b"\n".join(chunk) + b"\n"
+
+
+def _with_session(rows: Callable) -> Iterator[dict]:
+    """
+    The generator owns its session: the request's get_db session may be
+    closed before the body finishes streaming.
+    """
+    db = SessionLocal()
+    try:
+        yield from rows(db)
+    finally:
+        db.close()
+
+
+def _response(rows: Iterator[dict], fields: tuple, fmt: str, name: str) -> StreamingResponse:
+    filename = f"{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    return StreamingResponse(
+        _encode(rows, fields, fmt),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+def _check_format(fmt: str) -> None:
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+
+
+@router.get("/printers")
+def export_printers(
+    format: str = "ndjson",
+    after: Optional[int] = Query(None, description="Resume: last id received"),
+    status: Optional[str] = None,
+    department: Optional[str] = None,
+    location: Optional[str] = None,
+    connection_mode: Optional[str] = None,
+    stale: Optional[bool] = None,
+    toner_below: Optional[int] = Query(None, ge=0, le=101),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Whole fleet (same filters as GET /printers, same fields) in id order.
+    If a download breaks, repeat it with after=<last id received>.
+    """
+    _check_format(format)
+    filters = dict(
+        status=status,
+        department=department,
+        location=location,
+        connection_mode=connection_mode,
+        stale=stale,
+        toner_below=toner_below,
+    )
+
+    def rows(db):
+        now = datetime.utcnow()
+        for p in iter_printers(db, after_id=after, **filters):
+            yield _serialize(p, now)
+
+    return _response(_with_session(rows), PRINTER_EXPORT_FIELDS, format, "printers")
+
+
+def _parse_after(after: Optional[str]) -> Optional[tuple[int, datetime]]:
+    if not after:
+        return None
+    try:
+        pid, ts = after.split(",", 1)
+        return int(pid), _naive_utc(datetime.fromisoformat(ts))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="after must be <printer_id>,<ts> from the last row received")
+
+
+@router.get("/history")
+def export_history(
+    format: str = "ndjson",
+    resolution: str = "raw",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    printer_id: Optional[int] = None,
+    after: Optional[str] = Query(None, description="Resume: <printer_id>,<ts> of the last row received"),
+    status: Optional[str] = None,
+    department: Optional[str] = None,
+    location: Optional[str] = None,
+    connection_mode: Optional[str] = None,
+    stale: Optional[bool] = None,
+    toner_below: Optional[int] = Query(None, ge=0, le=101),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    History rows in (printer_id, ts) order. resolution=raw reads readings
+    (kept RAW_RETENTION_DAYS); hour/day read the rollups up to the last
+    complete hour. Printer filters are the GET /printers ones.
+    """
+    _check_format(format)
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="resolution must be raw, hour, or day")
+    resume = _parse_after(after)
+    filters = dict(
+        status=status,
+        department=department,
+        location=location,
+        connection_mode=connection_mode,
+        stale=stale,
+        toner_below=toner_below,
+    )
+    printer_ids = None
+    if printer_id is not None or any(v is not None for v in filters.values()):
+        printer_ids = filter_printers(select(models.Printer.id), **filters)
+        if printer_id is not None:
+            printer_ids = printer_ids.filter(models.Printer.id == printer_id)
+
+    def rows(db):
+        yield from iter_export(
+            db,
+            resolution,
+            start=_naive_utc(start),
+            end=_naive_utc(end),
+            printer_ids=printer_ids,
+            after=resume,
+        )
+
+    fields = RAW_EXPORT_FIELDS if resolution == "raw" else ROLLUP_EXPORT_FIELDS
+    return _response(_with_session(rows), fields, format, f"history-{resolution}")
+
+
+@router.get("/columnar/{dataset}")
+def export_columnar(
+    dataset: str,
+    format: str = "parquet",
+    resolution: str = "raw",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Admin: readings, jobs or alerts as one Parquet or Arrow IPC file for
+    analysis tools. readings take resolution=raw|hour|day (a year of history
+    lives in the rollups). Same as scripts/export_columnar.py.
+    """
+    if getattr(current_user, "role", None) != "admin":
+        raise HTTPException(status_code=403, detail="Admin only")
+    if not columnar.available():
+        raise HTTPException(status_code=501, detail="Columnar export needs pyarrow installed on the server")
+    if dataset not in columnar.DATASETS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    if format not in columnar.FORMATS:
+        raise HTTPException(status_code=400, detail="format must be parquet or arrow")
+    if resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="resolution must be raw, hour, or day")
+
+    # Parquet needs the whole file written (footer last) before it is useful,
+    # so build it on disk and send that rather than holding it in memory
+    fd, path = tempfile.mkstemp(suffix=f".{format}")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            columnar.write(
+                db, f, dataset, format,
+                resolution=resolution, start=_naive_utc(start), end=_naive_utc(end),
+            )
+    except BaseException:
+        os.unlink(path)
+        raise
+    name = dataset if dataset != "readings" else f"readings-{resolution}"
+    return FileResponse(
+        path,
+        media_type=columnar.FORMATS[format],
+        filename=f"{name}-{datetime.utcnow():%Y%m%d-%H%M%S}.{format}",
+        background=BackgroundTask(os.unlink, path),
+    )
@@ -1,17 +1,58 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, File, Header, HTTPException, Query, Request, Response, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import hashlib
+import orjson
 import logging
+import time
 
-from schemas import PrinterCreate, PrinterUpdate, PrinterResponse, PrinterList, ScanRequest
+from schemas import (
+    PrinterCreate,
+    PrinterUpdate,
+    PrinterResponse,
+    PrinterList,
+    ScanRequest,
+    SupplyResponse,
+    PrinterHistory,
+    FleetSummary,
+    PrinterChanges,
+    PrinterImportResult,
+    PrinterImportRowError,
+    PrinterBulkUpdate,
+    PrinterBulkResult,
+)
 from database import get_db
 from auth import get_current_user, UserInDB
-from crud import create_printer, get_printers, get_printer, update_printer, delete_printer
+from crud import (
+    create_printer,
+    create_printers,
+    count_printers,
+    filter_printers,
+    get_printers,
+    get_printer,
+    update_printer,
+    delete_printer,
+    list_printers_page,
+    get_printers_by_ids,
+    InvalidCursor,
+)
 from services.printer_status import (
     apply_human_status,
+    apply_human_updates,
     serialize_status_fields,
+    loaded_values,
     STALE_AFTER_DAYS,
 )
+from services.supplies import get_supplies
+from services.printer_import import ImportFileError, parse_row, read_rows
+from services.history import RESOLUTIONS, get_history, pick_resolution
+from services.fleet_counters import get_summary
+from services.printer_changes import CursorExpired, fleet_version, get_changes, row_version
+from services.read_cache import read_cache
+from services.printer_events import broadcaster
 import models
 
 logger = logging.getLogger(__name__)
@@ -22,32 +63,241 @@ router = APIRouter(prefix="/printers", tags=["printers"])
 FREE_PRINTER_CAP = 5
 
 
-def _serialize(p: models.Printer) -> dict:
+def _serialize(p: models.Printer, now: Optional[datetime] = None) -> dict:
+    now = now or datetime.utcnow()
+    d = loaded_values(p)
     base = {
-        "id": p.id,
-        "name": p.name,
-        "ip_address": p.ip_address,
-        "location": p.location or "",
-        "page_count": p.page_count or 0,
-        "connection_mode": p.connection_mode or "manual",
-        "department": p.department or "",
-        "access_type": p.access_type or "public",
-        "allowed_users": p.allowed_users or [],
-        "notes": getattr(p, "notes", None) or "",
+        "id": d["id"],
+        "name": d["name"],
+        "ip_address": d["ip_address"],
+        "location": d["location"] or "",
+        "page_count": d["page_count"] or 0,
+        "connection_mode": d["connection_mode"] or "manual",
+        "department": d["department"] or "",
+        "access_type": d["access_type"] or "public",
+        "allowed_users": d["allowed_users"] or [],
+        "notes": d["notes"] or "",
     }
-    base.update(serialize_status_fields(p))
+    base.update(serialize_status_fields(p, now))
+    base.update(_forecast_fields(p, now))
     return base
 
 
+def _serialize_page(rows, now: Optional[datetime] = None) -> list[dict]:
+    now = now or datetime.utcnow()
+    return [_serialize(p, now) for p in rows]
+
+
+def _forecast_fields(p: models.Printer, now: datetime) -> dict:
+    f = p.forecast
+    if f is None or f.forecast_empty_at is None:
+        return {"forecast_empty_at": None, "days_until_empty": None, "forecast_confidence": None}
+    days = (f.forecast_empty_at - now).total_seconds() / 86400.0
+    return {
+        "forecast_empty_at": f.forecast_empty_at.isoformat(),
+        "days_until_empty": round(max(days, 0.0), 1),
+        "forecast_confidence": f.confidence,
+    }
+
+
+SORT_FIELDS = set(models.PRINTER_SORT_KEYS)
+
+# Conditional GET: list tags carry the fleet version, detail tags the row
+# version too. Time-derived fields (days_since_update, days_until_empty) move
+# without a write, so every tag also rolls over each ETAG_MAX_AGE.
+ETAG_MAX_AGE = timedelta(hours=1)
+
+
+def _etag_epoch() -> int:
+    return int(time.time() // ETAG_MAX_AGE.total_seconds())
+
+
+def _if_none_match(request: Request) -> set[str]:
+    """Client tags, weak prefix dropped (a proxy may weaken ours when compressing)."""
+    header = request.headers.get("if-none-match") or ""
+    return {t.strip().removeprefix("W/") for t in header.split(",") if t.strip()}
+
+
+def _cache_headers(etag: str) -> dict:
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+
+def _not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=_cache_headers(etag))
+
+
+def _list_etag(request: Request, fleet: int) -> str:
+    query = hashlib.sha1(request.url.query.encode()).hexdigest()[:12]
+    return f'"f{fleet}.e{_etag_epoch()}.{query}"'
+
+
+def _encode(payload) -> bytes:
+    """
+    Fast path: _serialize() output is built here with exactly the response
+    model's fields and JSON-ready types, so it is encoded as-is instead of
+    being re-validated against PrinterResponse row by row.
+    """
+    return orjson.dumps(payload)
+
+
+def _detail_etag(printer_id: int, version: int, fleet: int, epoch: int) -> str:
+    return f'"p{printer_id}.r{version}.f{fleet}.e{epoch}"'
+
+
+def _parse_detail_etag(tag: str) -> Optional[tuple[int, int, int, int]]:
+    try:
+        p, r, f, e = tag.strip('"').split(".")
+        return int(p[1:]), int(r[1:]), int(f[1:]), int(e[1:])
+    except ValueError:
+        return None
+
+
 @router.get("/", response_model=PrinterList)
 def list_printers(
+    request: Request,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    department: Optional[str] = None,
+    location: Optional[str] = None,
+    connection_mode: Optional[str] = None,
+    stale: Optional[bool] = None,
+    toner_below: Optional[int] = Query(None, ge=0, le=101),
+    sort: str = "id",
+    order: str = "asc",
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user),
 ):
-    rows = get_printers(db, skip=skip, limit=limit)
-    return {"printers": [_serialize(p) for p in rows]}
+    """
+    Keyset-paginated fleet list. Follow next_cursor for further pages.
+    Filters and sort run in SQL; status filters on the effective (displayed) status.
+    skip is kept for older clients and ignored once a cursor is given.
+    If-None-Match with the current ETag gets 304 after one read of the fleet version;
+    unchanged pages are served from the worker's read cache.
+    """
+    if sort not in SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of {', '.join(sorted(SORT_FIELDS))}")
+    if order not in {"asc", "desc"}:
+        raise HTTPException(status_code=400, detail="order must be asc or desc")
+    filters = dict(
+        status=status,
+        department=department,
+        location=location,
+        connection_mode=connection_mode,
+        stale=stale,
+        toner_below=toner_below,
+    )
+    fleet = read_cache.fleet_version(db)
+    etag = _list_etag(request, fleet)
+    tags = _if_none_match(request)
+    if etag in tags or "*" in tags:
+        return _not_modified(etag)
+
+    def build() -> bytes:
+        if skip and not cursor and not any(v is not None for v in filters.values()) and sort == "id":
+            # Legacy offset paging
+            rows = get_printers(db, skip=skip, limit=limit)
+            return _encode({"printers": _serialize_page(rows)})
+        try:
+            rows, next_cursor = list_printers_page(
+                db, limit=limit, cursor=cursor, sort=sort, descending=order == "desc", **filters
+            )
+        except InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return _encode({"printers": _serialize_page(rows), "next_cursor": next_cursor})
+
+    body = read_cache.get(("list", request.url.query), (fleet, _etag_epoch()), build)
+    return Response(body, media_type="application/json", headers=_cache_headers(etag))
+
+
+@router.get("/summary", response_model=FleetSummary)
+def fleet_summary(
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Counts by effective status, department and location — read from counters, not rows."""
+    return get_summary(db)
+
+
+@router.get("/changes", response_model=PrinterChanges)
+def printer_changes(
+    since: Optional[int] = Query(None, ge=0),
+    limit: int = Query(500, ge=1, le=5000),
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Delta sync. Without since= only the current cursor comes back: take it,
+    fetch the full list, then call ?since=<cursor> and follow has_more.
+    410 means the cursor is older than the compacted log — start over.
+    """
+    if since is None:
+        return {"cursor": fleet_version(db), "printers": [], "deleted": []}
+    try:
+        cursor, has_more, changed = get_changes(db, since, limit)
+    except CursorExpired:
+        raise HTTPException(status_code=410, detail="Cursor expired: refetch the list and take a new cursor")
+    rows = get_printers_by_ids(db, changed)
+    found = {p.id for p in rows}
+    return Response(_encode({
+        "cursor": cursor,
+        "has_more": has_more,
+        "printers": _serialize_page(rows),
+        "deleted": sorted(set(changed) - found),
+    }), media_type="application/json")
+
+
+# Streams end after this long; EventSource reconnects with Last-Event-ID and
+# re-authenticates, so an expired or revoked JWT cannot keep a stream open.
+EVENTS_MAX_SECONDS = 900.0
+
+
+def _stream_user(
+    request: Request,
+    access_token: Optional[str] = Query(None),
+) -> UserInDB:
+    """Bearer header as usual; ?access_token= for browser EventSource, which cannot set headers."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        token = access_token
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated", headers={"WWW-Authenticate": "Bearer"})
+    return get_current_user(token)
+
+
+@router.get("/events")
+async def printer_events(
+    last_event_id: Optional[str] = Header(None),
+    current_user: UserInDB = Depends(_stream_user),
+):
+    """
+    Server-Sent Events: `printers` events carry compact deltas (status, toner,
+    clocks, version; `deleted` tombstones) for every committed write.
+    `resync` means the resume point is gone — refetch the list.
+    """
+    return StreamingResponse(
+        broadcaster.stream(last_event_id, max_seconds=EVENTS_MAX_SECONDS),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _initial_status_detail(mode: str, ip_address: Optional[str]) -> Optional[str]:
+    # Cloud must never dial customer printer IPs (private LAN is unreachable from
+    # Render; public/port-forward would still violate the trust model).
+    # Probing belongs on a local agent/one-shot inside the customer network.
+    # Hard off — not an RFC1918 conditional.
+    if mode == "manual" or not ip_address:
+        return None
+    logger.warning(
+        "Cloud probe disabled: skipped outbound check to %s (mode=%s). "
+        "Use a local agent or one-shot reporter on the office LAN.",
+        ip_address,
+        mode,
+    )
+    # Do not touch last_verified_at / fail_streak — nothing was verified or attempted on-LAN
+    return "probe_skipped_cloud_disabled"
 
 
 @router.post("/", response_model=PrinterResponse)
@@ -62,45 +312,186 @@ def add_printer(
         raise HTTPException(status_code=400, detail="connection_mode must be manual, snmp, web, or ping")
 
     # Free-tier hard cap (pilot). Pro flag can raise this later without changing the path.
-    existing = get_printers(db, skip=0, limit=1000)
-    if len(existing) >= FREE_PRINTER_CAP:
+    if count_printers(db) >= FREE_PRINTER_CAP:
         raise HTTPException(
             status_code=403,
             detail=f"Free plan allows up to {FREE_PRINTER_CAP} printers. Upgrade to Pro for a full office fleet.",
         )
 
-    created = create_printer(db, printer)
+    created = create_printer(db, printer, status_detail=_initial_status_detail(mode, printer.ip_address))
+    return _serialize(created)
 
-    # Cloud must never dial customer printer IPs (private LAN is unreachable from
-    # Render; public/port-forward would still violate the trust model).
-    # Probing belongs on a local agent/one-shot inside the customer network.
-    # Hard off — not an RFC1918 conditional.
-    if mode != "manual" and created.ip_address:
-        logger.warning(
-            "Cloud probe disabled: skipped outbound check to %s (mode=%s). "
-            "Use a local agent or one-shot reporter on the office LAN.",
-            created.ip_address,
-            mode,
-        )
-        created.status_detail = "probe_skipped_cloud_disabled"
-        # Do not touch last_verified_at / fail_streak — nothing was verified or attempted on-LAN
-        db.add(created)
-        db.commit()
-        db.refresh(created)
 
-    return _serialize(created)
+@router.post("/import", response_model=PrinterImportResult)
+def import_printers(
+    file: UploadFile = File(..., description="CSV or XLSX; header row of PrinterCreate field names"),
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Onboard a site in one request. Every row is validated like POST /printers;
+    valid rows are inserted together in one transaction, invalid ones come
+    back in errors (by spreadsheet row) and are skipped.
+    """
+    valid, errors = [], []
+    try:
+        for number, values in read_rows(file.file, file.filename):
+            try:
+                valid.append((number, parse_row(values)))
+            except ValueError as e:
+                errors.append(PrinterImportRowError(row=number, error=str(e)))
+    except ImportFileError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    room = max(FREE_PRINTER_CAP - count_printers(db), 0)
+    for number, _ in valid[room:]:
+        errors.append(PrinterImportRowError(
+            row=number,
+            error=f"Free plan allows up to {FREE_PRINTER_CAP} printers. Upgrade to Pro for a full office fleet.",
+        ))
+    valid = valid[:room]
+
+    ids = create_printers(db, [
+        (p, _initial_status_detail(p.connection_mode, p.ip_address)) for _, p in valid
+    ])
+    errors.sort(key=lambda e: e.row)
+    return PrinterImportResult(created=len(ids), rejected=len(errors), ids=ids, errors=errors)
 
 
 @router.get("/{printer_id}", response_model=PrinterResponse)
 def get_printer_details(
     printer_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: UserInDB = Depends(get_current_user),
 ):
-    printer = get_printer(db, printer_id)
-    if not printer:
+    """
+    Conditional: an unchanged fleet is answered 304 from the fleet version
+    alone; otherwise the row's version (not the row) decides.
+    """
+    fleet, epoch = read_cache.fleet_version(db), _etag_epoch()
+    seen = [
+        t for t in map(_parse_detail_etag, _if_none_match(request))
+        if t and t[0] == printer_id and t[3] == epoch
+    ]
+    for _, version, tag_fleet, _ in seen:
+        if tag_fleet == fleet:
+            return _not_modified(_detail_etag(printer_id, version, fleet, epoch))
+
+    version = row_version(db, printer_id)
+    if version is None:
         raise HTTPException(status_code=404, detail="Printer not found")
-    return _serialize(printer)
+    etag = _detail_etag(printer_id, version, fleet, epoch)
+    if any(t[1] == version for t in seen):
+        return _not_modified(etag)
+
+    def build() -> bytes:
+        printer = get_printer(db, printer_id)
+        if not printer:
+            raise HTTPException(status_code=404, detail="Printer not found")
+        return _encode(_serialize(printer))
+
+    body = read_cache.get(("printer", printer_id), (version, epoch), build)
+    return Response(body, media_type="application/json", headers=_cache_headers(etag))
+
+
+@router.get("/{printer_id}/supplies", response_model=list[SupplyResponse])
+def get_printer_supplies(
+    printer_id: int,
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Per-supply levels from the last agent report that included them."""
+    if not get_printer(db, printer_id):
+        raise HTTPException(status_code=404, detail="Printer not found")
+    return [
+        {
+            "index": s.supply_index,
+            "kind": s.kind or "other",
+            "description": s.description or "",
+            "level_percent": s.level_percent,
+            "updated_at": s.updated_at.isoformat() if s.updated_at else None,
+        }
+        for s in get_supplies(db, printer_id)
+    ]
+
+
+def _naive_utc(dt: Optional[datetime]) -> Optional[datetime]:
+    if dt is not None and dt.tzinfo is not None:
+        return dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+@router.get("/{printer_id}/history", response_model=PrinterHistory)
+def get_printer_history(
+    printer_id: int,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    resolution: str = "auto",
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """Toner/status history. resolution=auto picks raw, hour or day by range length and age."""
+    if resolution != "auto" and resolution not in RESOLUTIONS:
+        raise HTTPException(status_code=400, detail="resolution must be auto, raw, hour, or day")
+    if not get_printer(db, printer_id):
+        raise HTTPException(status_code=404, detail="Printer not found")
+    end = _naive_utc(end) or datetime.utcnow()
+    start = _naive_utc(start) or end - timedelta(days=7)
+    if start >= end:
+        raise HTTPException(status_code=400, detail="from must be before to")
+    if resolution == "auto":
+        resolution = pick_resolution(start, end)
+
+    points = get_history(db, printer_id, start, end, resolution)
+    return {
+        "printer_id": printer_id,
+        "resolution": resolution,
+        "points": [{**p, "ts": p["ts"].isoformat()} for p in points],
+    }
+
+
+@router.patch("/bulk", response_model=PrinterBulkResult, response_model_exclude_none=True)
+def bulk_update_printers(
+    body: PrinterBulkUpdate,
+    lean: bool = Query(False, description="Return only ids and new versions"),
+    db: Session = Depends(get_db),
+    current_user: UserInDB = Depends(get_current_user),
+):
+    """
+    Many printers in one transaction, with the same rules as PATCH
+    /printers/{id}: status/toner_level count as a human verification,
+    everything else is metadata. Send either updates=[{id, ...}, ...] or
+    filter={...} plus set={...} (e.g. department=Finance -> location=Floor 3).
+    """
+    if (body.updates is None) == (body.set is None) or (body.set is None) != (body.filter is None):
+        raise HTTPException(status_code=400, detail="Send either updates, or filter together with set")
+
+    if body.updates is not None:
+        changes: dict[int, dict] = {}
+        for item in body.updates:
+            data = item.model_dump(exclude_unset=True)
+            changes.setdefault(data.pop("id"), {}).update(data)  # repeated id: later fields win
+    else:
+        criteria = body.filter.model_dump(exclude_none=True)
+        if not criteria:
+            raise HTTPException(status_code=400, detail="filter needs at least one criterion")
+        change = body.set.model_dump(exclude_unset=True)
+        ids = db.scalars(filter_printers(select(models.Printer.id), **criteria)).all()
+        changes = dict.fromkeys(ids, change)
+
+    try:
+        after = apply_human_updates(db, changes)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    result = {"updated": len(after), "missing": sorted(set(changes) - set(after))}
+    if lean:
+        result["versions"] = [{"id": pid, "version": row["version"]} for pid, row in sorted(after.items())]
+    else:
+        now = datetime.utcnow()
+        result["printers"] = [_serialize(p, now) for p in get_printers_by_ids(db, after)]
+    return result
 
 
 @router.patch("/{printer_id}", response_model=PrinterResponse)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, Field
-from typing import Optional, List, Literal
+from typing import Optional, List, Literal, Dict
 from datetime import datetime
 
 
@@ -59,6 +59,18 @@ class PrinterUpdate(BaseModel):
     ip_address: Optional[str] = None
 
 
+class PrinterImportRowError(BaseModel):
+    row: int  # spreadsheet row number (header is row 1)
+    error: str
+
+
+class PrinterImportResult(BaseModel):
+    created: int
+    rejected: int
+    ids: List[int]
+    errors: List[PrinterImportRowError]
+
+
 class PrinterResponse(BaseModel):
     id: int
     name: str
@@ -76,6 +88,9 @@ class PrinterResponse(BaseModel):
     days_since_update: Optional[float] = None
     stale: bool = False
     fail_streak: int = 0
+    forecast_empty_at: Optional[str] = None
+    days_until_empty: Optional[float] = None
+    forecast_confidence: Optional[float] = None
     connection_mode: str = "manual"
     department: Optional[str] = ""
     access_type: str = "public"
@@ -88,6 +103,81 @@ class PrinterResponse(BaseModel):
 
 class PrinterList(BaseModel):
     printers: List[PrinterResponse]
+    next_cursor: Optional[str] = None  # pass back as ?cursor= for the next page
+
+
+class PrinterChanges(BaseModel):
+    cursor: int  # pass back as ?since= on the next sync
+    has_more: bool = False
+    printers: List[PrinterResponse]  # current state of every printer changed since the cursor
+    deleted: List[int]
+
+
+PRINTER_BULK_MAX = 5000
+
+
+class PrinterBulkItem(PrinterUpdate):
+    id: int
+
+
+class PrinterFilter(BaseModel):
+    """Same filters as GET /printers."""
+    status: Optional[str] = None
+    department: Optional[str] = None
+    location: Optional[str] = None
+    connection_mode: Optional[str] = None
+    stale: Optional[bool] = None
+    toner_below: Optional[int] = Field(None, ge=0, le=101)
+
+
+class PrinterBulkUpdate(BaseModel):
+    """Either per-printer updates, or one change (set) for every printer matching filter."""
+    updates: Optional[List[PrinterBulkItem]] = Field(None, max_length=PRINTER_BULK_MAX)
+    filter: Optional[PrinterFilter] = None
+    set: Optional[PrinterUpdate] = None
+
+
+class PrinterVersion(BaseModel):
+    id: int
+    version: int
+
+
+class PrinterBulkResult(BaseModel):
+    updated: int
+    missing: List[int] = Field(default_factory=list)  # ids in updates that do not exist
+    printers: Optional[List[PrinterResponse]] = None  # full mode
+    versions: Optional[List[PrinterVersion]] = None  # lean mode
+
+
+class StatusCounts(BaseModel):
+    total: int = 0
+    online: int = 0
+    low: int = 0
+    offline: int = 0
+    unknown: int = 0
+    stale: int = 0
+
+
+class FleetSummary(BaseModel):
+    totals: StatusCounts
+    by_department: Dict[str, StatusCounts]
+    by_location: Dict[str, StatusCounts]
+
+
+class HistoryPoint(BaseModel):
+    ts: str
+    toner_min: Optional[int] = None
+    toner_max: Optional[int] = None
+    toner_last: Optional[int] = None
+    status_last: Optional[str] = None
+    samples: int = 0
+    failures: int = 0
+
+
+class PrinterHistory(BaseModel):
+    printer_id: int
+    resolution: str  # raw | hour | day
+    points: List[HistoryPoint]
 
 
 class TrustInfo(BaseModel):
@@ -135,16 +225,57 @@ StatusDetailValue = Literal[
 ]
 
 
+SupplyKind = Literal["black", "cyan", "magenta", "yellow", "drum", "waste", "other"]
+
+
+class SupplyReading(BaseModel):
+    """One Printer-MIB supply row as read by the agent."""
+    index: int
+    kind: SupplyKind = "other"
+    description: str = ""
+    level_percent: Optional[int] = Field(None, ge=0, le=100)
+
+
+class SupplyResponse(BaseModel):
+    index: int
+    kind: str
+    description: str = ""
+    level_percent: Optional[int] = None
+    updated_at: Optional[str] = None
+
+
 class AgentReportRequest(BaseModel):
     """Narrow write surface for agent tokens — status verification only.
 
     Unknown status_detail values are rejected (422), not ignored.
+    supplies (optional) replaces the printer's stored supply rows on ok reports.
     """
     printer_id: int
     ok: bool
     status: Optional[str] = None
     toner_level: Optional[int] = None
     status_detail: Optional[StatusDetailValue] = None
+    supplies: Optional[List[SupplyReading]] = Field(None, max_length=32)
+
+
+AGENT_BATCH_MAX = 5000
+
+
+class AgentReportBatch(BaseModel):
+    """Many reports under one token check and one transaction."""
+    reports: List[AgentReportRequest] = Field(..., max_length=AGENT_BATCH_MAX)
+
+
+class AgentReportItemResult(BaseModel):
+    printer_id: int
+    accepted: bool
+    error: Optional[str] = None  # printer_not_found | no_ip | invalid_toner_level
+
+
+class AgentReportBatchResponse(BaseModel):
+    accepted: int
+    rejected: int
+    results: List[AgentReportItemResult]
 
 
 class AgentTokenCreate(BaseModel):
@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Long-running LAN agent for TonerTrack (pilot).
+
+Same trust model as oneshot_report.py: run it on a machine inside the office
+network. It only contacts the printer IPs listed in its config file — single
+addresses, never ranges — plus the TonerTrack server. Revoking the token stops
+it: a 401 from the server ends the process.
+
+  export TONERTRACK_URL=https://tonertrack.onrender.com
+  export TONERTRACK_AGENT_TOKEN=tt_...   # from admin POST /agent/tokens — never commit
+  python scripts/agent.py run --config agent_printers.json
+  python scripts/agent.py run --config agent_printers.json --once
+
+agent_printers.json:
+
+  {"printers": [
+    {"printer_id": 1, "ip": "192.168.1.20", "mode": "snmp", "community": "public"},
+    {"printer_id": 2, "ip": "192.168.1.21", "mode": "ping"}
+  ]}
+
+Each cycle probes every listed printer concurrently (bounded), then posts the
+results to /agent/reports over one keep-alive connection.
+
+Which probe path works for each printer (SNMP, web UI scheme, ping) is kept
+in a state file next to the config (agent_printers.state.json, or --state)
+and reloaded on start, so steady-state cycles go straight to the known-good
+path instead of waiting out SNMP and HTTP timeouts on every run.
+
+PILOT: single-tenant deployment. Token can affect any printer on that instance.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import os
+import random
+import sys
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils import get_liveness_prober, get_printer_status, get_probe_strategies  # noqa: E402
+
+logger = logging.getLogger("tonertrack.agent")
+
+PROBE_MODES = {"snmp", "web", "ping"}
+TONER_KINDS = ("black", "cyan", "magenta", "yellow")
+BATCH_SIZE = 1000
+
+
+class TokenRejected(Exception):
+    """Server answered 401 — token revoked or wrong. Agent must stop."""
+
+
+def load_allow_list(path: str) -> list[dict]:
+    """Read and validate the printer list once at startup."""
+    with open(path, encoding="utf-8") as f:
+        raw = json.load(f)
+    entries = raw.get("printers", []) if isinstance(raw, dict) else raw
+
+    printers = []
+    for entry in entries:
+        pid = int(entry["printer_id"])
+        # ip_address() rejects CIDR ranges and hostnames — listed devices only
+        ip = str(ipaddress.ip_address(str(entry["ip"]).strip()))
+        mode = (entry.get("mode") or "snmp").lower()
+        if mode not in PROBE_MODES:
+            raise ValueError(f"printer {pid}: mode must be snmp, web, or ping")
+        printers.append({
+            "printer_id": pid,
+            "ip": ip,
+            "mode": mode,
+            "community": entry.get("community") or "public",
+        })
+    return printers
+
+
+def _to_report(printer_id: int, result) -> dict:
+    """Map a utils.get_printer_status result onto an AgentReportRequest body."""
+    if isinstance(result, tuple):
+        # Web UI scrape: ({index: percent}, [error strings])
+        levels, _errors = result
+        report = {"printer_id": printer_id, "ok": True}
+        if levels:
+            report["toner_level"] = min(levels.values())
+        return report
+    if result.get("status") == "offline":
+        return {"printer_id": printer_id, "ok": False, "status_detail": "unreachable"}
+    return {"printer_id": printer_id, "ok": True}
+
+
+async def probe_one(printer: dict, sem: asyncio.Semaphore, timeout: float) -> dict:
+    async with sem:
+        try:
+            result = await asyncio.wait_for(
+                get_printer_status(printer["ip"], printer["mode"], printer["community"]),
+                timeout=timeout,
+            )
+        except Exception as e:
+            logger.info("probe %s (%s) failed: %s", printer["printer_id"], printer["ip"], e)
+            return {"printer_id": printer["printer_id"], "ok": False, "status_detail": "unreachable"}
+        report = _to_report(printer["printer_id"], result)
+        if report["ok"] and isinstance(result, dict) and result.get("method") == "snmp":
+            # the whole supplies table: walked on discovery, then only its levels read in the poll's one GET
+            _attach_supplies(report, result.get("supplies"))
+    return report
+
+
+def _attach_supplies(report: dict, supplies) -> None:
+    """Add Printer-MIB supplies; headline toner is black, else the emptiest colour."""
+    if not supplies:
+        return
+    report["supplies"] = supplies
+    levels = {s["kind"]: s["level_percent"] for s in supplies
+              if s["kind"] in TONER_KINDS and s["level_percent"] is not None}
+    if "black" in levels:
+        report["toner_level"] = levels["black"]
+    elif levels:
+        report["toner_level"] = min(levels.values())
+
+
+async def probe_pings(printers: list[dict]) -> list[dict]:
+    """Ping-mode printers in one liveness sweep (ICMP where allowed, TCP connects)."""
+    if not printers:
+        return []
+    alive = await get_liveness_prober().probe_many([p["ip"] for p in printers])
+    return [
+        _to_report(p["printer_id"], {"status": "online" if alive[p["ip"]] else "offline"})
+        for p in printers
+    ]
+
+
+async def probe_all(printers: list[dict], concurrency: int, timeout: float) -> list[dict]:
+    sem = asyncio.Semaphore(concurrency)
+    pings = [p for p in printers if p["mode"] == "ping"]
+    others = [p for p in printers if p["mode"] != "ping"]
+    results = await asyncio.gather(
+        probe_pings(pings),
+        *(probe_one(p, sem, timeout) for p in others),
+    )
+    return results[0] + list(results[1:])
+
+
+async def ship(client: httpx.AsyncClient, reports: list[dict]) -> None:
+    for i in range(0, len(reports), BATCH_SIZE):
+        resp = await client.post("/agent/reports", json={"reports": reports[i:i + BATCH_SIZE]})
+        if resp.status_code == 401:
+            raise TokenRejected(resp.text)
+        resp.raise_for_status()
+        body = resp.json()
+        for item in body.get("results", []):
+            if not item.get("accepted"):
+                logger.warning("printer %s rejected: %s", item.get("printer_id"), item.get("error"))
+        logger.info("shipped %d accepted, %d rejected", body.get("accepted", 0), body.get("rejected", 0))
+
+
+async def run(args) -> int:
+    printers = load_allow_list(args.config)
+    if not printers:
+        print("No printers in allow-list", file=sys.stderr)
+        return 2
+    state_path = args.state or os.path.splitext(args.config)[0] + ".state.json"
+    strategies = get_probe_strategies()
+    strategies.load(state_path)
+    logger.info("agent started: %d printers, interval %ss", len(printers), args.interval)
+
+    # One pooled connection to the server, kept alive across cycles
+    async with httpx.AsyncClient(
+        base_url=args.url.rstrip("/"),
+        headers={"X-Agent-Token": args.token},
+        timeout=30,
+        limits=httpx.Limits(max_connections=1, max_keepalive_connections=1),
+    ) as client:
+        while True:
+            reports = await probe_all(printers, args.concurrency, args.probe_timeout)
+            try:
+                strategies.save(state_path)
+            except OSError as e:
+                logger.warning("could not save probe state %s: %s", state_path, e)
+            try:
+                await ship(client, reports)
+            except TokenRejected:
+                print("Agent token rejected (revoked?) — stopping", file=sys.stderr)
+                return 1
+            except httpx.HTTPError as e:
+                # Server blip: drop this cycle's results, next cycle re-probes
+                logger.warning("ship failed: %s", e)
+            if args.once:
+                return 0
+            delay = args.interval + random.uniform(-args.jitter, args.jitter)
+            await asyncio.sleep(max(1.0, delay))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="tonertrack-agent", description="TonerTrack on-site agent")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run_p = sub.add_parser("run", help="Probe listed printers on an interval and report")
+    run_p.add_argument("--config", required=True, help="JSON allow-list of printers to probe")
+    run_p.add_argument("--interval", type=float, default=300.0, help="Seconds between cycles")
+    run_p.add_argument("--jitter", type=float, default=30.0, help="± seconds added to each interval")
+    run_p.add_argument("--concurrency", type=int, default=32, help="Max printers probed at once")
+    run_p.add_argument("--probe-timeout", type=float, default=15.0, help="Per-printer deadline")
+    run_p.add_argument("--once", action="store_true", help="Run one cycle and exit")
+    run_p.add_argument("--state", help="Probe strategy state file (default: <config>.state.json)")
+    run_p.add_argument(
+        "--url",
+        default=os.environ.get("TONERTRACK_URL", "https://tonertrack.onrender.com"),
+    )
+    run_p.add_argument(
+        "--token",
+        default=os.environ.get("TONERTRACK_AGENT_TOKEN", ""),
+        help="Or set TONERTRACK_AGENT_TOKEN",
+    )
+    args = parser.parse_args()
+
+    if not args.token:
+        print("Missing token: set TONERTRACK_AGENT_TOKEN or pass --token", file=sys.stderr)
+        return 2
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        return asyncio.run(run(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Printer list serialization benchmark (rows/second, higher is better).
+
+Loads N printers (with forecasts) from a throwaway in-memory SQLite database
+through the real list query, then times turning them into response bytes two
+ways:
+
+  response_model  _serialize_page(), then what FastAPI does with
+                  response_model=PrinterList: validate, dump, json.dumps
+  fast            _serialize_page(), then orjson straight from the dicts
+
+The DB fetch is timed separately; it is the same for both.
+
+  python scripts/bench_serialize.py
+  python scripts/bench_serialize.py --sizes 1000 10000 --repeat 5
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+from sqlalchemy.pool import StaticPool  # noqa: E402
+
+import models  # noqa: E402
+from crud import list_printers_page  # noqa: E402
+from routers.printers import _encode, _serialize_page  # noqa: E402
+from schemas import PrinterList  # noqa: E402
+
+
+def _seed(db: Session, n: int) -> None:
+    rng = random.Random(n)
+    now = datetime.utcnow()
+    printers, forecasts = [], []
+    for i in range(1, n + 1):
+        verified = now - timedelta(hours=rng.uniform(0, 240))
+        toner = rng.randint(0, 100)
+        printers.append({
+            "id": i,
+            "name": f"Printer {i:05d}",
+            "ip_address": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}",
+            "location": f"Floor {i % 12}",
+            "department": ("IT", "Finance", "Ops", "HR")[i % 4],
+            "status": "low" if toner <= 20 else "online",
+            "toner_level": toner,
+            "page_count": rng.randint(0, 500_000),
+            "last_checked": verified,
+            "last_verified_at": verified,
+            "last_attempt_at": verified,
+            "fail_streak": 0,
+            "effective_status": "low" if toner <= 20 else "online",
+            "is_stale": verified < now - timedelta(days=7),
+            "connection_mode": "snmp",
+            "allowed_users": [],
+            "notes": "",
+            "version": 1,
+        })
+        if i % 3:
+            forecasts.append({
+                "printer_id": i,
+                "forecast_empty_at": now + timedelta(days=rng.uniform(1, 90)),
+                "slope_per_day": -rng.uniform(0.1, 3),
+                "confidence": round(rng.random(), 3),
+                "samples": 24,
+                "computed_at": now,
+            })
+    db.execute(insert(models.Printer), printers)
+    db.execute(insert(models.PrinterForecast), forecasts)
+    db.commit()
+
+
+def _response_model(rows, now=None) -> bytes:
+    payload = {"printers": _serialize_page(rows, now), "next_cursor": None}
+    data = PrinterList.model_validate(payload).model_dump(mode="json")
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+
+def _fast(rows, now=None) -> bytes:
+    return _encode({"printers": _serialize_page(rows, now), "next_cursor": None})
+
+
+def _best(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark printer list serialization")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+    args = parser.parse_args()
+
+    print(f"{'rows':>7}  {'fetch rows/s':>13}  {'response_model rows/s':>22}  {'fast rows/s':>12}  {'speedup':>7}")
+    for n in args.sizes:
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        models.Base.metadata.create_all(engine)
+        with Session(engine) as db:
+            _seed(db, n)
+            fetch = lambda: list_printers_page(db, limit=n, cursor=None, sort="id", descending=False)  # noqa: E731
+            rows, _ = fetch()
+            t_fetch = _best(fetch, args.repeat)
+
+            now = datetime.utcnow()
+            slow, fast = _response_model(rows, now), _fast(rows, now)
+            if json.loads(slow) != json.loads(fast):
+                print(f"{n}: fast output differs from response_model output", file=sys.stderr)
+                return 1
+            t_slow = _best(lambda: _response_model(rows), args.repeat)
+            t_fast = _best(lambda: _fast(rows), args.repeat)
+        engine.dispose()
+        print(f"{n:>7}  {n / t_fetch:>13,.0f}  {n / t_slow:>22,.0f}  {n / t_fast:>12,.0f}  {t_slow / t_fast:>6.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Columnar export for analysis (Parquet or Arrow IPC), straight from the database.
+
+Run this where DATABASE_URL reaches the TonerTrack database (server shell,
+or a laptop with a read replica URL). Same output as admin
+GET /export/columnar/{dataset}.
+
+  export DATABASE_URL=postgresql://...
+  python scripts/export_columnar.py readings --resolution day --from 2025-01-01 -o readings.parquet
+  python scripts/export_columnar.py jobs -o jobs.arrow --format arrow
+  python scripts/export_columnar.py alerts -o alerts.parquet
+
+Needs pyarrow (pip install pyarrow).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import SessionLocal  # noqa: E402
+from services import columnar  # noqa: E402
+from services.history import RESOLUTIONS  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Export TonerTrack data as Parquet or Arrow")
+    parser.add_argument("dataset", choices=columnar.DATASETS)
+    parser.add_argument("-o", "--output", required=True, help="File to write")
+    parser.add_argument("--format", choices=list(columnar.FORMATS), default=None,
+                        help="Default: from the output extension, else parquet")
+    parser.add_argument("--resolution", choices=RESOLUTIONS, default="raw", help="readings only")
+    parser.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None, help="UTC, inclusive")
+    parser.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None, help="UTC, exclusive")
+    args = parser.parse_args()
+
+    if not columnar.available():
+        print("pyarrow is not installed: pip install pyarrow", file=sys.stderr)
+        return 2
+    fmt = args.format or ("arrow" if args.output.endswith((".arrow", ".feather")) else "parquet")
+
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rows = columnar.write(
+            db, args.output, args.dataset, fmt,
+            resolution=args.resolution, start=args.start, end=args.end,
+        )
+    finally:
+        db.close()
+    size = os.path.getsize(args.output)
+    print(f"{rows} rows -> {args.output} ({size / 1e6:.1f} MB, {time.perf_counter() - started:.1f}s)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -94,10 +94,12 @@ def verify_agent_token(db: Session, raw: str) -> Optional[models.AgentToken]:
     return row
 
 
-def touch_last_used(db: Session, token: models.AgentToken) -> None:
+def touch_last_used(db: Session, token: models.AgentToken, *, commit: bool = True) -> None:
+    """commit=False lets a batch report fold this into its own transaction."""
     token.last_used_at = datetime.utcnow()
     db.add(token)
-    db.commit()
+    if commit:
+        db.commit()
 
 
 def list_agent_tokens(db: Session):
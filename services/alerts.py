@@ -0,0 +1,143 @@
+"""
+Alert engine: rules evaluated for the printers a write touched, never the fleet.
+
+printer_changes.stage_changes() hands every changed row here inside the
+writer's transaction, so agent ingest (single and batch), human updates,
+bulk updates and the stale sweep all raise and clear alerts the same way.
+Forecast refits call stage_forecast_alerts() for the printers whose forecast
+changed or is inside the window.
+
+Per (printer, alert type) there is at most one open alert: a rule that holds
+opens one if none is open, a rule that no longer holds resolves the open one.
+Writers hold the printer's row lock for the whole transaction, so two writes
+for one printer cannot both open the same alert. Raising and resolving queue
+notifications (services.notifications) in the same transaction.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import models
+from services import notifications
+from services import printer_status  # thresholds; read at call time (import cycle via printer_changes)
+
+# Pilot knobs
+FORECAST_ALERT_DAYS = 7
+
+LOW_TONER = "low_toner"
+UNREACHABLE = "unreachable"
+STALE = "stale"
+TONER_FORECAST = "toner_forecast"
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def _low_toner(get: Callable) -> Optional[str]:
+    # effective_status already means: verified, not stale, not unreachable, at/below threshold
+    if get("effective_status") == "low":
+        return f"Toner low ({get('toner_level')}%)"
+    return None
+
+
+def _unreachable(get: Callable) -> Optional[str]:
+    if get("status_detail") == "unreachable" and (get("fail_streak") or 0) >= printer_status.FAIL_STREAK_THRESHOLD:
+        return f"Unreachable for {get('fail_streak')} consecutive checks"
+    return None
+
+
+def _stale(get: Callable) -> Optional[str]:
+    if get("is_stale"):
+        return f"Not verified in over {printer_status.STALE_AFTER_DAYS} days"
+    return None
+
+
+# alert_type -> rule over the printer row (message if the condition holds)
+STATE_RULES: dict[str, Callable[[Callable], Optional[str]]] = {
+    LOW_TONER: _low_toner,
+    UNREACHABLE: _unreachable,
+    STALE: _stale,
+}
+
+
+def stage_alerts(db: Session, rows: dict[int, Any], now: Optional[datetime] = None) -> None:
+    """
+    STATE_RULES for changed printers (no commit). rows: {printer_id: Printer
+    or row mapping, None if deleted}.
+    """
+    wanted = {}
+    for pid, row in rows.items():
+        if row is None:
+            continue
+        get = row.get if isinstance(row, dict) else lambda k, row=row: getattr(row, k, None)
+        for alert_type, rule in STATE_RULES.items():
+            message = rule(get)
+            if message:
+                wanted[(pid, alert_type)] = message
+    _sync(db, rows.keys(), STATE_RULES.keys(), wanted, now or _utcnow())
+
+
+def stage_forecast_alerts(db: Session, empty_at: dict[int, Optional[datetime]], now: Optional[datetime] = None) -> None:
+    """TONER_FORECAST for the given printers (no commit). empty_at: {printer_id: forecast_empty_at or None}."""
+    now = now or _utcnow()
+    horizon = now + timedelta(days=FORECAST_ALERT_DAYS)
+    wanted = {
+        (pid, TONER_FORECAST): f"Toner forecast to run out by {when:%Y-%m-%d}"
+        for pid, when in empty_at.items()
+        if when is not None and when <= horizon
+    }
+    _sync(db, empty_at.keys(), (TONER_FORECAST,), wanted, now)
+
+
+def _sync(
+    db: Session,
+    printer_ids: Iterable[int],
+    alert_types: Iterable[str],
+    wanted: dict[tuple[int, str], str],
+    now: datetime,
+) -> None:
+    """Open wanted alerts that are not open yet; resolve open ones no longer wanted."""
+    ids, types = list(printer_ids), list(alert_types)
+    if not ids:
+        return
+    a = models.Alert
+    open_alerts: dict[tuple[int, str], list[int]] = {}
+    for r in db.query(a.id, a.printer_id, a.alert_type).filter(
+        a.printer_id.in_(ids), a.alert_type.in_(types), a.resolved.is_(False)
+    ):
+        open_alerts.setdefault((r.printer_id, r.alert_type), []).append(r.id)
+
+    cleared = [(key, aid) for key, aids in open_alerts.items() if key not in wanted for aid in aids]
+    if cleared:
+        db.execute(
+            update(a)
+            .where(a.id.in_([aid for _, aid in cleared]))
+            .values(resolved=True, resolved_at=now)
+            .execution_options(synchronize_session=False)
+        )
+    raised = [
+        {"printer_id": pid, "alert_type": alert_type, "message": message, "timestamp": now, "resolved": False}
+        for (pid, alert_type), message in wanted.items()
+        if (pid, alert_type) not in open_alerts
+    ]
+    raised_ids = []
+    if raised:
+        raised_ids = db.execute(insert(a).returning(a.id, sort_by_parameter_order=True), raised).scalars().all()
+
+    if cleared or raised:
+        events = [
+            {"alert_id": aid, "event": "raised", "printer_id": r["printer_id"],
+             "alert_type": r["alert_type"], "message": r["message"]}
+            for aid, r in zip(raised_ids, raised)
+        ]
+        events += [
+            {"alert_id": aid, "event": "resolved", "printer_id": pid,
+             "alert_type": alert_type, "message": "Resolved"}
+            for (pid, alert_type), aid in cleared
+        ]
+        notifications.stage(db, events, now)
@@ -0,0 +1,176 @@
+"""
+Columnar (Parquet / Arrow IPC) export of history, jobs and alerts.
+
+Rows come straight from SQL in yield_per partitions and each partition
+becomes one record batch, so memory is bounded by the batch size. Only
+printer_id is selected; printer_name and department are dictionary-encoded
+against one fleet-wide dictionary built up front (every batch shares it,
+which the Arrow IPC file format requires). Other repeated strings (status,
+source, alert_type) are left to Parquet's own dictionary encoding.
+
+pyarrow is optional at import time; available() says whether exports work.
+"""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import BinaryIO, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+import models
+from services.history import RAW_EXPORT_FIELDS, RESOLUTIONS, ROLLUP_EXPORT_FIELDS
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+FORMATS = {"parquet": "application/vnd.apache.parquet", "arrow": "application/vnd.apache.arrow.file"}
+DATASETS = ("readings", "jobs", "alerts")
+BATCH_ROWS = 65536
+PARQUET_COMPRESSION = "zstd"
+
+
+def available() -> bool:
+    return pa is not None
+
+
+def _types() -> dict:
+    ts = pa.timestamp("us")
+    return {
+        "id": pa.int64(),
+        "printer_id": pa.int32(),
+        "ts": ts,
+        "timestamp": ts,
+        "source": pa.string(),
+        "ok": pa.bool_(),
+        "toner_level": pa.int16(),
+        "toner_min": pa.int16(),
+        "toner_max": pa.int16(),
+        "toner_last": pa.int16(),
+        "status": pa.string(),
+        "status_last": pa.string(),
+        "status_detail": pa.string(),
+        "samples": pa.int32(),
+        "failures": pa.int32(),
+        "user": pa.string(),
+        "document": pa.string(),
+        "pages": pa.int32(),
+        "cost": pa.float64(),
+        "message": pa.string(),
+        "alert_type": pa.string(),
+        "resolved": pa.bool_(),
+        "resolved_at": ts,
+    }
+
+
+def _query(dataset: str, resolution: str, start: Optional[datetime], end: Optional[datetime]):
+    """(select, column names) in primary key / time order."""
+    if dataset == "readings":
+        if resolution == "raw":
+            t = models.PrinterReading
+            ts, cols = t.ts, [getattr(t, f) for f in RAW_EXPORT_FIELDS]
+        else:
+            t = models.PrinterReadingRollup
+            ts = t.bucket
+            cols = [t.printer_id, t.bucket.label("ts")] + [getattr(t, f) for f in ROLLUP_EXPORT_FIELDS[2:]]
+        stmt = select(*cols)
+        if resolution != "raw":
+            stmt = stmt.where(t.resolution == resolution)
+        order = (t.printer_id, ts)
+    else:
+        t = models.Job if dataset == "jobs" else models.Alert
+        ts = t.timestamp
+        stmt = select(*t.__table__.columns)
+        order = (t.id,)
+    if start is not None:
+        stmt = stmt.where(ts >= start)
+    if end is not None:
+        stmt = stmt.where(ts < end)
+    return stmt.order_by(*order), [c.name for c in stmt.selected_columns]
+
+
+def _printer_labels(db: Session):
+    """
+    Lookup arrays indexed by printer_id -> index into the name / department
+    dictionaries (-1: unknown, e.g. a deleted printer), plus the dictionaries.
+    """
+    p = models.Printer
+    rows = db.query(p.id, p.name, p.department).all()
+    size = max((r.id for r in rows), default=0) + 1
+    lookups = []
+    dictionaries = []
+    for col in (1, 2):
+        values: dict[str, int] = {}
+        lookup = np.full(size, -1, dtype=np.int32)
+        for r in rows:
+            if r[col] is not None:
+                lookup[r.id] = values.setdefault(r[col], len(values))
+        lookups.append(lookup)
+        dictionaries.append(pa.array(list(values), pa.string()))
+    return lookups, dictionaries
+
+
+def _labels(printer_ids: "pa.Array", lookup: "np.ndarray", dictionary: "pa.Array") -> "pa.DictionaryArray":
+    # jobs/alerts.printer_id is nullable: NULL -> -1 (no label), kept integer for indexing
+    ids = pc.fill_null(printer_ids, -1).cast(pa.int64()).to_numpy()
+    known = (ids >= 0) & (ids < len(lookup))
+    idx = np.where(known, lookup[np.where(known, ids, 0)], -1)
+    return pa.DictionaryArray.from_arrays(pa.array(idx, mask=idx < 0), dictionary)
+
+
+def write(
+    db: Session,
+    sink: BinaryIO | str,
+    dataset: str,
+    fmt: str = "parquet",
+    *,
+    resolution: str = "raw",
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    batch: int = BATCH_ROWS,
+) -> int:
+    """
+    Write one dataset to sink (path or binary file) as Parquet or an Arrow
+    IPC file. readings take resolution raw|hour|day. Returns rows written.
+    """
+    if not available():
+        raise RuntimeError("pyarrow is not installed")
+    if dataset not in DATASETS:
+        raise ValueError(f"dataset must be one of {', '.join(DATASETS)}")
+    if fmt not in FORMATS:
+        raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+    if resolution not in RESOLUTIONS:
+        raise ValueError("resolution must be raw, hour, or day")
+
+    stmt, names = _query(dataset, resolution, start, end)
+    types = _types()
+    lookups, dictionaries = _printer_labels(db)
+    label = pa.dictionary(pa.int32(), pa.string())
+    schema = pa.schema(
+        [pa.field(n, types[n]) for n in names]
+        + [pa.field("printer_name", label), pa.field("department", label)]
+    )
+    pid_col = names.index("printer_id")
+
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression=PARQUET_COMPRESSION)
+    else:
+        writer = pa.ipc.new_file(sink, schema)
+    total = 0
+    try:
+        # Core rows: no ORM result processing per row
+        result = db.connection().execute(stmt.execution_options(yield_per=batch))
+        for rows in result.partitions():
+            arrays = [pa.array(col, types[n]) for n, col in zip(names, zip(*rows))]
+            arrays += [_labels(arrays[pid_col], *pair) for pair in zip(lookups, dictionaries)]
+            writer.write_batch(pa.RecordBatch.from_arrays(arrays, schema=schema))
+            total += len(rows)
+    finally:
+        writer.close()
+    return total
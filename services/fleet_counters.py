@@ -0,0 +1,153 @@
+"""
+Fleet summary counters — totals by effective status, department and location.
+
+Write paths hand over (old, new) snapshots of each printer they touch; the
+difference becomes +/- deltas on a handful of counter rows, applied in the
+same transaction. Counters can drift if two writers race on one printer
+(each saw the same "old"), so reconcile() periodically rebuilds them from a
+GROUP BY over printers.
+"""
+from __future__ import annotations
+
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, NamedTuple, Optional
+
+from sqlalchemy import case, delete, func, insert, update
+from sqlalchemy.orm import Session
+
+import models
+
+STATUSES = ("online", "low", "offline", "unknown")
+METRICS = ("total",) + STATUSES + ("stale",)
+RECONCILE_EVERY = timedelta(hours=1)
+
+_RECONCILED_KEY = "fleet_counters_reconciled_at"
+
+
+class Snapshot(NamedTuple):
+    effective_status: str
+    is_stale: bool
+    department: str
+    location: str
+
+
+def snapshot(printer) -> Snapshot:
+    """From a Printer (or a row/mapping with the same attribute names)."""
+    get = printer.get if isinstance(printer, dict) else lambda k: getattr(printer, k, None)
+    return Snapshot(
+        get("effective_status") or "unknown",
+        bool(get("is_stale")),
+        get("department") or "",
+        get("location") or "",
+    )
+
+
+def snapshots_by_id(db: Session, printer_ids) -> dict[int, Snapshot]:
+    """One IN query for the current snapshots of many printers."""
+    ids = list(printer_ids)
+    if not ids:
+        return {}
+    p = models.Printer
+    rows = db.query(p.id, p.effective_status, p.is_stale, p.department, p.location).filter(p.id.in_(ids))
+    return {r.id: snapshot(r._asdict()) for r in rows}
+
+
+def _deltas(transitions: Iterable[tuple[Optional[Snapshot], Optional[Snapshot]]]) -> Counter:
+    deltas: Counter = Counter()
+    for old, new in transitions:
+        if old == new:
+            continue
+        for snap, sign in ((old, -1), (new, 1)):
+            if snap is None:
+                continue
+            metric = snap.effective_status if snap.effective_status in STATUSES else "unknown"
+            for dim, key in (("all", ""), ("department", snap.department), ("location", snap.location)):
+                deltas[(dim, key, "total")] += sign
+                deltas[(dim, key, metric)] += sign
+                if snap.is_stale:
+                    deltas[(dim, key, "stale")] += sign
+    return deltas
+
+
+def stage_transitions(db: Session, transitions: Iterable[tuple[Optional[Snapshot], Optional[Snapshot]]]) -> None:
+    """
+    Apply counter deltas inside the caller's transaction (no commit).
+    old=None means created, new=None means deleted. Rows are updated in
+    sorted (dimension, key, metric) order so concurrent writers take the
+    row locks in the same order and cannot deadlock on opposite transitions.
+    """
+    c = models.FleetCounter
+    deltas = _deltas(transitions)
+    for (dim, key, metric) in sorted(deltas):
+        delta = deltas[(dim, key, metric)]
+        if not delta:
+            continue
+        result = db.execute(
+            update(c)
+            .where(c.dimension == dim, c.key == key, c.metric == metric)
+            .values(count=c.count + delta)
+            .execution_options(synchronize_session=False)
+        )
+        if not result.rowcount:
+            db.execute(insert(c).values(dimension=dim, key=key, metric=metric, count=delta))
+
+
+def reconcile(db: Session, now: Optional[datetime] = None, *, force: bool = False) -> bool:
+    """
+    Rebuild every counter from printers (one GROUP BY per dimension).
+    Runs at most every RECONCILE_EVERY unless forced. Returns True if it ran.
+    """
+    now = now or datetime.utcnow()
+    marker = db.query(models.Setting).filter(models.Setting.key == _RECONCILED_KEY).first()
+    if not force and marker and marker.value and now - datetime.fromisoformat(marker.value) < RECONCILE_EVERY:
+        return False
+
+    p = models.Printer
+    status = case((p.effective_status.in_(STATUSES), p.effective_status), else_="unknown")
+    rows = []
+    for dim, key_col in (("all", None), ("department", func.coalesce(p.department, "")),
+                         ("location", func.coalesce(p.location, ""))):
+        cols = [status] + ([key_col] if key_col is not None else [])
+        q = db.query(
+            *cols,
+            func.count(p.id),
+            func.sum(case((p.is_stale.is_(True), 1), else_=0)),
+        ).group_by(*cols)
+        per_key: dict[str, Counter] = {}
+        for r in q:
+            st, key = r[0], (r[1] if key_col is not None else "")
+            n, stale = r[-2], int(r[-1] or 0)
+            agg = per_key.setdefault(key, Counter())
+            agg["total"] += n
+            agg[st] += n
+            agg["stale"] += stale
+        for key, agg in per_key.items():
+            rows.extend(
+                {"dimension": dim, "key": key, "metric": m, "count": agg[m]}
+                for m in METRICS if agg[m]
+            )
+
+    db.execute(delete(models.FleetCounter))
+    if rows:
+        db.execute(insert(models.FleetCounter), rows)
+    if not marker:
+        db.add(models.Setting(key=_RECONCILED_KEY, value=now.isoformat()))
+    else:
+        marker.value = now.isoformat()
+    db.commit()
+    return True
+
+
+def get_summary(db: Session) -> dict:
+    """Read the counters (a few rows per department/location), never the printers."""
+    out = {"totals": dict.fromkeys(METRICS, 0), "by_department": {}, "by_location": {}}
+    for row in db.query(models.FleetCounter).filter(models.FleetCounter.count != 0):
+        if row.dimension == "all":
+            bucket = out["totals"]
+        else:
+            group = out["by_department" if row.dimension == "department" else "by_location"]
+            bucket = group.setdefault(row.key, dict.fromkeys(METRICS, 0))
+        if row.metric in bucket:
+            bucket[row.metric] = row.count
+    return out
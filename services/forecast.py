@@ -0,0 +1,319 @@
+"""
+Fleet-wide toner depletion forecast ("days until empty").
+
+Each printer's least-squares fit is kept as running sums (n, Σx, Σy, Σx²,
+Σxy, Σy²) in printer_forecast_sums, so a run never rescans the window:
+
+  1. hourly rollups that completed since the last run are added, and the
+     hours that just left FORECAST_WINDOW_DAYS are subtracted — both
+     vectorized in NumPy over the whole fleet (np.bincount)
+  2. a toner jump of more than REFILL_JUMP (refill/swap) resets a printer's
+     sums, so they always cover only its last segment
+  3. slope, level at the last hour and R² come straight from the sums;
+     empty_at = last hour + level / -slope, confidence from R² scaled down
+     when there are few points
+
+x is whole hours since the fixed EPOCH and y an integer level, so the sums
+are exact integers: rerunning on the same data gives bit-identical fits, and
+empty_at is rounded to the minute before it is compared or served.
+
+Results replace printer_forecasts wholesale; the API only reads that table.
+Printers whose served forecast changed get their row version bumped and a
+change log entry, so conditional GETs and delta sync see it.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from operator import itemgetter
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+import models
+from services.alerts import FORECAST_ALERT_DAYS, stage_forecast_alerts
+from services.history import get_watermark
+from services.printer_changes import stage_log
+
+# Pilot knobs
+FORECAST_WINDOW_DAYS = 30
+REFILL_JUMP = 15  # toner points; a rise bigger than this is a new cartridge
+MIN_POINTS = 3
+FULL_CONFIDENCE_POINTS = 24
+MAX_FORECAST_DAYS = 365
+
+EPOCH = datetime(2020, 1, 1)  # x origin of the sums; never change without rebuilding them
+_SUMS_UNTIL_KEY = "forecast_sums_until"  # rollup watermark the sums are current to
+_SUM_FIELDS = ("n", "sx", "sy", "sxx", "sxy", "syy")
+_STATE_FIELDS = ("printer_id", "segment_start", "last_hour", "last_level") + _SUM_FIELDS
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def _round_minute(dt: datetime) -> datetime:
+    return (dt + timedelta(seconds=30)).replace(second=0, microsecond=0)
+
+
+# --------------------------- running sums ---------------------------
+
+def empty_sums() -> dict[str, np.ndarray]:
+    return {f: np.zeros(0, dtype=np.int64) for f in _STATE_FIELDS}
+
+
+def _point_sums(group: np.ndarray, h: np.ndarray, y: np.ndarray, size: int) -> dict[str, np.ndarray]:
+    # float64 bincount is exact here: window sums stay far below 2**53
+    def total(w=None):
+        return np.rint(np.bincount(group, w, minlength=size)).astype(np.int64)
+
+    hf, yf = h.astype(float), y.astype(float)
+    return {
+        "n": total(), "sx": total(hf), "sy": total(yf),
+        "sxx": total(hf * hf), "sxy": total(hf * yf), "syy": total(yf * yf),
+    }
+
+
+def add_points(sums: dict, pid: np.ndarray, h: np.ndarray, y: np.ndarray) -> dict:
+    """
+    Fold new hourly points, sorted by (pid, h) and all later than each
+    printer's last_hour, into the sums. A refill in them restarts that
+    printer's segment at the refill point.
+    """
+    if not len(pid):
+        return sums
+    ids = np.union1d(sums["printer_id"], pid)
+    out = {f: np.zeros(len(ids), dtype=np.int64) for f in _STATE_FIELDS}
+    out["printer_id"] = ids
+    known = np.zeros(len(ids), dtype=bool)
+    pos = np.searchsorted(ids, sums["printer_id"])
+    known[pos] = True
+    for f in _STATE_FIELDS[1:]:
+        out[f][pos] = sums[f]
+
+    slot = np.searchsorted(ids, pid)
+    first = np.empty(len(pid), dtype=bool)
+    first[0] = True
+    first[1:] = pid[1:] != pid[:-1]
+    starts = np.flatnonzero(first)
+    last = np.append(starts[1:] - 1, len(pid) - 1)
+
+    # Previous level: the point before, or the stored last level for a first point
+    prev = np.empty(len(y), dtype=np.int64)
+    prev[1:] = y[:-1]
+    prev[starts] = np.where(known[slot[starts]], out["last_level"][slot[starts]], y[starts])
+    refill = (y - prev) > REFILL_JUMP
+    restart = refill | (first & ~known[slot])
+    last_restart = np.maximum.reduceat(np.where(restart, np.arange(len(pid)), -1), starts)
+
+    restarted = slot[starts][last_restart >= 0]
+    for f in _SUM_FIELDS:
+        out[f][restarted] = 0
+    out["segment_start"][restarted] = h[last_restart[last_restart >= 0]]
+
+    group = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(pid))))
+    keep = np.arange(len(pid)) >= last_restart[group]
+    added = _point_sums(slot[keep], h[keep], y[keep], len(ids))
+    for f in _SUM_FIELDS:
+        out[f] += added[f]
+    out["last_hour"][slot[last]] = h[last]
+    out["last_level"][slot[last]] = y[last]
+    return out
+
+
+def expire_points(sums: dict, pid: np.ndarray, h: np.ndarray, y: np.ndarray) -> dict:
+    """Subtract points that left the window; ones before a printer's segment were never added."""
+    if not len(pid) or not len(sums["printer_id"]):
+        return sums
+    slot = np.minimum(np.searchsorted(sums["printer_id"], pid), len(sums["printer_id"]) - 1)
+    keep = (sums["printer_id"][slot] == pid) & (h >= sums["segment_start"][slot])
+    removed = _point_sums(slot[keep], h[keep], y[keep], len(sums["printer_id"]))
+    out = dict(sums)
+    for f in _SUM_FIELDS:
+        out[f] = sums[f] - removed[f]
+    alive = out["n"] > 0
+    return {f: v[alive] for f, v in out.items()}
+
+
+def fit_sums(sums: dict) -> dict:
+    """Per-printer least-squares fit from the sums: slope per day, level at the last hour, R²."""
+    n, sx, sy = sums["n"], sums["sx"], sums["sy"]
+    # Exact in int64; only the final ratios are floating point
+    cov = (n * sums["sxy"] - sx * sy).astype(float)
+    varx = (n * sums["sxx"] - sx * sx).astype(float)
+    vary = (n * sums["syy"] - sy * sy).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(varx > 0, cov / varx, np.nan)  # per hour
+        level = sy / n + slope * (sums["last_hour"] - sx / n)
+        r2 = np.where((varx > 0) & (vary > 0), cov * cov / (varx * vary), 0.0)
+    return {
+        "printer_id": sums["printer_id"],
+        "samples": n,
+        "slope": slope * 24,
+        "level_at_last": level,
+        "last_hour": sums["last_hour"],
+        "r2": r2,
+    }
+
+
+def _load_points(db: Session, start: datetime, end: datetime) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(pid, hour, level) of hourly rollups in [start, end), sorted by (pid, hour)."""
+    ru = models.PrinterReadingRollup
+    q = select(ru.printer_id, ru.bucket, ru.toner_last).where(
+        ru.resolution == "hour",
+        ru.bucket >= start,
+        ru.bucket < end,
+        ru.toner_last.isnot(None),
+    )
+    result = db.connection().execute(q)  # index-only scan of ix_printer_reading_rollups_bucket
+    try:
+        # Raw driver tuples (bucket is a string on SQLite, a datetime on
+        # Postgres; numpy parses either) instead of Rows with DateTime processing
+        rows = result.cursor.fetchall()
+    finally:
+        result.close()
+    n = len(rows)
+    pid = np.fromiter(map(itemgetter(0), rows), dtype=np.int64, count=n)
+    bucket = np.array(list(map(itemgetter(1), rows)), dtype="datetime64[us]")
+    y = np.fromiter(map(itemgetter(2), rows), dtype=np.int64, count=n)
+    del rows
+    h = (bucket - np.datetime64(EPOCH, "us")) // np.timedelta64(1, "h")
+    order = np.lexsort((h, pid))
+    return pid[order], h[order].astype(np.int64), y[order]
+
+
+_SUMS = models.PrinterForecastSums.__table__
+
+
+def _load_sums(db: Session) -> dict:
+    result = db.connection().execute(select(*(_SUMS.c[f] for f in _STATE_FIELDS)).order_by(_SUMS.c.printer_id))
+    try:
+        rows = result.cursor.fetchall()  # all integers: raw tuples straight into one array
+    finally:
+        result.close()
+    if not rows:
+        return empty_sums()
+    table = np.array(rows, dtype=np.int64)
+    return {f: table[:, i] for i, f in enumerate(_STATE_FIELDS)}
+
+
+def _save_sums(db: Session, sums: dict) -> None:
+    # Core executemany on the table: no ORM bulk-insert bookkeeping for ~10k rows
+    conn = db.connection()
+    conn.execute(delete(_SUMS))
+    rows = np.column_stack([sums[f] for f in _STATE_FIELDS]).tolist()
+    if rows:
+        conn.execute(insert(_SUMS), [dict(zip(_STATE_FIELDS, r)) for r in rows])
+
+
+def _chunks(start: datetime, end: datetime, step: timedelta = timedelta(days=1)):
+    while start < end:
+        yield start, min(start + step, end)
+        start += step
+
+
+def update_sums(db: Session) -> dict:
+    """
+    Bring the sums up to the rollup watermark (inside the caller's transaction)
+    and return them. The first run, or one after a gap longer than the window,
+    rebuilds from the window a day at a time; later runs read only the hours
+    rolled up since, plus the hours leaving the window.
+    """
+    until = get_watermark(db)
+    st = models.Setting
+    marker = db.query(st).filter(st.key == _SUMS_UNTIL_KEY).first()
+    done = datetime.fromisoformat(marker.value) if marker and marker.value else None
+    if until is None or until == done:
+        return _load_sums(db)
+
+    # Claim the step before touching the sums: a concurrent worker blocks on
+    # this row, then matches nothing and keeps the sums as committed
+    if marker is None:
+        db.add(st(key=_SUMS_UNTIL_KEY, value=until.isoformat()))
+        db.flush()
+    elif not db.execute(
+        update(st)
+        .where(st.key == _SUMS_UNTIL_KEY, st.value == marker.value)
+        .values(value=until.isoformat())
+        .execution_options(synchronize_session=False)
+    ).rowcount:
+        db.rollback()
+        return _load_sums(db)
+
+    window = timedelta(days=FORECAST_WINDOW_DAYS)
+    if done is None or not (until - window < done < until):
+        sums = empty_sums()
+        for lo, hi in _chunks(until - window, until):
+            sums = add_points(sums, *_load_points(db, lo, hi))
+    else:
+        sums = _load_sums(db)
+        for lo, hi in _chunks(done, until):
+            sums = add_points(sums, *_load_points(db, lo, hi))
+        for lo, hi in _chunks(done - window, until - window):
+            sums = expire_points(sums, *_load_points(db, lo, hi))
+        # Same state a rebuild would have: segments start in the window at the earliest
+        first_hour = (until - window - EPOCH) // timedelta(hours=1)
+        sums["segment_start"] = np.maximum(sums["segment_start"], first_hour)
+    _save_sums(db, sums)
+    return sums
+
+
+def recompute_forecasts(db: Session, now: Optional[datetime] = None) -> int:
+    """Refit every printer with toner history in the window. Returns rows written."""
+    now = now or _utcnow()
+    sums = update_sums(db)
+    # History (and so the sums) outlives deleted printers
+    existing = np.array(db.execute(select(models.Printer.id)).scalars().all(), dtype=np.int64)
+    alive = np.isin(sums["printer_id"], existing)
+    fit = fit_sums({f: v[alive] for f, v in sums.items()})
+
+    depleting = (fit["samples"] >= MIN_POINTS) & (fit["slope"] < 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_left = np.where(depleting, np.maximum(fit["level_at_last"], 0) / -fit["slope"], np.nan)
+    days_left = np.where(days_left <= MAX_FORECAST_DAYS, days_left, np.nan)
+    confidence = fit["r2"] * np.minimum(1.0, fit["samples"] / FULL_CONFIDENCE_POINTS)
+
+    out = []
+    for i in range(len(fit["printer_id"])):
+        empty_in = days_left[i]
+        slope = fit["slope"][i]
+        out.append({
+            "printer_id": int(fit["printer_id"][i]),
+            "forecast_empty_at": (
+                None if np.isnan(empty_in)
+                else _round_minute(EPOCH + timedelta(hours=int(fit["last_hour"][i]), days=float(empty_in)))
+            ),
+            "slope_per_day": None if np.isnan(slope) else float(slope),
+            "confidence": round(float(confidence[i]), 3),
+            "samples": int(fit["samples"][i]),
+            "computed_at": now,
+        })
+
+    pf = models.PrinterForecast
+    served = lambda r: (r["forecast_empty_at"], r["confidence"])  # noqa: E731
+    old = {r.printer_id: served(r._mapping) for r in db.execute(
+        select(pf.printer_id, pf.forecast_empty_at, pf.confidence)
+    )}
+    new = {r["printer_id"]: served(r) for r in out}
+    changed = [pid for pid in old.keys() | new.keys() if old.get(pid) != new.get(pid)]
+
+    db.execute(delete(pf))
+    if out:
+        db.execute(insert(pf), out)
+    if changed:
+        p = models.Printer
+        db.execute(
+            update(p)
+            .where(p.id.in_(changed))
+            .values(version=p.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        stage_log(db, dict.fromkeys(changed, False))
+    # Changed forecasts, plus unchanged ones the alert window has caught up with
+    horizon = now + timedelta(days=FORECAST_ALERT_DAYS)
+    due = {pid for pid, (empty_at, _) in new.items() if empty_at is not None and empty_at <= horizon}
+    stage_forecast_alerts(db, {pid: new.get(pid, (None, None))[0] for pid in due.union(changed)}, now)
+    db.commit()
+    return len(out)
+
@@ -0,0 +1,365 @@
+"""
+Printer reading history: append-only raw rows, hourly/daily rollups, retention.
+
+Tiers (cheapest first for long ranges):
+  day   — printer_reading_rollups, resolution=day, kept forever
+  hour  — printer_reading_rollups, resolution=hour, kept HOURLY_RETENTION_DAYS
+  raw   — printer_readings, kept RAW_RETENTION_DAYS
+
+Rollups run from the maintenance loop up to a watermark (last complete hour).
+Anything newer than the watermark is aggregated from raw rows on read, so
+charts never lag behind the latest report.
+
+On Postgres printer_readings is partitioned by month; retention drops whole
+partitions once every row in them is past the cutoff. Elsewhere it deletes rows.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from sqlalchemy import delete, event, func, insert, text, tuple_
+from sqlalchemy.orm import Session
+
+import models
+
+logger = logging.getLogger(__name__)
+
+# Pilot knobs
+RAW_RETENTION_DAYS = 35
+HOURLY_RETENTION_DAYS = 400
+RESOLUTIONS = ("raw", "hour", "day")
+
+_WATERMARK_KEY = "history_rollup_until"
+_READINGS = models.PrinterReading.__table__
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def _floor(dt: datetime, resolution: str) -> datetime:
+    dt = dt.replace(minute=0, second=0, microsecond=0)
+    return dt.replace(hour=0) if resolution == "day" else dt
+
+
+# --------------------------- writes ---------------------------------
+
+def stage_readings(db: Session, rows: list[dict]) -> None:
+    """
+    Queue raw readings inside the caller's transaction (no commit).
+    rows: printer_id, ts, source, ok, toner_level, status, status_detail.
+    """
+    if rows:
+        db.execute(insert(models.PrinterReading), rows)
+
+
+def reading_row(
+    printer_id: int,
+    ts: datetime,
+    source: str,
+    *,
+    ok: bool = True,
+    toner_level: Optional[int] = None,
+    status: Optional[str] = None,
+    status_detail: Optional[str] = None,
+) -> dict:
+    return {
+        "printer_id": printer_id,
+        "ts": ts,
+        "source": source,
+        "ok": ok,
+        "toner_level": toner_level,
+        "status": status,
+        "status_detail": status_detail,
+    }
+
+
+# --------------------------- aggregation ----------------------------
+
+def _aggregate(points: Iterable, resolution: str) -> list[dict]:
+    """
+    Fold ts-ordered points (per printer) into buckets. Points are raw readings
+    or finer rollups, both in the same rollup-shaped dict form.
+    """
+    out: dict[tuple, dict] = {}
+    for p in points:
+        key = (p["printer_id"], _floor(p["ts"], resolution))
+        agg = out.get(key)
+        if agg is None:
+            agg = out[key] = {
+                "printer_id": key[0],
+                "resolution": resolution,
+                "bucket": key[1],
+                "toner_min": None,
+                "toner_max": None,
+                "toner_last": None,
+                "status_last": None,
+                "samples": 0,
+                "failures": 0,
+            }
+        if p["toner_min"] is not None:
+            agg["toner_min"] = p["toner_min"] if agg["toner_min"] is None else min(agg["toner_min"], p["toner_min"])
+            agg["toner_max"] = p["toner_max"] if agg["toner_max"] is None else max(agg["toner_max"], p["toner_max"])
+            agg["toner_last"] = p["toner_last"]
+        if p["status_last"] is not None:
+            agg["status_last"] = p["status_last"]
+        agg["samples"] += p["samples"]
+        agg["failures"] += p["failures"]
+    return list(out.values())
+
+
+def _raw_points(db: Session, start: Optional[datetime], end: Optional[datetime], printer_id: Optional[int] = None):
+    r = models.PrinterReading
+    q = db.query(r.printer_id, r.ts, r.ok, r.toner_level, r.status)
+    if printer_id is not None:
+        q = q.filter(r.printer_id == printer_id)
+    if start is not None:
+        q = q.filter(r.ts >= start)
+    if end is not None:
+        q = q.filter(r.ts < end)
+    for pid, ts, ok, toner, status in q.order_by(r.printer_id, r.ts).yield_per(5000):
+        yield {
+            "printer_id": pid,
+            "ts": ts,
+            "toner_min": toner,
+            "toner_max": toner,
+            "toner_last": toner,
+            "status_last": status,
+            "samples": 1,
+            "failures": 0 if ok else 1,
+        }
+
+
+def _rollup_points(db: Session, resolution: str, start: datetime, end: datetime, printer_id: Optional[int] = None):
+    ru = models.PrinterReadingRollup
+    q = db.query(ru).filter(ru.resolution == resolution, ru.bucket >= start, ru.bucket < end)
+    if printer_id is not None:
+        q = q.filter(ru.printer_id == printer_id)
+    for row in q.order_by(ru.printer_id, ru.bucket).yield_per(5000):
+        yield {
+            "printer_id": row.printer_id,
+            "ts": row.bucket,
+            "toner_min": row.toner_min,
+            "toner_max": row.toner_max,
+            "toner_last": row.toner_last,
+            "status_last": row.status_last,
+            "samples": row.samples,
+            "failures": row.failures,
+        }
+
+
+def get_watermark(db: Session) -> Optional[datetime]:
+    row = db.query(models.Setting).filter(models.Setting.key == _WATERMARK_KEY).first()
+    return datetime.fromisoformat(row.value) if row and row.value else None
+
+
+def _set_watermark(db: Session, value: datetime) -> None:
+    row = db.query(models.Setting).filter(models.Setting.key == _WATERMARK_KEY).first()
+    if not row:
+        db.add(models.Setting(key=_WATERMARK_KEY, value=value.isoformat()))
+    else:
+        row.value = value.isoformat()
+
+
+def _replace_rollups(db: Session, resolution: str, start: datetime, end: datetime, rows: list[dict]) -> None:
+    ru = models.PrinterReadingRollup
+    db.execute(delete(ru).where(ru.resolution == resolution, ru.bucket >= start, ru.bucket < end))
+    if rows:
+        db.execute(insert(ru), rows)
+
+
+def rollup(db: Session, now: Optional[datetime] = None) -> None:
+    """Aggregate complete hours since the watermark, then re-derive touched days."""
+    now = now or _utcnow()
+    end = _floor(now, "hour")
+    start = get_watermark(db)
+    if start is None:
+        first = db.query(func.min(models.PrinterReading.ts)).scalar()
+        if first is None:
+            return
+        start = _floor(first, "hour")
+    if start >= end:
+        return
+
+    hourly = _aggregate(_raw_points(db, start, end), "hour")
+    _replace_rollups(db, "hour", start, end, hourly)
+
+    day_start = _floor(start, "day")
+    daily = _aggregate(_rollup_points(db, "hour", day_start, end), "day")
+    _replace_rollups(db, "day", day_start, end, daily)
+
+    _set_watermark(db, end)
+    db.commit()
+
+
+# --------------------------- retention ------------------------------
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def _next_month(dt: datetime) -> datetime:
+    return (_month_start(dt) + timedelta(days=32)).replace(day=1)
+
+
+def _partition_name(month: datetime) -> str:
+    return f"{_READINGS.name}_y{month.year:04d}m{month.month:02d}"
+
+
+def _create_month_partition(conn, month: datetime) -> None:
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_partition_name(month)} PARTITION OF {_READINGS.name} "
+        f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{_next_month(month):%Y-%m-%d}')"
+    ))
+
+
+@event.listens_for(_READINGS, "after_create")
+def _init_partitions(target, connection, **kw):
+    if connection.dialect.name != "postgresql":
+        return
+    # DEFAULT catches rows if maintenance ever falls behind on creating months
+    connection.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {_READINGS.name}_default PARTITION OF {_READINGS.name} DEFAULT"
+    ))
+    month = _month_start(_utcnow())
+    _create_month_partition(connection, month)
+    _create_month_partition(connection, _next_month(month))
+
+
+def ensure_partitions(db: Session, now: Optional[datetime] = None) -> None:
+    """Postgres only: keep this and next month's partitions in place ahead of writes."""
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    month = _month_start(now or _utcnow())
+    conn = db.connection()
+    _create_month_partition(conn, month)
+    _create_month_partition(conn, _next_month(month))
+    db.commit()
+
+
+def apply_retention(db: Session, now: Optional[datetime] = None) -> None:
+    """Drop raw rows past RAW_RETENTION_DAYS (never un-rolled-up ones) and old hourly rollups."""
+    now = now or _utcnow()
+    watermark = get_watermark(db)
+    if watermark is None:
+        return
+    cutoff = min(now - timedelta(days=RAW_RETENTION_DAYS), watermark)
+
+    if db.get_bind().dialect.name == "postgresql":
+        rows = db.execute(text(
+            "SELECT c.relname FROM pg_inherits i "
+            "JOIN pg_class c ON c.oid = i.inhrelid "
+            "JOIN pg_class p ON p.oid = i.inhparent "
+            "WHERE p.relname = :parent"
+        ), {"parent": _READINGS.name}).scalars().all()
+        prefix = f"{_READINGS.name}_y"
+        for name in rows:
+            if not name.startswith(prefix):
+                continue
+            month = datetime.strptime(name[len(prefix):], "%Ym%m")
+            if _next_month(month) <= cutoff:
+                db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+                logger.info("history retention: dropped partition %s", name)
+    else:
+        db.execute(delete(models.PrinterReading).where(models.PrinterReading.ts < cutoff))
+
+    ru = models.PrinterReadingRollup
+    db.execute(delete(ru).where(
+        ru.resolution == "hour",
+        ru.bucket < now - timedelta(days=HOURLY_RETENTION_DAYS),
+    ))
+    db.commit()
+
+
+# --------------------------- reads ----------------------------------
+
+def pick_resolution(start: datetime, end: datetime, now: Optional[datetime] = None) -> str:
+    """
+    Finest tier that is both cheap enough for the span and still holds data
+    back to start: a short range that begins before raw retention would
+    otherwise come back empty or truncated.
+    """
+    now = now or _utcnow()
+    span = end - start
+    if span <= timedelta(days=2) and start >= now - timedelta(days=RAW_RETENTION_DAYS):
+        return "raw"
+    if span <= timedelta(days=60) and start >= now - timedelta(days=HOURLY_RETENTION_DAYS):
+        return "hour"
+    return "day"
+
+
+def get_history(
+    db: Session,
+    printer_id: int,
+    start: datetime,
+    end: datetime,
+    resolution: str,
+) -> list[dict]:
+    """
+    Points in [start, end) at the requested resolution. Rollup tiers serve
+    everything before the watermark; the tail after it is folded from raw.
+    """
+    if resolution == "raw":
+        return [
+            {"ts": p["ts"], **{k: p[k] for k in _POINT_FIELDS}}
+            for p in _raw_points(db, start, end, printer_id)
+        ]
+
+    watermark = get_watermark(db) or start
+    split = max(start, min(end, watermark))
+    points = list(_rollup_points(db, resolution, _floor(start, resolution), split, printer_id))
+    if split < end:
+        tail = _aggregate(_raw_points(db, split, end, printer_id), resolution)
+        if points and tail and points[-1]["ts"] == tail[0]["bucket"]:
+            # Daily bucket straddles the watermark: merge rolled-up head with raw tail
+            head = points.pop()
+            tail = _aggregate([head, {**tail[0], "ts": tail[0]["bucket"]}], resolution) + tail[1:]
+        points.extend({**t, "ts": t["bucket"]} for t in tail)
+    return [{"ts": p["ts"], **{k: p[k] for k in _POINT_FIELDS}} for p in points]
+
+
+_POINT_FIELDS = ("toner_min", "toner_max", "toner_last", "status_last", "samples", "failures")
+
+
+# --------------------------- export ---------------------------------
+
+RAW_EXPORT_FIELDS = ("printer_id", "ts", "source", "ok", "toner_level", "status", "status_detail")
+ROLLUP_EXPORT_FIELDS = ("printer_id", "ts") + _POINT_FIELDS
+
+
+def iter_export(
+    db: Session,
+    resolution: str,
+    *,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    printer_ids=None,
+    after: Optional[tuple[int, datetime]] = None,
+    batch: int = 5000,
+):
+    """
+    One tier's rows as dicts in (printer_id, ts) order — primary key order
+    for both tables — streamed in batches. printer_ids: optional id select;
+    after: resume strictly past this (printer_id, ts).
+    """
+    if resolution == "raw":
+        t = models.PrinterReading
+        ts = t.ts
+        q = db.query(*(getattr(t, f) for f in RAW_EXPORT_FIELDS))
+    else:
+        t = models.PrinterReadingRollup
+        ts = t.bucket
+        q = db.query(t.printer_id, t.bucket.label("ts"), *(getattr(t, f) for f in _POINT_FIELDS))
+        q = q.filter(t.resolution == resolution)
+    if printer_ids is not None:
+        q = q.filter(t.printer_id.in_(printer_ids))
+    if start is not None:
+        q = q.filter(ts >= start)
+    if end is not None:
+        q = q.filter(ts < end)
+    if after is not None:
+        q = q.filter(tuple_(t.printer_id, ts) > tuple_(*after))
+    for row in q.order_by(t.printer_id, ts).yield_per(batch):
+        yield row._asdict()
@@ -0,0 +1,60 @@
+"""
+Periodic background jobs (history rollups/retention, forecasts, ...).
+
+Runs in-process from the app lifespan on every worker. Jobs must be
+idempotent — two workers running the same job back to back is expected.
+Set MAINTENANCE_INTERVAL_SECONDS=0 to disable (e.g. when a single dedicated
+worker or cron runs `python -m services.maintenance` instead).
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime
+from typing import Callable, Optional
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from services import fleet_counters, forecast, history, printer_changes, printer_status
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL_SECONDS = int(os.getenv("MAINTENANCE_INTERVAL_SECONDS", "300"))
+
+# (name, job) — each job receives its own session and the shared "now"
+JOBS: list[tuple[str, Callable[[Session, datetime], None]]] = [
+    ("stale_sweep", printer_status.sweep_stale),
+    ("fleet_counters_reconcile", fleet_counters.reconcile),
+    ("change_log_compaction", printer_changes.compact),
+    ("history_partitions", history.ensure_partitions),
+    ("history_rollup", history.rollup),
+    ("history_retention", history.apply_retention),
+    # After rollups so the latest complete hour is in the fit
+    ("forecast", forecast.recompute_forecasts),
+]
+
+
+def run_once(now: Optional[datetime] = None) -> None:
+    now = now or datetime.utcnow()
+    for name, job in JOBS:
+        db = SessionLocal()
+        try:
+            job(db, now)
+        except Exception:
+            db.rollback()
+            logger.exception("maintenance job %s failed", name)
+        finally:
+            db.close()
+
+
+async def maintenance_loop(interval: float = MAINTENANCE_INTERVAL_SECONDS) -> None:
+    while True:
+        await asyncio.to_thread(run_once)
+        await asyncio.sleep(interval)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_once()
@@ -0,0 +1,297 @@
+"""
+Alert notifications (email / webhook) through an outbox.
+
+Ingest never waits on SMTP or HTTP: services.alerts stages one outbox row
+per (alert event, target) inside the writer's transaction (stage()), and the
+dispatcher — an asyncio task started from the app lifespan, or
+`python -m services.notifications` — delivers them:
+
+  - claims due rows in batches; on Postgres FOR UPDATE SKIP LOCKED plus a
+    lease keeps several workers from sending the same row
+  - one digest per target per batch, all targets delivered concurrently
+  - webhooks over one pooled aiohttp session, email over one reused SMTP
+    connection
+  - a failed delivery retries with exponential backoff and jitter; after
+    MAX_ATTEMPTS the rows are marked failed with the last error
+
+Targets: NOTIFY_EMAILS and NOTIFY_WEBHOOKS (comma-separated). With neither
+set nothing is staged and the dispatcher does not start. Everything is
+plain SMTP/HTTP, so a local SMTP sink (SMTP_HOST=localhost SMTP_PORT=1025)
+and any local HTTP receiver are enough to try it end to end.
+"""
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import threading
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+from typing import Optional
+
+import aiohttp
+from sqlalchemy import insert, update
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _split(value: str) -> list[str]:
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+NOTIFY_EMAILS = _split(os.getenv("NOTIFY_EMAILS", ""))
+NOTIFY_WEBHOOKS = _split(os.getenv("NOTIFY_WEBHOOKS", ""))
+NOTIFY_RESOLVED = os.getenv("NOTIFY_RESOLVED", "1") != "0"
+
+SMTP_HOST = os.getenv("SMTP_HOST", "localhost")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "25"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", "tonertrack@localhost")
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "0") == "1"
+
+# Pilot knobs
+POLL_SECONDS = float(os.getenv("NOTIFY_POLL_SECONDS", "10"))
+BATCH_SIZE = 200
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+LEASE_SECONDS = 300  # a claimed row is retried after this if its worker died mid-send
+SEND_TIMEOUT_SECONDS = 20
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+def targets() -> list[str]:
+    return [f"mailto:{e}" for e in NOTIFY_EMAILS] + NOTIFY_WEBHOOKS
+
+
+def enabled() -> bool:
+    return bool(targets())
+
+
+# --------------------------- outbox ---------------------------------
+
+def stage(db: Session, events: list[dict], now: Optional[datetime] = None) -> None:
+    """
+    Queue alert events for every target (no commit). events: alert_id,
+    event (raised | resolved), printer_id, alert_type, message.
+    """
+    if not NOTIFY_RESOLVED:
+        events = [e for e in events if e["event"] != "resolved"]
+    to = targets()
+    if not events or not to:
+        return
+    now = now or _utcnow()
+    db.execute(insert(models.Notification), [
+        {
+            "alert_id": e["alert_id"],
+            "event": e["event"],
+            "target": target,
+            "payload": {**e, "at": now.isoformat()},
+            "state": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+        for e in events
+        for target in to
+    ])
+
+
+def _claim(now: datetime, limit: int = BATCH_SIZE) -> list[dict]:
+    """Due rows, leased to this worker until now + LEASE_SECONDS."""
+    n = models.Notification
+    db = SessionLocal()
+    try:
+        q = (
+            db.query(n.id, n.target, n.payload, n.attempts)
+            .filter(n.state == "pending", n.next_attempt_at <= now)
+            .order_by(n.id)
+            .limit(limit)
+        )
+        if db.get_bind().dialect.name == "postgresql":
+            q = q.with_for_update(skip_locked=True)
+        rows = [r._asdict() for r in q]
+        if rows:
+            db.execute(
+                update(n)
+                .where(n.id.in_([r["id"] for r in rows]))
+                .values(next_attempt_at=now + timedelta(seconds=LEASE_SECONDS))
+                .execution_options(synchronize_session=False)
+            )
+            p = models.Printer
+            names = dict(db.query(p.id, p.name).filter(p.id.in_({r["payload"]["printer_id"] for r in rows})))
+            for r in rows:
+                pid = r["payload"]["printer_id"]
+                r["payload"] = {**r["payload"], "printer_name": names.get(pid, f"Printer #{pid}")}
+        db.commit()
+        return rows
+    finally:
+        db.close()
+
+
+def backoff(attempts: int) -> timedelta:
+    """Delay before retry number `attempts` (1-based), with jitter."""
+    delay = min(BACKOFF_BASE_SECONDS * 2 ** (attempts - 1), BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.5, 1.0))
+
+
+def _record(results: list[tuple[list[dict], Optional[str]]], now: datetime) -> None:
+    """results: (claimed rows, error or None) per delivered digest."""
+    values = []
+    for rows, error in results:
+        for r in rows:
+            attempts = r["attempts"] + 1
+            if error is None:
+                values.append({"id": r["id"], "attempts": attempts, "state": "sent", "sent_at": now, "last_error": None})
+            else:
+                values.append({
+                    "id": r["id"],
+                    "attempts": attempts,
+                    "state": "failed" if attempts >= MAX_ATTEMPTS else "pending",
+                    "next_attempt_at": now + backoff(attempts),
+                    "last_error": error,
+                })
+    if not values:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(update(models.Notification), values)
+        db.commit()
+    finally:
+        db.close()
+
+
+# --------------------------- delivery -------------------------------
+
+def _digest_lines(payloads: list[dict]) -> list[str]:
+    return [
+        f"[{p['event']}] {p['printer_name']}: {p['message']} ({p['alert_type']}, {p['at']})"
+        for p in payloads
+    ]
+
+
+def _email(to: str, payloads: list[dict]) -> EmailMessage:
+    msg = EmailMessage()
+    raised = sum(p["event"] == "raised" for p in payloads)
+    msg["Subject"] = f"TonerTrack: {raised} new, {len(payloads) - raised} resolved alert(s)"
+    msg["From"] = SMTP_FROM
+    msg["To"] = to
+    msg.set_content("\n".join(_digest_lines(payloads)) + "\n")
+    return msg
+
+
+class _SmtpConnection:
+    """One SMTP session reused across digests; reconnects when the server dropped it."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._conn: Optional[smtplib.SMTP] = None
+
+    def _connect(self) -> smtplib.SMTP:
+        conn = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SEND_TIMEOUT_SECONDS)
+        if SMTP_STARTTLS:
+            conn.starttls()
+        if SMTP_USER:
+            conn.login(SMTP_USER, SMTP_PASSWORD)
+        return conn
+
+    def send(self, msg: EmailMessage) -> None:
+        with self._lock:
+            for retry in (False, True):
+                if self._conn is None:
+                    self._conn = self._connect()
+                try:
+                    self._conn.send_message(msg)
+                    return
+                except smtplib.SMTPServerDisconnected:
+                    self._conn = None  # idle timeout on the server side: reconnect once
+                    if retry:
+                        raise
+                except Exception:
+                    self._close()
+                    raise
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.quit()
+            except Exception:
+                pass
+            self._conn = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._close()
+
+
+class Dispatcher:
+    def __init__(self):
+        self._http: Optional[aiohttp.ClientSession] = None
+        self._smtp = _SmtpConnection()
+
+    async def run_once(self) -> int:
+        """Deliver one batch of due rows; returns how many were claimed."""
+        rows = await asyncio.to_thread(_claim, _utcnow())
+        if not rows:
+            return 0
+        by_target: dict[str, list[dict]] = {}
+        for r in rows:
+            by_target.setdefault(r["target"], []).append(r)
+        errors = await asyncio.gather(*(self._deliver(t, batch) for t, batch in by_target.items()))
+        await asyncio.to_thread(_record, list(zip(by_target.values(), errors)), _utcnow())
+        return len(rows)
+
+    async def _deliver(self, target: str, rows: list[dict]) -> Optional[str]:
+        payloads = [r["payload"] for r in rows]
+        try:
+            if target.startswith("mailto:"):
+                await asyncio.to_thread(self._smtp.send, _email(target[len("mailto:"):], payloads))
+            else:
+                await self._post(target, payloads)
+            return None
+        except Exception as e:
+            logger.warning("notification to %s failed (%d alerts): %s", target, len(rows), e)
+            return f"{type(e).__name__}: {e}"[:500]
+
+    async def _post(self, url: str, payloads: list[dict]) -> None:
+        if self._http is None:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=SEND_TIMEOUT_SECONDS))
+        async with self._http.post(url, json={"source": "tonertrack", "alerts": payloads}) as resp:
+            if resp.status >= 300:
+                raise RuntimeError(f"HTTP {resp.status}")
+
+    async def close(self) -> None:
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        await asyncio.to_thread(self._smtp.close)
+
+
+async def dispatcher_loop(poll: float = POLL_SECONDS) -> None:
+    dispatcher = Dispatcher()
+    try:
+        while True:
+            try:
+                claimed = await dispatcher.run_once()
+            except Exception:
+                logger.exception("notification dispatch failed")
+                claimed = 0
+            if claimed < BATCH_SIZE:  # full batch: more are probably due, go again
+                await asyncio.sleep(poll)
+    finally:
+        await dispatcher.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(dispatcher_loop())
@@ -0,0 +1,213 @@
+"""
+One hook for every printer write path, staged in the writer's transaction.
+
+Callers bump the row's own `version` in the same UPDATE that changes it and
+then hand stage_changes() what they touched: (printer_id, old snapshot, new
+row). Here that becomes
+
+  - fleet counter deltas
+  - one bump of the fleet version — the single-row counter conditional GETs
+    compare against, so an unchanged fleet is answered from one PK read
+  - change log rows at that version (delta sync, GET /printers/changes, and
+    the SSE feed in services.printer_events)
+  - on Postgres, a NOTIFY with the new version for other workers' read caches
+    and event feeds
+  - alert rules for the changed printers (services.alerts)
+
+The fleet version doubles as the delta sync cursor. Bumping it row-locks the
+counter until commit, so versions become visible in order and a client that
+has seen version N can never later miss a change numbered N or lower.
+"""
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Optional
+
+from sqlalchemy import delete, exists, func, insert, text, update
+from sqlalchemy.orm import Session, aliased
+
+import models
+from services import alerts, fleet_counters
+from services.fleet_counters import Snapshot
+
+# Pilot knobs
+CHANGE_LOG_RETENTION_DAYS = 7
+
+NOTIFY_CHANNEL = "tonertrack_fleet_version"
+COMMITTED_VERSION_KEY = "fleet_version"  # session.info, read after commit by services.read_cache
+
+_FLEET_ROW = 1
+_FLOOR_KEY = "printer_change_log_floor"
+
+
+class CursorExpired(Exception):
+    """since= is older than the compacted log (or newer than the fleet): full resync needed."""
+
+
+def _utcnow() -> datetime:
+    return datetime.utcnow()
+
+
+# Row field -> delta key (PrinterResponse names where they differ)
+DELTA_FIELDS = {
+    "name": "name",
+    "location": "location",
+    "department": "department",
+    "effective_status": "status",
+    "is_stale": "stale",
+    "status_detail": "status_detail",
+    "toner_level": "toner_level",
+    "fail_streak": "fail_streak",
+    "last_verified_at": "last_verified_at",
+    "last_attempt_at": "last_attempt_at",
+    "version": "version",
+}
+
+
+def stage_changes(db: Session, changes: Iterable[tuple[int, Optional[Snapshot], Any]]) -> None:
+    """
+    Inside the caller's transaction (no commit). Each change is
+    (printer_id, snapshot before or None if created, Printer/mapping after or
+    None if deleted).
+    """
+    changes = list(changes)
+    if not changes:
+        return
+    fleet_counters.stage_transitions(db, (
+        (old, fleet_counters.snapshot(new) if new is not None else None)
+        for _, old, new in changes
+    ))
+    stage_log(db, {pid: new is None for pid, _, new in changes})
+    alerts.stage_alerts(db, {pid: new for pid, _, new in changes})
+
+
+def delta(printer_id: int, row: Any) -> dict:
+    """What a dashboard needs to patch one row in place; deletes are tombstones."""
+    if row is None:
+        return {"id": printer_id, "deleted": True}
+    get = row.get if isinstance(row, dict) else lambda k: getattr(row, k, None)
+    out = {"id": printer_id}
+    for field, key in DELTA_FIELDS.items():
+        value = get(field)
+        out[key] = value.isoformat() if isinstance(value, datetime) else value
+    return out
+
+
+def rows_by_id(db: Session, printer_ids) -> dict[int, dict]:
+    """Current rows (snapshot + delta fields) for many printers in one IN query."""
+    ids = list(printer_ids)
+    if not ids:
+        return {}
+    p = models.Printer
+    cols = [p.id] + [getattr(p, f) for f in DELTA_FIELDS]
+    return {r.id: r._asdict() for r in db.query(*cols).filter(p.id.in_(ids))}
+
+
+def stage_log(db: Session, deleted_by_id: dict[int, bool]) -> Optional[int]:
+    """
+    Bump the fleet version and log which printers changed at it (no commit).
+    Called directly by writes that change served fields without a status
+    transition (forecast refits). Returns the new version; None, with nothing
+    bumped or notified, when no printer changed.
+    """
+    if not deleted_by_id:
+        return None
+    version = _bump_fleet_version(db)
+    db.info[COMMITTED_VERSION_KEY] = version
+    if db.get_bind().dialect.name == "postgresql":
+        # Delivered to other workers' read caches when (and only if) this commits
+        db.execute(text("SELECT pg_notify(:channel, :version)"), {"channel": NOTIFY_CHANNEL, "version": str(version)})
+    now = _utcnow()
+    db.execute(insert(models.PrinterChange), [
+        {"version": version, "printer_id": pid, "deleted": deleted, "changed_at": now}
+        for pid, deleted in deleted_by_id.items()
+    ])
+    return version
+
+
+def _bump_fleet_version(db: Session) -> int:
+    fv = models.FleetVersion
+    stmt = (
+        update(fv)
+        .where(fv.id == _FLEET_ROW)
+        .values(version=fv.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        version = db.execute(stmt.returning(fv.version)).scalar()
+    else:
+        # Same transaction, so the read sees our increment
+        version = fleet_version(db) if db.execute(stmt).rowcount else None
+    if version is None:
+        db.execute(insert(fv).values(id=_FLEET_ROW, version=1))
+        version = 1
+    return version
+
+
+def fleet_version(db: Session) -> int:
+    """Current fleet version (0 before the first write)."""
+    fv = models.FleetVersion
+    return db.query(fv.version).filter(fv.id == _FLEET_ROW).scalar() or 0
+
+
+def row_version(db: Session, printer_id: int) -> Optional[int]:
+    """One printer's version without loading the row; None if it does not exist."""
+    p = models.Printer
+    return db.query(p.version).filter(p.id == printer_id).scalar()
+
+
+def _floor(db: Session) -> int:
+    row = db.query(models.Setting).filter(models.Setting.key == _FLOOR_KEY).first()
+    return int(row.value) if row and row.value else 0
+
+
+def get_changes(db: Session, since: int, limit: int) -> tuple[int, bool, dict[int, bool]]:
+    """
+    Printers changed after fleet version `since`: (cursor, has_more,
+    {printer_id: deleted}). Pages end on whole versions, so one batch write is
+    never split; a single version bigger than `limit` comes back whole.
+    """
+    upto = fleet_version(db)
+    if since < _floor(db) or since > upto:
+        raise CursorExpired()
+    c = models.PrinterChange
+    q = (
+        db.query(c.version, c.printer_id, c.deleted)
+        .filter(c.version > since, c.version <= upto)
+        .order_by(c.version)
+    )
+    rows = q.limit(limit + 1).all()
+    has_more = len(rows) > limit
+    if has_more:
+        cut = rows[limit].version
+        rows = [r for r in rows if r.version < cut] or q.filter(c.version == cut).all()
+        upto = rows[-1].version
+    return upto, has_more, {r.printer_id: r.deleted for r in rows}
+
+
+def compact(db: Session, now: Optional[datetime] = None) -> None:
+    """
+    Maintenance job. Drops entries superseded by a later one for the same
+    printer (sync returns current rows, so only the latest matters), then
+    everything older than CHANGE_LOG_RETENTION_DAYS. The latter raises the
+    floor: cursors below it get CursorExpired.
+    """
+    now = now or _utcnow()
+    c = models.PrinterChange
+    newer = aliased(c)
+    db.execute(
+        delete(c)
+        .where(exists().where(newer.printer_id == c.printer_id, newer.version > c.version))
+        .execution_options(synchronize_session=False)
+    )
+    cutoff = now - timedelta(days=CHANGE_LOG_RETENTION_DAYS)
+    floor = db.query(func.max(c.version)).filter(c.changed_at < cutoff).scalar()
+    if floor:
+        db.execute(delete(c).where(c.version <= floor).execution_options(synchronize_session=False))
+        row = db.query(models.Setting).filter(models.Setting.key == _FLOOR_KEY).first()
+        if not row:
+            db.add(models.Setting(key=_FLOOR_KEY, value=str(floor)))
+        elif int(row.value or 0) < floor:
+            row.value = str(floor)
+    db.commit()
+
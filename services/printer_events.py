@@ -0,0 +1,209 @@
+"""
+Fan-out of printer deltas for GET /printers/events (SSE), fed from the change log.
+
+Each worker runs one feeder thread that follows the fleet version: it is
+woken by services.read_cache, which hears this worker's commits directly and
+other workers' through the Postgres LISTEN/NOTIFY channel, and it also checks
+every POLL_SECONDS (SQLite, or the listener is down). It reads the change log past the last
+version it published and publishes one event per fleet version (a JSON list
+of compact deltas of the current rows, deletes as tombstones, serialized
+once) into a bounded ring. Every open stream reads the same ring from its own
+position, so dashboards never query the database and every worker sees every
+write, whichever worker committed it.
+
+Event ids are fleet versions, the same on every worker, so a Last-Event-ID
+resumes on any of them. One older than the ring (or than the feeder's start)
+gets a single `resync` event — the client refetches the list (cheap with
+ETags) and carries on live.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import threading
+from collections import deque
+from typing import AsyncIterator, Optional
+
+from sqlalchemy.orm import Session
+
+import models
+from database import SessionLocal
+from services import printer_changes
+from services.read_cache import read_cache
+
+logger = logging.getLogger(__name__)
+
+# Pilot knobs
+BACKLOG_DELTAS = 20_000  # ring size, counted in printer deltas (not events)
+HEARTBEAT_SECONDS = 15.0
+RETRY_MS = 3000
+POLL_SECONDS = 5.0  # change log check when no notification arrives (SQLite, listener down)
+
+
+class Broadcaster:
+    def __init__(self, max_deltas: int = BACKLOG_DELTAS):
+        self.max_deltas = max_deltas
+        self._lock = threading.Lock()
+        self._events: deque[tuple[int, int, str]] = deque()  # (version, deltas, data)
+        self._held = 0
+        self._version = 0  # last fleet version published
+        self._floor = 0  # streams positioned below this have missed events
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._start_lock = threading.Lock()
+        self._feeder: Optional[threading.Thread] = None
+        self._pending = threading.Event()
+
+    # ------------------------- feeding ---------------------------------
+
+    def start(self) -> None:
+        """Start the feeder at the current fleet version (idempotent; the first stream does it)."""
+        with self._start_lock:
+            if self._feeder is not None:
+                return
+            with SessionLocal() as db:
+                version = printer_changes.fleet_version(db)
+            with self._lock:
+                self._version = self._floor = version
+            read_cache.subscribe(lambda _version: self._pending.set())
+            self._feeder = threading.Thread(target=self._feed_loop, name="printer-events-feed", daemon=True)
+            self._feeder.start()
+
+    def _feed_loop(self) -> None:
+        while True:
+            # Woken per new version; the timeout covers writes no one told us about
+            self._pending.wait(POLL_SECONDS)
+            self._pending.clear()
+            try:
+                with SessionLocal() as db:
+                    self.feed(db)
+            except Exception:
+                logger.warning("printer events feed failed; retrying", exc_info=True)
+
+    def feed(self, db: Session) -> None:
+        """Publish change log entries past the last published version, one event per version."""
+        with self._lock:
+            since = self._version
+        c = models.PrinterChange
+        rows = (
+            db.query(c.version, c.printer_id, c.deleted)
+            .filter(c.version > since)
+            .order_by(c.version)
+            .limit(self.max_deltas + 1)
+            .all()
+        )
+        if not rows:
+            return
+        if len(rows) > self.max_deltas:
+            # Too far behind to replay through the ring: skip ahead, streams resync
+            latest = printer_changes.fleet_version(db)
+            with self._lock:
+                self._events.clear()
+                self._held = 0
+                self._version = self._floor = latest
+            self._wake_streams()
+            return
+        current = printer_changes.rows_by_id(db, {r.printer_id for r in rows if not r.deleted})
+        by_version: dict[int, list[dict]] = {}
+        for r in rows:
+            row = None if r.deleted else current.get(r.printer_id)
+            by_version.setdefault(r.version, []).append(printer_changes.delta(r.printer_id, row))
+        for version, deltas in by_version.items():
+            self.publish(version, deltas)
+
+    def publish(self, version: int, deltas: list[dict]) -> None:
+        """Thread-safe; versions must arrive in increasing order."""
+        if not deltas:
+            return
+        data = json.dumps({"printers": deltas}, separators=(",", ":"), default=str)
+        with self._lock:
+            if version <= self._version:
+                return
+            self._version = version
+            self._events.append((version, len(deltas), data))
+            self._held += len(deltas)
+            while self._held > self.max_deltas and len(self._events) > 1:
+                dropped, n, _ = self._events.popleft()
+                self._held -= n
+                self._floor = dropped
+        self._wake_streams()
+
+    def _wake_streams(self) -> None:
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self) -> None:
+        # Swap in a fresh Event so every waiter captured before this publish wakes once
+        woken, self._wakeup = self._wakeup, asyncio.Event()
+        if woken is not None:
+            woken.set()
+
+    # ------------------------- streaming -------------------------------
+
+    def _after(self, version: int) -> tuple[list[tuple[int, int, str]], bool]:
+        """Events newer than version, and whether some were already dropped."""
+        with self._lock:
+            if version < self._floor:
+                return [], True
+            newer = []
+            for event in reversed(self._events):
+                if event[0] <= version:
+                    break
+                newer.append(event)
+            return newer[::-1], False
+
+    def _resume_point(self, last_event_id: Optional[str]) -> tuple[int, bool]:
+        """(position, needs_resync) for a stream starting now."""
+        with self._lock:
+            live = self._version
+        if not last_event_id:
+            return live, False
+        if not last_event_id.isdigit():
+            return live, True  # e.g. an id from before events were fleet versions
+        version = int(last_event_id)
+        if version < self._floor:
+            return live, True
+        # Another worker may have published a little further already; its
+        # versions reach this ring too, so wait for them rather than resync
+        return version, False
+
+    async def stream(self, last_event_id: Optional[str] = None, max_seconds: Optional[float] = None) -> AsyncIterator[str]:
+        """SSE text frames until the client goes away (or max_seconds)."""
+        self.start()
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop, self._wakeup = loop, asyncio.Event()
+        deadline = None if max_seconds is None else loop.time() + max_seconds
+
+        yield f"retry: {RETRY_MS}\n\n"
+        pos, resync = self._resume_point(last_event_id)
+        while True:
+            wakeup = self._wakeup
+            events, dropped = self._after(pos)
+            if resync or dropped:
+                # Client's position is gone: tell it to refetch, then continue live
+                with self._lock:
+                    pos = self._version
+                yield f"id: {pos}\nevent: resync\ndata: {{}}\n\n"
+                resync = False
+                continue
+            for version, _, data in events:
+                pos = version
+                yield f"id: {version}\nevent: printers\ndata: {data}\n\n"
+            if events:
+                continue
+
+            timeout = HEARTBEAT_SECONDS
+            if deadline is not None:
+                timeout = min(timeout, deadline - loop.time())
+                if timeout <= 0:
+                    return
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+
+
+broadcaster = Broadcaster()
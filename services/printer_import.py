@@ -0,0 +1,112 @@
+"""
+Spreadsheet rows -> PrinterCreate, for bulk onboarding (POST /printers/import).
+
+The first row is a header of PrinterCreate field names (case and surrounding
+spaces ignored; unknown columns are skipped). Blank cells take the field's
+default; allowed_users is a ";"-separated list, as in the CSV export.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+from typing import BinaryIO, Iterator
+
+from pydantic import ValidationError
+
+from schemas import PrinterCreate
+from services.printer_status import normalize_toner_status
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+CONNECTION_MODES = {"manual", "snmp", "web", "ping"}
+MAX_ROWS = 5000
+
+
+class ImportFileError(ValueError):
+    """The file itself is unusable (format, header, size) — nothing imported."""
+
+
+def _csv_rows(f: BinaryIO) -> Iterator[list]:
+    yield from csv.reader(codecs.iterdecode(f, "utf-8-sig"))
+
+
+def _xlsx_rows(f: BinaryIO) -> Iterator[list]:
+    if openpyxl is None:
+        raise ImportFileError("XLSX import needs openpyxl installed on the server; upload CSV instead")
+    try:
+        wb = openpyxl.load_workbook(f, read_only=True, data_only=True)
+    except Exception:
+        raise ImportFileError("Not a readable XLSX file")
+    try:
+        yield from wb.worksheets[0].iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def read_rows(f: BinaryIO, filename: str) -> Iterator[tuple[int, dict]]:
+    """(spreadsheet row number, {field: cell}) for each non-empty data row."""
+    name = (filename or "").lower()
+    if name.endswith(".xlsx"):
+        rows = _xlsx_rows(f)
+    elif name.endswith(".csv") or "." not in name:
+        rows = _csv_rows(f)
+    else:
+        raise ImportFileError("Upload a .csv or .xlsx file")
+
+    try:
+        header = next(rows)
+    except StopIteration:
+        raise ImportFileError("File is empty")
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV must be UTF-8")
+    fields = [str(h).strip().lower() if h is not None else "" for h in header]
+    if "name" not in fields:
+        raise ImportFileError("Header row must include a name column")
+    known = [(i, f) for i, f in enumerate(fields) if f in PrinterCreate.model_fields]
+
+    count = 0
+    try:
+        for number, cells in enumerate(rows, start=2):
+            values = {}
+            for i, field in known:
+                cell = cells[i] if i < len(cells) else None
+                if isinstance(cell, str):
+                    cell = cell.strip()
+                if cell not in (None, ""):
+                    values[field] = cell
+            if not values:
+                continue
+            count += 1
+            if count > MAX_ROWS:
+                raise ImportFileError(f"At most {MAX_ROWS} printers per import")
+            yield number, values
+    except UnicodeDecodeError:
+        raise ImportFileError("CSV must be UTF-8")
+
+
+def parse_row(values: dict) -> PrinterCreate:
+    """Validated PrinterCreate; ValueError with a readable message otherwise."""
+    values = dict(values)
+    users = values.get("allowed_users")
+    if isinstance(users, str):
+        values["allowed_users"] = [u.strip() for u in users.split(";") if u.strip()]
+    for key in ("name", "ip_address", "location", "department", "notes", "snmp_community"):
+        if key in values and not isinstance(values[key], str):
+            values[key] = str(values[key])  # XLSX numbers (e.g. a numeric name)
+    toner = values.get("toner_level")
+    if isinstance(toner, float) and toner.is_integer():
+        values["toner_level"] = int(toner)
+    try:
+        printer = PrinterCreate(**values)
+    except ValidationError as e:
+        raise ValueError("; ".join(
+            f"{'.'.join(str(x) for x in err['loc'])}: {err['msg']}" for err in e.errors()
+        ))
+    printer.connection_mode = (printer.connection_mode or "manual").lower()
+    if printer.connection_mode not in CONNECTION_MODES:
+        raise ValueError("connection_mode must be manual, snmp, web, or ping")
+    normalize_toner_status(printer.toner_level)  # range check; create applies it
+    return printer
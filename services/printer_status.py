@@ -14,12 +14,18 @@ Fail streak:
 from __future__ import annotations
 
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Sequence
 
 from sqlalchemy.orm import Session
-from sqlalchemy import update
+from sqlalchemy import and_, case, func, literal, or_, update
+from sqlalchemy.sql.elements import ClauseElement
+from sqlalchemy.orm.attributes import set_committed_value
 
 import models
+from services import fleet_counters
+from services import printer_changes  # module, not names: printer_changes -> alerts -> here is a cycle
+from services.history import reading_row, stage_readings
+from services.supplies import stage_supplies
 
 # Pilot knobs
 STALE_AFTER_DAYS = 7
@@ -32,13 +38,13 @@ def _utcnow() -> datetime:
     return datetime.utcnow()
 
 
-def _days_since(dt: Optional[datetime]) -> Optional[float]:
+def _days_since(dt: Optional[datetime], now: Optional[datetime] = None) -> Optional[float]:
     if dt is None:
         return None
     try:
         if getattr(dt, "tzinfo", None) is not None:
             dt = dt.replace(tzinfo=None)
-        return (_utcnow() - dt).total_seconds() / 86400.0
+        return ((now or _utcnow()) - dt).total_seconds() / 86400.0
     except Exception:
         return None
 
@@ -73,29 +79,111 @@ def apply_human_status(
         return printer
 
     now = _utcnow()
+    before = fleet_counters.snapshot(printer)
+    for key, value in _human_values(now, printer.status, status, toner_level).items():
+        setattr(printer, key, value)
+    printer.version = models.Printer.version + 1  # in SQL; see crud.update_printer
+    materialize_status(printer)
+
+    db.add(printer)
+    db.flush()
+    stage_readings(db, [reading_row(
+        printer.id, now, "human", toner_level=printer.toner_level, status=printer.status,
+    )])
+    printer_changes.stage_changes(db, [(printer.id, before, printer)])
+    db.commit()
+    db.refresh(printer)
+    return printer
+
+
+def _human_values(
+    now: datetime,
+    current_status: Optional[str],
+    status: Optional[str],
+    toner_level: Optional[int] = ...,
+) -> dict:
+    """Columns a human verification sets. Raises ValueError for out-of-range toner."""
+    values = {}
     if toner_level is not ...:
         tl, st = normalize_toner_status(
             toner_level if toner_level is not None else None,
-            status if status is not None else printer.status,
+            status if status is not None else current_status,
         )
         if toner_level is not None:
-            printer.toner_level = tl
-            printer.status = st or printer.status
+            values["toner_level"] = tl
+            values["status"] = st or current_status
         elif status is not None:
-            printer.status = status
+            values["status"] = status
     elif status is not None:
-        printer.status = status
+        values["status"] = status
+    values.update(
+        last_verified_at=now,
+        last_checked=now,  # legacy mirror
+        fail_streak=0,
+        # Human verification fully supersedes agent-side detail (e.g. leftover unreachable)
+        status_detail=None,
+    )
+    return values
 
-    printer.last_verified_at = now
-    printer.last_checked = now  # legacy mirror
-    printer.fail_streak = 0
-    # Human verification fully supersedes agent-side detail (e.g. leftover unreachable)
-    printer.status_detail = None
 
-    db.add(printer)
+# Never written through metadata updates (crud.update_printer, bulk updates):
+# clocks and streak belong to the verification paths here, the rest is derived
+PROTECTED_FIELDS = frozenset({
+    "id", "last_checked", "last_verified_at", "last_attempt_at", "fail_streak",
+    "effective_status", "is_stale", "version",
+})
+HUMAN_STATUS_FIELDS = ("status", "toner_level")
+
+
+def apply_human_updates(db: Session, changes: dict[int, dict]) -> dict[int, dict]:
+    """
+    Bulk metadata + human verification in one transaction.
+
+    changes: {printer_id: PrinterUpdate-style dict of the fields set}. Per
+    printer this is update_printer followed by apply_human_status (when
+    status/toner_level is present): same protected fields, same clocks,
+    fail_streak reset and history row. Rows go out as one executemany UPDATE
+    by primary key; version and materialized status are then refreshed in
+    one set-based pass. Unknown ids are skipped. Raises ValueError (nothing
+    written) for an out-of-range toner level.
+
+    Returns {printer_id: current row (delta fields, incl. version)}.
+    """
+    now = _utcnow()
+    p = models.Printer
+    current = {r.id: r for r in db.query(p.id, p.status, p.toner_level).filter(p.id.in_(list(changes)))}
+    if not current:
+        return {}
+    columns = {c.name for c in p.__table__.columns} - PROTECTED_FIELDS
+    rows, readings = [], []
+    for pid, data in changes.items():
+        if pid not in current:
+            continue
+        values = {k: v for k, v in data.items() if k in columns and k not in HUMAN_STATUS_FIELDS}
+        if any(k in data for k in HUMAN_STATUS_FIELDS):
+            try:
+                values.update(_human_values(
+                    now, current[pid].status, data.get("status"), data.get("toner_level", ...),
+                ))
+            except ValueError as e:
+                raise ValueError(f"Printer {pid}: {e}")
+            readings.append(reading_row(
+                pid, now, "human",
+                toner_level=values.get("toner_level", current[pid].toner_level),
+                status=values["status"] if "status" in values else current[pid].status,
+            ))
+        if values:
+            rows.append({"id": pid, **values})
+
+    before = fleet_counters.snapshots_by_id(db, current)
+    if rows:
+        db.execute(update(p), rows)
+    refresh_materialized_status(db, current, now)
+    after = printer_changes.rows_by_id(db, current)
+    printer_changes.stage_changes(db, ((pid, before.get(pid), row) for pid, row in after.items()))
+    stage_readings(db, readings)
     db.commit()
-    db.refresh(printer)
-    return printer
+    return after
 
 
 ALLOWED_STATUS_DETAILS = frozenset({
@@ -113,6 +201,7 @@ def apply_agent_result(
     status: Optional[str] = None,
     toner_level: Optional[int] = None,
     status_detail: Optional[str] = None,
+    supplies: Optional[Sequence] = None,
 ) -> models.Printer:
     """
     Agent probe result.
@@ -121,69 +210,187 @@ def apply_agent_result(
     - ok=True otherwise: successful read; clear streak; touch both clocks
     - ok=False: unreachable path; atomic streak++; flip display after N or fail-window
 
+    Each outcome is a single conditional UPDATE ... RETURNING (debounce decided
+    in SQL), so concurrent posts cannot interleave between increment and flip.
+
     status_detail must be one of ALLOWED_STATUS_DETAILS or None (validated at API boundary).
     """
     now = _utcnow()
-    printer.last_attempt_at = now
-
     if ok and status_detail == "device_reported":
-        printer.status = status or "offline"
-        printer.status_detail = "device_reported"
-        printer.fail_streak = 0
-        printer.last_verified_at = now
-        printer.last_checked = now
-        db.add(printer)
-        db.commit()
-        db.refresh(printer)
-        return printer
+        values = _device_reported_values(now, status)
+    elif ok:
+        values = _success_values(now, status, toner_level, status_detail)
+    else:
+        # Do NOT touch last_verified_at — reading is not verified
+        values = _unreachable_values(now, status_detail)
+    if ok and supplies is not None:
+        stage_supplies(db, {printer.id: supplies}, now)
+    stage_readings(db, [_agent_reading(printer.id, now, ok, values, status_detail)])
+    before = fleet_counters.snapshot(printer)
+    values = {**_with_materialized(now, values), "version": models.Printer.version + 1}
+    row = _update_returning(db, printer, values)
+    printer_changes.stage_changes(db, [(printer.id, before, row)])
+    db.commit()
+    # Commit expired the instance; seed it from the returned row instead of re-SELECTing
+    for key, value in row.items():
+        set_committed_value(printer, key, value)
+    return printer
 
-    if ok:
-        if toner_level is not None or status is not None:
-            tl, st = normalize_toner_status(toner_level, status)
-            if toner_level is not None:
-                printer.toner_level = tl
-            if st:
-                printer.status = st
-            elif status:
-                printer.status = status
-        printer.status_detail = status_detail
-        printer.fail_streak = 0
-        printer.last_verified_at = now
-        printer.last_checked = now
-        db.add(printer)
-        db.commit()
-        db.refresh(printer)
-        return printer
 
-    # Unreachable / transport failure — debounce
-    # Atomic increment to avoid lost updates under concurrent agent posts
-    db.execute(
+def _agent_reading(printer_id: int, ts: datetime, ok: bool, values: dict, status_detail: Optional[str]) -> dict:
+    """History row for one agent outcome — what was observed, not the debounced display."""
+    if not ok:
+        return reading_row(printer_id, ts, "agent", ok=False, status_detail=status_detail or "unreachable")
+    return reading_row(
+        printer_id, ts, "agent",
+        toner_level=values.get("toner_level"),
+        status=values.get("status"),
+        status_detail=values.get("status_detail"),
+    )
+
+
+def _update_returning(db: Session, printer: models.Printer, values: dict) -> dict:
+    """One round-trip write (not committed); returns the updated row as a dict."""
+    stmt = (
         update(models.Printer)
         .where(models.Printer.id == printer.id)
-        .values(fail_streak=models.Printer.fail_streak + 1, last_attempt_at=now)
+        .values(**values)
+        .execution_options(synchronize_session=False)
     )
-    db.commit()
-    db.refresh(printer)
+    if not db.get_bind().dialect.update_returning:
+        # SQLite < 3.35: plain UPDATE, then read back in the same transaction
+        db.execute(stmt)
+        db.refresh(printer)
+        return {c.name: getattr(printer, c.name) for c in models.Printer.__table__.c}
 
-    streak = int(printer.fail_streak or 0)
-    verified = printer.last_verified_at
-    window_exceeded = False
-    if verified is not None:
-        v = verified.replace(tzinfo=None) if getattr(verified, "tzinfo", None) else verified
-        window_exceeded = (now - v) > FAIL_WINDOW
-    else:
-        # Never verified: still require N failures before calling it unreachable on board
-        window_exceeded = False
+    return dict(db.execute(stmt.returning(*models.Printer.__table__.c)).mappings().one())
 
-    if streak >= FAIL_STREAK_THRESHOLD or window_exceeded:
-        printer.status = "unknown"
-        printer.status_detail = status_detail or "unreachable"
-        # Do NOT touch last_verified_at — reading is not verified
-        db.add(printer)
-        db.commit()
-        db.refresh(printer)
 
-    return printer
+def _device_reported_values(now: datetime, status: Optional[str]) -> dict:
+    """Reachable, device says offline/error — trusted immediately."""
+    return {
+        "status": status or "offline",
+        "status_detail": "device_reported",
+        "fail_streak": 0,
+        "last_attempt_at": now,
+        "last_verified_at": now,
+        "last_checked": now,
+    }
+
+
+def _success_values(
+    now: datetime,
+    status: Optional[str],
+    toner_level: Optional[int],
+    status_detail: Optional[str],
+) -> dict:
+    """Successful read. Raises ValueError for out-of-range toner."""
+    values = {
+        "status_detail": status_detail,
+        "fail_streak": 0,
+        "last_attempt_at": now,
+        "last_verified_at": now,
+        "last_checked": now,
+    }
+    if toner_level is not None or status is not None:
+        tl, st = normalize_toner_status(toner_level, status)
+        if toner_level is not None:
+            values["toner_level"] = tl
+        if st:
+            values["status"] = st
+    return values
+
+
+def _unreachable_values(now: datetime, status_detail: Optional[str]) -> dict:
+    """SET clause for one failed attempt, debounce evaluated in SQL.
+
+    SET expressions see the pre-update row, so the flip condition uses
+    fail_streak + 1 — same result as increment-then-read, without the read.
+    """
+    p = models.Printer
+    flip = or_(
+        p.fail_streak + 1 >= FAIL_STREAK_THRESHOLD,
+        and_(p.last_verified_at.isnot(None), p.last_verified_at < now - FAIL_WINDOW),
+    )
+    return {
+        "fail_streak": p.fail_streak + 1,
+        "last_attempt_at": now,
+        "status": case((flip, "unknown"), else_=p.status),
+        "status_detail": case((flip, status_detail or "unreachable"), else_=p.status_detail),
+    }
+
+
+def apply_agent_results(db: Session, reports: Sequence) -> list[Optional[str]]:
+    """
+    Batch agent ingest — same rules as apply_agent_result, one transaction.
+
+    reports are AgentReportRequest-shaped and already checked against the
+    allow-list by the caller. Successful reads go out as one executemany
+    UPDATE by primary key; failures as one conditional UPDATE ... WHERE id IN
+    per status_detail. A printer listed twice is applied in order (second
+    occurrence lands in a later wave), so streaks count every attempt.
+
+    Returns one error code (or None) per report, in input order.
+    """
+    now = _utcnow()
+    errors: list[Optional[str]] = [None] * len(reports)
+    before = fleet_counters.snapshots_by_id(db, {r.printer_id for r in reports})
+
+    waves: list[list[int]] = []
+    seen: dict[int, int] = {}
+    for i, r in enumerate(reports):
+        k = seen.get(r.printer_id, 0)
+        seen[r.printer_id] = k + 1
+        if k == len(waves):
+            waves.append([])
+        waves[k].append(i)
+
+    readings: list[dict] = []
+    for n, wave in enumerate(waves):
+        # History is keyed (printer_id, ts): later waves of the same printer get a
+        # microsecond offset so repeated reports in one batch are all kept
+        ts = now + timedelta(microseconds=n)
+        rows = []
+        supplies: dict[int, Sequence] = {}
+        failed: dict[Optional[str], list[int]] = {}
+        for i in wave:
+            r = reports[i]
+            if not r.ok:
+                failed.setdefault(r.status_detail, []).append(r.printer_id)
+                readings.append(_agent_reading(r.printer_id, ts, False, {}, r.status_detail))
+                continue
+            if r.status_detail == "device_reported":
+                values = _device_reported_values(now, r.status)
+            else:
+                try:
+                    values = _success_values(now, r.status, r.toner_level, r.status_detail)
+                except ValueError:
+                    errors[i] = "invalid_toner_level"
+                    continue
+            rows.append({"id": r.printer_id, **values})
+            readings.append(_agent_reading(r.printer_id, ts, True, values, r.status_detail))
+            if getattr(r, "supplies", None) is not None:
+                supplies[r.printer_id] = r.supplies
+
+        if rows:
+            db.execute(update(models.Printer), rows)
+        stage_supplies(db, supplies, now)
+        for detail, ids in failed.items():
+            db.execute(
+                update(models.Printer)
+                .where(models.Printer.id.in_(ids))
+                .values(**_unreachable_values(now, detail))
+                .execution_options(synchronize_session=False)
+            )
+
+    # One set-based pass over everything touched, now that the rows hold new values
+    touched = {reports[i].printer_id for i in range(len(reports)) if not errors[i]}
+    refresh_materialized_status(db, touched, now)
+    after = printer_changes.rows_by_id(db, touched)
+    printer_changes.stage_changes(db, ((pid, before.get(pid), row) for pid, row in after.items()))
+    stage_readings(db, readings)
+    db.commit()
+    return errors
 
 
 def effective_status(printer: models.Printer) -> str:
@@ -207,32 +414,152 @@ def effective_status(printer: models.Printer) -> str:
     return "unknown"
 
 
-def serialize_status_fields(printer: models.Printer) -> dict:
-    verified = getattr(printer, "last_verified_at", None) or printer.last_checked
-    attempt = getattr(printer, "last_attempt_at", None)
-    days = _days_since(verified)
-    stale = bool(days is not None and days > STALE_AFTER_DAYS)
-    eff = effective_status(printer)
+def _column_or_value(values: Optional[dict], name: str):
+    """Column expression, or the value being written to it (so SET sees new values)."""
+    column = getattr(models.Printer, name)
+    if not values or name not in values:
+        return column
+    value = values[name]
+    return value if isinstance(value, ClauseElement) else literal(value, type_=column.type)
+
+
+def effective_status_expr(now: Optional[datetime] = None, values: Optional[dict] = None):
+    """
+    effective_status() as a SQL CASE. With `values` (a SET clause being built)
+    the CASE is evaluated over the values being written instead of the
+    pre-update row, so it can ride along in the same UPDATE.
+    """
+    col = lambda name: _column_or_value(values, name)  # noqa: E731
+    now = now or _utcnow()
+    verified = func.coalesce(col("last_verified_at"), col("last_checked"))
+    raw = func.lower(func.coalesce(col("status"), "unknown"))
+    toner = col("toner_level")
+    return case(
+        (verified < now - timedelta(days=STALE_AFTER_DAYS), "unknown"),
+        (and_(col("status_detail") == "unreachable", col("fail_streak") >= FAIL_STREAK_THRESHOLD), "unknown"),
+        (and_(toner.isnot(None), toner <= LOW_TONER_THRESHOLD, verified.isnot(None)), "low"),
+        (raw == "ok", "online"),
+        (raw.in_(["low", "offline", "online", "unknown"]), raw),
+        else_="unknown",
+    )
+
+
+def stale_expr(now: Optional[datetime] = None, values: Optional[dict] = None):
+    """serialize_status_fields()["stale"] as SQL (never-verified rows are not stale)."""
+    col = lambda name: _column_or_value(values, name)  # noqa: E731
+    now = now or _utcnow()
+    verified = func.coalesce(col("last_verified_at"), col("last_checked"))
+    return case((verified < now - timedelta(days=STALE_AFTER_DAYS), True), else_=False)
 
-    detail = getattr(printer, "status_detail", None)
+
+def _with_materialized(now: datetime, values: dict) -> dict:
+    """Add effective_status/is_stale, computed from the new values, to a SET clause."""
+    return {
+        **values,
+        "effective_status": effective_status_expr(now, values),
+        "is_stale": stale_expr(now, values),
+    }
+
+
+def materialize_status(printer: models.Printer) -> None:
+    """ORM write paths: refresh the stored effective status from the object."""
+    printer.effective_status = effective_status(printer)
+    days = _days_since(getattr(printer, "last_verified_at", None) or printer.last_checked)
+    printer.is_stale = bool(days is not None and days > STALE_AFTER_DAYS)
+
+
+def refresh_materialized_status(db: Session, printer_ids, now: Optional[datetime] = None) -> None:
+    """Recompute stored effective status (and bump the row version) for rows already updated in this transaction."""
+    ids = list(printer_ids)
+    if not ids:
+        return
+    db.execute(
+        update(models.Printer)
+        .where(models.Printer.id.in_(ids))
+        .values(
+            effective_status=effective_status_expr(now),
+            is_stale=stale_expr(now),
+            version=models.Printer.version + 1,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def sweep_stale(db: Session, now: Optional[datetime] = None) -> int:
+    """
+    Maintenance job: flip rows whose last verification just aged past
+    STALE_AFTER_DAYS. Stale always displays as unknown (first CASE branch).
+    """
+    now = now or _utcnow()
+    p = models.Printer
+    verified = func.coalesce(p.last_verified_at, p.last_checked)
+    due = [
+        r.id for r in db.query(p.id).filter(
+            p.is_stale.is_(False), verified < now - timedelta(days=STALE_AFTER_DAYS)
+        )
+    ]
+    if not due:
+        return 0
+    before = fleet_counters.snapshots_by_id(db, due)
+    db.execute(
+        update(p)
+        .where(p.id.in_(due))
+        .values(is_stale=True, effective_status="unknown", version=p.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    after = printer_changes.rows_by_id(db, due)
+    printer_changes.stage_changes(db, ((pid, before.get(pid), row) for pid, row in after.items()))
+    db.commit()
+    return len(due)
+
+
+_PRINTER_COLUMNS = frozenset(a.key for a in models.Printer.__mapper__.column_attrs)
+
+
+def loaded_values(printer: models.Printer) -> dict:
+    """
+    The instance's loaded column values: plain dict reads instead of one ORM
+    descriptor call per field, the hot spot when serializing whole pages.
+    Falls back to attribute access if anything is expired or deferred.
+    """
+    d = printer.__dict__
+    if _PRINTER_COLUMNS <= d.keys():
+        return d
+    return {k: getattr(printer, k) for k in _PRINTER_COLUMNS}
+
+
+def serialize_status_fields(printer: models.Printer, now: Optional[datetime] = None) -> dict:
+    """List pages pass one `now` for every row (and one clock read for the page)."""
+    d = loaded_values(printer)
+    verified = d["last_verified_at"] or d["last_checked"]
+    attempt = d["last_attempt_at"]
+    toner = d["toner_level"]
+    raw = d["status"] or "unknown"
+    days = _days_since(verified, now)
+    # Staleness is judged live: the stored is_stale only flips on the next sweep.
+    # Everything else in the stored effective_status changes only on writes.
+    stale = days is not None and days > STALE_AFTER_DAYS
+    eff = "unknown" if stale else (d["effective_status"] or effective_status(printer))
+
+    verified_iso = verified.isoformat() if verified is not None and hasattr(verified, "isoformat") else None
     age_note = None
-    if verified is None and printer.toner_level is None and (printer.status or "unknown") == "unknown":
+    if verified is None and toner is None and raw == "unknown":
         age_note = "Never verified"
-    elif stale and printer.toner_level is not None:
-        age_note = f"Unknown — last reported {printer.toner_level}%, {int(days)} days ago"
+    elif stale and toner is not None:
+        age_note = f"Unknown — last reported {toner}%, {int(days)} days ago"
     elif stale:
         age_note = f"Unknown — last verified {int(days)} days ago"
 
     return {
         "status": eff,
-        "status_raw": printer.status or "unknown",
-        "status_detail": detail,
-        "toner_level": printer.toner_level,
-        "last_checked": verified.isoformat() if verified is not None and hasattr(verified, "isoformat") else None,
-        "last_verified_at": verified.isoformat() if verified is not None and hasattr(verified, "isoformat") else None,
+        "status_raw": raw,
+        "status_detail": d["status_detail"],
+        "toner_level": toner,
+        "last_checked": verified_iso,
+        "last_verified_at": verified_iso,
         "last_attempt_at": attempt.isoformat() if attempt is not None and hasattr(attempt, "isoformat") else None,
         "days_since_update": None if days is None else round(days, 1),
         "stale": stale,
-        "fail_streak": int(getattr(printer, "fail_streak", 0) or 0),
+        "fail_streak": int(d["fail_streak"] or 0),
         "status_note": age_note,
     }
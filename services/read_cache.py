@@ -0,0 +1,198 @@
+"""
+Per-worker cache of encoded printer list pages and detail bodies.
+
+Entries are stored under a tag (the fleet version, or a printer's row
+version, plus the ETag epoch); a lookup with a different tag misses. Misses
+are single-flight: concurrent identical requests wait for the one build
+instead of each querying.
+
+Knowing the current fleet version without a query is what makes a hit a pure
+memory lookup (and what wakes services.printer_events, via subscribe()):
+
+  - commits in this worker feed it directly (after_commit)
+  - on Postgres, a listener thread LISTENs on printer_changes.NOTIFY_CHANNEL;
+    writers pg_notify the new version inside their transaction, so other
+    workers hear it as the write commits. The listener also re-reads the
+    version every LISTEN_CHECK_SECONDS, which doubles as its health check
+  - otherwise (SQLite, or the listener is down) every lookup first reads the
+    fleet_version row — one primary-key read, still no printers table
+"""
+from __future__ import annotations
+
+import logging
+import select
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from services import printer_changes
+
+logger = logging.getLogger(__name__)
+
+# Pilot knobs
+MAX_ENTRIES = 512
+LISTEN_CHECK_SECONDS = 5.0
+LISTEN_RETRY_SECONDS = 5.0
+
+
+class _Flight:
+    """One in-progress build; followers block until the leader finishes."""
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._value: Any = None
+        self._error: Optional[BaseException] = None
+
+    def finish(self, value: Any = None, error: Optional[BaseException] = None) -> None:
+        self._value, self._error = value, error
+        self._done.set()
+
+    def wait(self) -> Any:
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class ReadCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[Hashable, tuple[Hashable, Any]] = OrderedDict()
+        self._flights: dict[tuple, _Flight] = {}
+        self._version = 0
+        self._subscribers: list[Callable[[int], None]] = []
+        self._listening = False
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # ------------------------- fleet version ---------------------------
+
+    def observe(self, version: int) -> None:
+        with self._lock:
+            if version <= self._version:
+                return
+            self._version = version
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            callback(version)
+
+    def subscribe(self, callback: Callable[[int], None]) -> None:
+        """callback(version) on every newer fleet version heard (from any thread; keep it cheap)."""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def fleet_version(self, db: Session) -> int:
+        """Current fleet version: from memory while the listener is healthy."""
+        if self._listening:
+            return self._version
+        version = printer_changes.fleet_version(db)
+        self.observe(version)
+        return version
+
+    # ------------------------- entries ---------------------------------
+
+    def get(self, key: Hashable, tag: Hashable, build: Callable[[], Any]) -> Any:
+        """Value cached for key under tag, else build() it once for all concurrent callers."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == tag:
+                self._entries.move_to_end(key)
+                return entry[1]
+            flight = self._flights.get((key, tag))
+            leader = flight is None
+            if leader:
+                flight = self._flights[(key, tag)] = _Flight()
+        if not leader:
+            return flight.wait()
+
+        try:
+            value = build()
+        except BaseException as e:
+            with self._lock:
+                self._flights.pop((key, tag), None)
+            flight.finish(error=e)
+            raise
+        with self._lock:
+            self._flights.pop((key, tag), None)
+            self._entries[key] = (tag, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        flight.finish(value)
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    # ------------------------- Postgres listener -----------------------
+
+    def start_listener(self, engine) -> None:
+        """Postgres only; elsewhere lookups keep checking the version row."""
+        if engine.dialect.name != "postgresql" or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._listen, args=(engine,), name="read-cache-listen", daemon=True)
+        self._thread.start()
+
+    def stop_listener(self) -> None:
+        self._stop.set()
+        self._listening = False
+        self._thread = None
+
+    def _check_version(self, cur) -> None:
+        cur.execute("SELECT version FROM fleet_version WHERE id = 1")
+        row = cur.fetchone()
+        self.observe(row[0] if row else 0)
+
+    def _listen(self, engine) -> None:
+        while not self._stop.is_set():
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()  # dedicated connection, not a pool slot
+                conn = raw.driver_connection
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {printer_changes.NOTIFY_CHANNEL}")
+                # LISTEN is live before this read, so nothing after it is missed
+                self._check_version(cur)
+                self._listening = True
+                while not self._stop.is_set():
+                    if select.select([conn], [], [], LISTEN_CHECK_SECONDS) == ([], [], []):
+                        self._check_version(cur)
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        payload = conn.notifies.pop(0).payload
+                        if payload.isdigit():
+                            self.observe(int(payload))
+            except Exception:
+                logger.warning("read cache listener lost; checking versions per request", exc_info=True)
+            finally:
+                self._listening = False
+                if raw is not None:
+                    try:
+                        raw.close()
+                    except Exception:
+                        pass
+            self._stop.wait(LISTEN_RETRY_SECONDS)
+
+
+read_cache = ReadCache()
+
+
+@event.listens_for(Session, "after_commit")
+def _observe_committed(session: Session) -> None:
+    version = session.info.pop(printer_changes.COMMITTED_VERSION_KEY, None)
+    if version is not None:
+        read_cache.observe(version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_rolled_back(session: Session) -> None:
+    session.info.pop(printer_changes.COMMITTED_VERSION_KEY, None)
@@ -0,0 +1,52 @@
+"""Printer-MIB supply readings (toner per colour, drum, waste) — latest value only."""
+from __future__ import annotations
+
+from datetime import datetime
+from typing import Mapping, Sequence
+
+from sqlalchemy import delete, insert
+from sqlalchemy.orm import Session
+
+import models
+
+
+def stage_supplies(db: Session, supplies_by_printer: Mapping[int, Sequence], now: datetime) -> None:
+    """
+    Replace the supply rows of each listed printer. Does not commit — runs
+    inside the caller's status write so supplies and clocks land together.
+
+    Items are SupplyReading-shaped (index, kind, description, level_percent).
+    A repeated index within one report keeps the last reading.
+    """
+    if not supplies_by_printer:
+        return
+    rows = []
+    for printer_id, supplies in supplies_by_printer.items():
+        by_index = {s.index: s for s in supplies}
+        rows.extend(
+            {
+                "printer_id": printer_id,
+                "supply_index": s.index,
+                "kind": s.kind,
+                "description": s.description,
+                "level_percent": s.level_percent,
+                "updated_at": now,
+            }
+            for s in by_index.values()
+        )
+    db.execute(
+        delete(models.PrinterSupply).where(
+            models.PrinterSupply.printer_id.in_(list(supplies_by_printer))
+        )
+    )
+    if rows:
+        db.execute(insert(models.PrinterSupply), rows)
+
+
+def get_supplies(db: Session, printer_id: int):
+    return (
+        db.query(models.PrinterSupply)
+        .filter(models.PrinterSupply.printer_id == printer_id)
+        .order_by(models.PrinterSupply.supply_index)
+        .all()
+    )
@@ -0,0 +1,158 @@
+"""
+SNMP vendor/model profiles: which OIDs to GET for a given printer.
+
+A profile is matched on sysObjectID: the longest registered prefix wins, so
+a model family beats its vendor's enterprise entry, and an optional sysDescr
+regex narrows a prefix to the models it fits. plan() compiles a profile plus
+the device's supply rows into a GetPlan — the exact OIDs for one GET PDU and
+what each one means — so polling a known device is a single request with
+nothing speculative in it. Devices from unregistered enterprises get GENERIC
+(plain Printer-MIB and HOST-RESOURCES).
+
+Only GENERIC is registered for now: a vendor or model gets its own profile
+once it has OIDs of its own to read (register(Profile(name,
+enterprise(number, ...), extra=...))), not before — a profile with no
+extras would just be GENERIC under another name.
+
+Supply rows are not part of a profile: which prtMarkerSupplies rows a device
+has (toners, drums, waste boxes, in any order) is found by walking the table
+once, and the caller caches each row's static columns (type, description,
+max capacity) per printer, along with sysDescr and the printer name
+(utils.snmp_poll). A plan therefore reads only what changes between polls:
+status, page count, error state and prtMarkerSuppliesLevel per row.
+
+Kept free of network imports, like web_parsers: utils does the I/O.
+"""
+from __future__ import annotations
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Optional
+
+# SNMPv2-MIB
+SYS_DESCR_OID = '1.3.6.1.2.1.1.1.0'
+SYS_OBJECT_ID_OID = '1.3.6.1.2.1.1.2.0'
+
+# Printer-MIB
+PRINTER_NAME_OID = '1.3.6.1.2.1.43.5.1.1.16.1'
+PRINTER_STATUS_OID = '1.3.6.1.2.1.43.16.5.1.2.1.1'
+PRT_MARKER_LIFE_COUNT_OID = '1.3.6.1.2.1.43.10.2.1.4.1.1'  # pages, marker 1
+
+# prtMarkerSuppliesTable columns
+PRT_SUPPLY_TYPE_OID = '1.3.6.1.2.1.43.11.1.1.5'
+PRT_SUPPLY_DESCR_OID = '1.3.6.1.2.1.43.11.1.1.6'
+PRT_SUPPLY_MAX_OID = '1.3.6.1.2.1.43.11.1.1.8'
+PRT_SUPPLY_LEVEL_OID = '1.3.6.1.2.1.43.11.1.1.9'
+SUPPLY_COLUMNS = (PRT_SUPPLY_TYPE_OID, PRT_SUPPLY_DESCR_OID, PRT_SUPPLY_MAX_OID, PRT_SUPPLY_LEVEL_OID)
+
+# HOST-RESOURCES-MIB, indexed by hrDeviceIndex
+HR_DEVICE_STATUS_OID = '1.3.6.1.2.1.25.3.2.1.5'
+HR_PRINTER_STATUS_OID = '1.3.6.1.2.1.25.3.5.1.1'
+HR_PRINTER_ERROR_STATE_OID = '1.3.6.1.2.1.25.3.5.1.2'
+
+ENTERPRISES_OID = '1.3.6.1.4.1'
+
+# hrPrinterDetectedErrorState bits, most significant bit of the first octet first
+PRINTER_ERROR_BITS = (
+    "low paper", "no paper", "low toner", "no toner",
+    "door open", "jammed", "offline", "service requested",
+    "input tray missing", "output tray missing", "marker supply missing",
+    "output near full", "output full", "input tray empty", "overdue maintenance",
+)
+
+
+@dataclass(frozen=True)
+class Profile:
+    name: str
+    prefix: str                 # sysObjectID prefix; "" matches every device
+    model: str = ""             # optional sysDescr regex within that prefix
+    device_index: int = 1       # hrDeviceIndex of the printer
+    extra: tuple[tuple[str, str], ...] = ()  # (field, oid) vendor-private scalars
+
+
+@dataclass(frozen=True)
+class GetPlan:
+    profile: str
+    oids: tuple[str, ...]                                 # one GET PDU, in this order
+    scalars: tuple[tuple[str, str], ...]                  # (field, oid)
+    supplies: tuple[tuple[int, str], ...]                 # (index, level oid)
+
+
+def _scalars(profile: Profile) -> tuple[tuple[str, str], ...]:
+    dev = profile.device_index
+    return (
+        ("display", PRINTER_STATUS_OID),
+        ("page_count", PRT_MARKER_LIFE_COUNT_OID),
+        ("device_status", f"{HR_DEVICE_STATUS_OID}.{dev}"),
+        ("printer_status", f"{HR_PRINTER_STATUS_OID}.{dev}"),
+        ("error_state", f"{HR_PRINTER_ERROR_STATE_OID}.{dev}"),
+    ) + profile.extra
+
+
+PROFILES: dict[str, Profile] = {}
+_SCALARS: dict[str, tuple[tuple[str, str], ...]] = {}
+_MODEL_RE: dict[str, re.Pattern] = {}
+
+
+@lru_cache(maxsize=1024)
+def plan(name: Optional[str], supplies: tuple[int, ...] = ()) -> Optional[GetPlan]:
+    """
+    Compiled plan for a cached profile name and the device's supply indexes;
+    None if the profile is unknown (e.g. renamed since it was cached).
+    """
+    scalars = _SCALARS.get(name) if name else None
+    if scalars is None:
+        return None
+    rows = tuple((i, f"{PRT_SUPPLY_LEVEL_OID}.1.{i}") for i in supplies)
+    oids = tuple(oid for _, oid in scalars) + tuple(oid for _, oid in rows)
+    return GetPlan(name, oids, scalars, rows)
+
+
+def register(profile: Profile) -> Profile:
+    PROFILES[profile.name] = profile
+    _SCALARS[profile.name] = _scalars(profile)
+    plan.cache_clear()
+    if profile.model:
+        _MODEL_RE[profile.name] = re.compile(profile.model, re.I)
+    return profile
+
+
+def enterprise(number: int, *arcs: int) -> str:
+    return ".".join([ENTERPRISES_OID, str(number), *map(str, arcs)])
+
+
+GENERIC = register(Profile("generic", ""))
+
+
+def _under(oid: str, prefix: str) -> bool:
+    return not prefix or oid == prefix or oid.startswith(prefix + ".")
+
+
+def detect(sys_object_id: Optional[str], sys_descr: str = "") -> Profile:
+    """Most specific profile for a device: longest prefix, then a matching model regex."""
+    oid = (sys_object_id or "").lstrip(".")
+    best, best_key = GENERIC, (-1, False)
+    for profile in PROFILES.values():
+        if not _under(oid, profile.prefix):
+            continue
+        if profile.model and not _MODEL_RE[profile.name].search(sys_descr or ""):
+            continue
+        key = (len(profile.prefix), bool(profile.model))
+        if key > best_key:
+            best, best_key = profile, key
+    return best
+
+
+def printer_errors(error_state) -> list[str]:
+    """hrPrinterDetectedErrorState octets -> the conditions that are set."""
+    try:
+        data = error_state.asOctets() if hasattr(error_state, "asOctets") else bytes(error_state)
+    except (TypeError, ValueError):
+        return []
+    errors = []
+    for bit, label in enumerate(PRINTER_ERROR_BITS):
+        octet = bit // 8
+        if octet < len(data) and data[octet] & (0x80 >> (bit % 8)):
+            errors.append(label)
+    return errors
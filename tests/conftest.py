@@ -0,0 +1,26 @@
+import os
+import sys
+import tempfile
+
+# Modules import each other top-level (import models, crud, ...) and database
+# reads DATABASE_URL at import: set both before anything from the app loads.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+_db_dir = tempfile.mkdtemp(prefix="tonertrack-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_db_dir, 'test.db')}"
+
+import pytest  # noqa: E402
+
+from database import Base, SessionLocal, engine  # noqa: E402
+import models  # noqa: E402,F401  (registers the tables)
+
+
+@pytest.fixture
+def db():
+    Base.metadata.create_all(engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(engine)
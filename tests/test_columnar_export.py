@@ -0,0 +1,28 @@
+import io
+
+import pytest
+
+import models
+from services import columnar
+
+pa = pytest.importorskip("pyarrow")
+pq = pytest.importorskip("pyarrow.parquet")
+
+
+def test_jobs_export_with_null_printer_id(db):
+    db.add(models.Printer(id=1, name="Front desk", department="Sales", connection_mode="manual"))
+    db.add_all([
+        models.Job(printer_id=1, user="ana", document="a.pdf", pages=2),
+        models.Job(printer_id=None, user="ben", document="b.pdf", pages=1),
+    ])
+    db.commit()
+
+    for fmt in columnar.FORMATS:
+        sink = io.BytesIO()
+        assert columnar.write(db, sink, "jobs", fmt) == 2
+        sink.seek(0)
+        table = pq.read_table(sink) if fmt == "parquet" else pa.ipc.open_file(sink).read_all()
+        rows = sorted(table.to_pylist(), key=lambda r: r["id"])
+        assert [r["printer_id"] for r in rows] == [1, None]
+        assert [r["printer_name"] for r in rows] == ["Front desk", None]
+        assert [r["department"] for r in rows] == ["Sales", None]
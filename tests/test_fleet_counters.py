@@ -0,0 +1,26 @@
+
+from services import fleet_counters
+from services.fleet_counters import Snapshot
+
+
+def test_counter_rows_are_updated_in_sorted_order(db, monkeypatch):
+    touched = []
+    real_execute = db.execute
+
+    def execute(stmt, *args, **kwargs):
+        if stmt.is_dml and stmt.table.name == "fleet_counters" and stmt.is_update:
+            where = stmt.whereclause.compile(compile_kwargs={"literal_binds": True})
+            touched.append(str(where))
+        return real_execute(stmt, *args, **kwargs)
+
+    monkeypatch.setattr(db, "execute", execute)
+    online = Snapshot("online", False, "Finance", "HQ")
+    low = Snapshot("low", False, "Finance", "HQ")
+
+    fleet_counters.stage_transitions(db, [(online, low)])
+    forward = list(touched)
+    touched.clear()
+    fleet_counters.stage_transitions(db, [(low, online)])
+
+    assert forward == touched  # same rows, same lock order, either direction
+    assert len(forward) == 6  # (all, department, location) x (low, online); totals cancel
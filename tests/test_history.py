@@ -0,0 +1,19 @@
+from datetime import datetime, timedelta
+
+from services.history import RAW_RETENTION_DAYS, pick_resolution
+
+NOW = datetime(2026, 6, 1, 12, 0)
+
+
+def test_short_recent_range_is_raw():
+    assert pick_resolution(NOW - timedelta(days=1), NOW, NOW) == "raw"
+
+
+def test_short_range_before_raw_retention_is_not_raw():
+    start = NOW - timedelta(days=RAW_RETENTION_DAYS + 5)
+    assert pick_resolution(start, start + timedelta(days=1), NOW) == "hour"
+
+
+def test_short_range_before_hourly_retention_is_daily():
+    start = NOW - timedelta(days=500)
+    assert pick_resolution(start, start + timedelta(hours=6), NOW) == "day"
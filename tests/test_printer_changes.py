@@ -0,0 +1,12 @@
+from services import printer_changes
+
+
+def test_empty_change_sets_do_not_bump_the_fleet_version(db):
+    printer_changes.stage_log(db, {1: False})
+    db.commit()
+    assert printer_changes.fleet_version(db) == 1
+
+    printer_changes.stage_changes(db, [])
+    assert printer_changes.stage_log(db, {}) is None
+    db.commit()
+    assert printer_changes.fleet_version(db) == 1
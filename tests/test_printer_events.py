@@ -0,0 +1,41 @@
+import json
+
+import crud
+import models
+from services.printer_events import Broadcaster
+
+
+def _worker(db):
+    """A broadcaster as another worker would run it, started at the current fleet version."""
+    b = Broadcaster()
+    b._version = b._floor = db.query(models.FleetVersion.version).scalar() or 0
+    return b
+
+
+def _frames(b, since):
+    events, dropped = b._after(since)
+    assert not dropped
+    return [(version, json.loads(data)["printers"]) for version, _, data in events]
+
+
+def test_every_worker_streams_every_write_under_fleet_version_ids(db):
+    a, b = _worker(db), _worker(db)
+    printer = models.Printer(id=1, name="Front desk", connection_mode="manual")
+    db.add(printer)
+    db.commit()
+    crud.update_printer(db, printer, {"location": "2F"})  # committed through either worker
+    for worker in (a, b):
+        worker.feed(db)
+    crud.delete_printer(db, 1)
+    for worker in (a, b):
+        worker.feed(db)
+    assert _frames(a, 0) == _frames(b, 0)
+    (v1, first), (v2, second) = _frames(b, 0)
+    assert v2 > v1 == db.query(models.PrinterChange.version).filter_by(deleted=False).scalar()
+    assert first == [{**first[0], "id": 1, "location": "2F"}]
+    assert second == [{"id": 1, "deleted": True}]
+
+    # A Last-Event-ID from one worker resumes on the other
+    assert b._resume_point(str(v1)) == (v1, False)
+    assert _frames(b, v1) == [(v2, second)]
+    assert b._resume_point("ab12cd34-7")[1] is True
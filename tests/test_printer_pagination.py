@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert
+
+import crud
+import models
+
+
+def _add_printers(db, count, verified):
+    db.execute(insert(models.Printer), [
+        {
+            "id": i,
+            "name": f"Printer {i}",
+            "connection_mode": "manual",
+            "status": "online",
+            "toner_level": 50,
+            "last_verified_at": datetime(2026, 1, i) if i in verified else None,
+        }
+        for i in range(1, count + 1)
+    ])
+    db.commit()
+
+
+def _walk(db, **kwargs):
+    ids, cursor = [], None
+    for _ in range(100):
+        rows, cursor = crud.list_printers_page(db, cursor=cursor, **kwargs)
+        ids += [r.id for r in rows]
+        if cursor is None:
+            return ids
+    pytest.fail(f"pagination did not terminate: {ids[:20]}...")
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_last_verified_sort_walks_never_verified_printers(db, descending):
+    _add_printers(db, 13, verified={11, 12, 13})
+
+    ids = _walk(db, limit=3, sort="last_verified_at", descending=descending)
+
+    expected = list(range(1, 14))  # never verified first (by id), then by verification time
+    assert ids == (expected[::-1] if descending else expected)
+
+
+@pytest.mark.parametrize("sort", ["id", "name", "toner_level"])
+def test_every_page_is_visited_once(db, sort):
+    _add_printers(db, 10, verified=set())
+
+    assert sorted(_walk(db, limit=4, sort=sort)) == list(range(1, 11))
@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+
+import models
+from services.printer_status import STALE_AFTER_DAYS, serialize_status_fields
+
+
+def test_just_stale_printer_renders_unknown_before_the_sweep(db):
+    now = datetime(2026, 6, 1, 12, 0)
+    verified = now - timedelta(days=STALE_AFTER_DAYS, hours=1)
+    # Materialized columns as the last write left them: fresh and online
+    db.add(models.Printer(
+        id=1, name="Front desk", connection_mode="manual", status="ok", toner_level=60,
+        last_verified_at=verified, effective_status="online", is_stale=False,
+    ))
+    db.commit()
+
+    fields = serialize_status_fields(db.get(models.Printer, 1), now)
+    assert fields["stale"] is True
+    assert fields["status"] == "unknown"
+    assert fields["status_note"].startswith("Unknown — last reported 60%")
+
+    fresh = serialize_status_fields(db.get(models.Printer, 1), verified + timedelta(days=1))
+    assert fresh["stale"] is False and fresh["status"] == "online"
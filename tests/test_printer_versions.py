@@ -0,0 +1,23 @@
+import crud
+import models
+from database import SessionLocal
+from services.printer_status import apply_human_status
+
+
+def test_write_from_a_stale_object_still_gets_a_new_version(db):
+    db.add(models.Printer(id=1, name="Front desk", connection_mode="manual", version=5))
+    db.commit()
+    stale = db.get(models.Printer, 1)  # loaded at version 5
+
+    other = SessionLocal()
+    try:
+        crud.update_printer(other, other.get(models.Printer, 1), {"notes": "moved"})
+        assert other.get(models.Printer, 1).version == 6
+    finally:
+        other.close()
+
+    crud.update_printer(db, stale, {"location": "2F"})
+    assert stale.version == 7
+    apply_human_status(db, stale, status="online")
+    assert stale.version == 8
+    assert db.query(models.PrinterChange.version).count() == 3
@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from pysnmp.proto.rfc1902 import Counter32, Integer, ObjectIdentifier, OctetString
+
+import snmp_profiles as sp
+import utils
+
+# index -> (description, PrtMarkerSuppliesTypeTC, level); not 1..4, not all toner
+SUPPLIES = {
+    1: ("Black Cartridge", 21, 40),
+    2: ("Imaging Drum", 9, 80),
+    3: ("Waste Toner Box", 4, 10),
+    5: ("Cyan Cartridge", 21, 70),
+}
+
+
+class FakeDevice:
+    def __init__(self):
+        self.supplies = dict(SUPPLIES)
+        self.gets = []
+        self.walks = 0
+
+    def _values(self):
+        v = {
+            sp.SYS_DESCR_OID: OctetString("HP Color LaserJet MFP M479fdw"),
+            sp.SYS_OBJECT_ID_OID: ObjectIdentifier("1.3.6.1.4.1.11.2.3.9.1.2.53"),
+            sp.PRINTER_STATUS_OID: OctetString("Ready"),
+            sp.PRT_MARKER_LIFE_COUNT_OID: Counter32(12345),
+        }
+        for i, (descr, type_code, level) in self.supplies.items():
+            v[f"{sp.PRT_SUPPLY_DESCR_OID}.1.{i}"] = OctetString(descr)
+            v[f"{sp.PRT_SUPPLY_TYPE_OID}.1.{i}"] = Integer(type_code)
+            v[f"{sp.PRT_SUPPLY_MAX_OID}.1.{i}"] = Integer(100)
+            v[f"{sp.PRT_SUPPLY_LEVEL_OID}.1.{i}"] = Integer(level)
+        return v
+
+    async def get(self, ip, oids, community="public", timeout=None):
+        self.gets.append(tuple(oids))
+        values = self._values()
+        return {oid: values[oid] for oid in oids if oid in values}
+
+    async def get_bulk_columns(self, ip, columns, community="public", **kwargs):
+        self.walks += 1
+        values = self._values()
+        return {
+            col: {oid[len(col) + 1:]: v for oid, v in values.items() if oid.startswith(col + ".")}
+            for col in columns
+        }
+
+
+@pytest.fixture
+def device(monkeypatch):
+    fake = FakeDevice()
+    monkeypatch.setattr(utils, "_snmp_client", fake)
+    return fake
+
+
+def _poll(cached=None):
+    return asyncio.run(utils.snmp_poll("192.0.2.10", "public", cached))
+
+
+def _kinds(result):
+    return {s["index"]: s["kind"] for s in result["supplies"]}
+
+
+def _indexes(plan):
+    return [row[0] for row in plan["supplies"]]
+
+
+def test_supply_rows_are_walked_once_then_only_levels_are_read(device):
+    first = _poll()
+    assert device.walks == 1
+    assert _kinds(first) == {1: "black", 2: "drum", 3: "waste", 5: "cyan"}
+    assert first["plan"]["supplies"][0] == [1, "black", "Black Cartridge", 100]
+    assert first["page_count"] == 12345
+
+    device.gets.clear()
+    second = _poll(first["plan"])
+    assert device.walks == 1
+    assert len(device.gets) == 1  # one PDU: changing scalars plus a level per known row
+    planned = sp.plan(first["plan"]["profile"], (1, 2, 3, 5))
+    assert device.gets[0] == planned.oids
+    static = (sp.SYS_DESCR_OID, sp.PRINTER_NAME_OID, sp.PRT_SUPPLY_DESCR_OID, sp.PRT_SUPPLY_TYPE_OID, sp.PRT_SUPPLY_MAX_OID)
+    assert not [oid for oid in planned.oids if oid.startswith(static)]
+    assert second["supplies"] == first["supplies"]
+    assert second["sys_descr"] == first["sys_descr"]
+
+
+def test_vanished_supply_row_triggers_a_new_walk(device):
+    plan = _poll()["plan"]
+    del device.supplies[3]
+
+    result = _poll(plan)
+    assert _kinds(result) == {1: "black", 2: "drum", 5: "cyan"}
+    assert result["plan"]["supplies"] is None
+
+    again = _poll(result["plan"])
+    assert device.walks == 2
+    assert _indexes(again["plan"]) == [1, 2, 5]
+
+
+def test_plan_cached_in_the_old_format_is_rediscovered(device):
+    plan = _poll()["plan"]
+    old = {"profile": plan["profile"], "supplies": [1, 2, 3, 5], "walked_at": plan["walked_at"]}
+
+    result = _poll(old)
+    assert device.walks == 2
+    assert _indexes(result["plan"]) == [1, 2, 3, 5]
+    assert result["plan"]["sys_descr"] == plan["sys_descr"]
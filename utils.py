@@ -1,17 +1,22 @@
 import asyncio
+import json
 import logging
-import re
-import subprocess
-import platform
+import os
+import random
+import socket
+import struct
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 import httpx
 import nmap
-from bs4 import BeautifulSoup
 from fastapi import HTTPException
 
 from pysnmp.hlapi.asyncio import (
     getCmd,
     nextCmd,
+    bulkCmd,
     SnmpEngine,
     CommunityData,
     UdpTransportTarget,
@@ -19,6 +24,21 @@ from pysnmp.hlapi.asyncio import (
     ObjectType,
     ObjectIdentity
 )
+from pysnmp.proto.rfc1905 import NoSuchObject, NoSuchInstance, EndOfMibView
+
+import snmp_profiles
+from snmp_profiles import (
+    PRINTER_NAME_OID,
+    PRINTER_STATUS_OID,
+    PRT_SUPPLY_DESCR_OID,
+    PRT_SUPPLY_LEVEL_OID,
+    PRT_SUPPLY_MAX_OID,
+    PRT_SUPPLY_TYPE_OID,
+    SUPPLY_COLUMNS,
+    SYS_DESCR_OID,
+    SYS_OBJECT_ID_OID,
+)
+from web_parsers import parse_status
 
 try:
     import cups
@@ -55,117 +75,737 @@ async def scan_network(subnet: str):
 
 # ------------------------- SNMP HELPERS -----------------------------
 
-SYS_DESCR_OID = '1.3.6.1.2.1.1.1.0'
-PRINTER_NAME_OID = '1.3.6.1.2.1.43.5.1.1.16.1'
-PRINTER_STATUS_OID = '1.3.6.1.2.1.43.16.5.1.2.1.1'
+# Identification plan: everything is_printer_via_snmp needs, one GET PDU
+PRINTER_IDENT_OIDS = (SYS_DESCR_OID, SYS_OBJECT_ID_OID, PRINTER_NAME_OID, PRINTER_STATUS_OID)
+# Last resort for devices that answer neither Printer-MIB identification OID
+PRINTER_KEYWORDS = ("printer", "laserjet", "deskjet", "canon", "epson", "brother")
+
+
+class SnmpClient:
+    """
+    Long-lived SNMP GET client.
+
+    One SnmpEngine (and its transport dispatcher) is shared by every host;
+    transport targets are cached per (ip, timeout). All OIDs for a device go
+    out in a single GET PDU, and get_many() bounds how many devices are in
+    flight at once. The engine is bound to the running event loop and rebuilt
+    if a new loop shows up (e.g. a fresh asyncio.run in a script).
+    """
+
+    def __init__(self, concurrency: int = 64, timeout: float = 3, retries: int = 1):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self._loop = None
+        self._engine = None
+        self._sem = None
+        self._targets = {}
+
+    def _bind_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._engine = SnmpEngine()
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._targets = {}
+        return self._engine
+
+    def _target(self, ip, timeout):
+        key = (ip, timeout)
+        target = self._targets.get(key)
+        if target is None:
+            target = UdpTransportTarget((ip, 161), timeout=timeout, retries=self.retries)
+            self._targets[key] = target
+        return target
+
+    async def get(self, ip, oids, community="public", timeout=None):
+        """
+        GET every OID in one PDU. Returns {oid: value} for the OIDs the device
+        answered (noSuchObject/noSuchInstance dropped), or None on transport
+        or protocol error.
+        """
+        engine = self._bind_loop()
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            errorIndication, errorStatus, _, varBinds = await getCmd(
+                engine,
+                CommunityData(community),
+                self._target(ip, timeout),
+                ContextData(),
+                *[ObjectType(ObjectIdentity(oid)) for oid in oids],
+            )
+        except Exception:
+            return None
+        if errorIndication or errorStatus:
+            return None
+        values = {}
+        for name, value in varBinds:
+            if isinstance(value, (NoSuchObject, NoSuchInstance, EndOfMibView)):
+                continue
+            values[str(name)] = value
+        return values
+
+    async def get_bulk_columns(self, ip, columns, community="public",
+                               max_repetitions=16, max_pdus=2, timeout=None):
+        """
+        Walk whole table columns with GETBULK (all columns side by side in each
+        PDU). Returns {column: {row_suffix: value}}, or None if the first PDU
+        fails. Stops after max_pdus even if a column is not exhausted.
+        """
+        engine = self._bind_loop()
+        timeout = self.timeout if timeout is None else timeout
+        result = {col: {} for col in columns}
+        active = list(columns)
+        cursor = list(columns)
+        for pdu in range(max_pdus):
+            try:
+                errorIndication, errorStatus, _, table = await bulkCmd(
+                    engine,
+                    CommunityData(community),
+                    self._target(ip, timeout),
+                    ContextData(),
+                    0,
+                    max_repetitions,
+                    *[ObjectType(ObjectIdentity(oid)) for oid in cursor],
+                )
+            except Exception:
+                table, errorIndication = None, True
+            if errorIndication or errorStatus or not table:
+                return None if pdu == 0 else result
+
+            finished = set()
+            last = {}
+            for row in table:
+                for col, (name, value) in zip(active, row):
+                    if col in finished:
+                        continue
+                    oid = str(name)
+                    if isinstance(value, EndOfMibView) or not oid.startswith(col + "."):
+                        finished.add(col)
+                        continue
+                    result[col][oid[len(col) + 1:]] = value
+                    last[col] = oid
+            active = [col for col in active if col not in finished]
+            if not active:
+                break
+            cursor = [last.get(col, col) for col in active]
+        return result
+
+    async def get_many(self, hosts, oids, timeout=None):
+        """
+        hosts: iterable of (ip, community). Returns {ip: get() result}.
+        At most `concurrency` devices are queried at once.
+        """
+        self._bind_loop()
+        sem = self._sem
+
+        async def one(ip, community):
+            async with sem:
+                return ip, await self.get(ip, oids, community, timeout)
+
+        pairs = await asyncio.gather(*(one(ip, c) for ip, c in hosts))
+        return dict(pairs)
+
+
+_snmp_client = SnmpClient()
+
+
+def get_snmp_client() -> SnmpClient:
+    """Process-wide shared client (one engine for the whole fleet)."""
+    return _snmp_client
+
 
 async def perform_snmp_get(ip, oid, community="public", timeout=3):
+    values = await _snmp_client.get(ip, [oid], community, timeout)
+    if not values:
+        return None
+    return next(iter(values.values()))
+
+async def snmp_identify(ip, community="public"):
+    """
+    sysDescr, sysObjectID, printer name and console status in one PDU; None
+    if not a printer. A device is a printer if it implements the Printer-MIB
+    (else if sysDescr names one); "profile" is its snmp_profiles match.
+    """
+    values = await _snmp_client.get(ip, PRINTER_IDENT_OIDS, community)
+    if not values or SYS_DESCR_OID not in values:
+        return None
+    descr = str(values[SYS_DESCR_OID])
+    text = descr.lower()
+    has_printer_mib = PRINTER_NAME_OID in values or PRINTER_STATUS_OID in values
+    if not has_printer_mib and not any(kw in text for kw in PRINTER_KEYWORDS):
+        return None
+    object_id = str(values[SYS_OBJECT_ID_OID]) if SYS_OBJECT_ID_OID in values else None
+    return {
+        "sys_descr": text,
+        "sys_object_id": object_id,
+        "profile": snmp_profiles.detect(object_id, descr).name,
+        "name": str(values[PRINTER_NAME_OID]) if PRINTER_NAME_OID in values else None,
+        "display": str(values[PRINTER_STATUS_OID]) if PRINTER_STATUS_OID in values else None,
+    }
+
+async def is_printer_via_snmp(ip, community="public"):
+    info = await snmp_identify(ip, community)
+    return info["sys_descr"] if info else None
+
+# ---------------------- PRINTER-MIB SUPPLIES -------------------------
+
+# PrtMarkerSuppliesTypeTC values
+_WASTE_TYPES = {4, 8, 14}  # wasteToner, wasteInk, wasteWax
+_DRUM_TYPES = {9}          # opc
+_TONER_TYPES = {3, 5, 6, 21}  # toner, ink, inkCartridge, tonerCartridge
+
+
+def classify_supply(description: str, type_code) -> str:
+    """black | cyan | magenta | yellow | drum | waste | other"""
+    d = (description or "").lower()
+    if type_code in _WASTE_TYPES or "waste" in d:
+        return "waste"
+    if type_code in _DRUM_TYPES or "drum" in d:
+        return "drum"
+    for color in ("black", "cyan", "magenta", "yellow"):
+        if color in d:
+            return color
+    if type_code in _TONER_TYPES and "color" not in d and "colour" not in d:
+        # Mono devices often describe the cartridge without a colour name
+        return "black"
+    return "other"
+
+
+def supply_percent(level, max_capacity):
+    """Percent remaining; None for the MIB's unknown/some-remaining sentinels (< 0)."""
     try:
-        errorIndication, errorStatus, _, varBinds = await getCmd(
-            SnmpEngine(),
-            CommunityData(community),
-            UdpTransportTarget((ip, 161), timeout=timeout, retries=1),
-            ContextData(),
-            ObjectType(ObjectIdentity(oid))
+        level, max_capacity = int(level), int(max_capacity)
+    except (TypeError, ValueError):
+        return None
+    if level < 0 or max_capacity <= 0:
+        return None
+    return max(0, min(100, round(level * 100 / max_capacity)))
+
+
+async def collect_supplies(ip, community="public"):
+    """
+    Read the Printer-MIB supplies table with GETBULK (one or two PDUs for
+    typical 5–10 supply devices). Returns [{"index", "kind", "description",
+    "level_percent"}], or None if the device did not answer.
+    """
+    walked = await _walk_supplies(ip, community)
+    if walked is None:
+        return None
+    return [_supply(row, level) for row, level in walked]
+
+
+async def _walk_supplies(ip, community="public"):
+    """[(static row, level)] per supplies table row (see _supply_row), or None."""
+    table = await _snmp_client.get_bulk_columns(ip, SUPPLY_COLUMNS, community)
+    if table is None:
+        return None
+    return [
+        (
+            _supply_row(
+                int(suffix.split(".")[-1]),
+                descr,
+                table[PRT_SUPPLY_TYPE_OID].get(suffix),
+                table[PRT_SUPPLY_MAX_OID].get(suffix),
+            ),
+            table[PRT_SUPPLY_LEVEL_OID].get(suffix),
         )
-        if errorIndication or errorStatus:
+        for suffix, descr in table[PRT_SUPPLY_DESCR_OID].items()
+    ]
+
+
+def _supply_row(index, descr, type_val, max_capacity) -> list:
+    """The columns that do not change between polls: [index, kind, description, max]."""
+    description = str(descr).strip()
+    type_code = int(type_val) if type_val is not None else None
+    try:
+        max_capacity = int(max_capacity)
+    except (TypeError, ValueError):
+        max_capacity = None
+    return [index, classify_supply(description, type_code), description, max_capacity]
+
+
+def _supply(row, level) -> dict:
+    index, kind, description, max_capacity = row
+    return {
+        "index": index,
+        "kind": kind,
+        "description": description,
+        "level_percent": supply_percent(level, max_capacity),
+    }
+
+
+def _cached_rows(rows):
+    """Static supply rows from a cached plan; None if absent or in an older format."""
+    if not isinstance(rows, list) or not all(isinstance(r, list) and len(r) == 4 for r in rows):
+        return None
+    return rows
+
+
+SUPPLY_REWALK_SECONDS = 86400  # re-discover supply rows daily (a drum or waste box added)
+
+
+async def snmp_poll(ip, community="public", cached=None):
+    """
+    Status through the device's snmp_profiles GetPlan. cached is the "plan"
+    a previous poll returned ({"profile", "sys_descr", "name", "supplies",
+    "walked_at"}, supplies holding each row's static columns): with it, one
+    GET PDU reads the changing scalars and prtMarkerSuppliesLevel of every
+    known row, nothing else. Without it, or when discovery is due (daily),
+    the device is identified and its supplies table walked once (GETBULK),
+    and the GET carries the scalars only; a vanished row triggers a new walk
+    on the next poll. Returns the snmp_identify fields plus page_count,
+    errors, supplies (None if unread) and plan, or None.
+    """
+    cached = cached if isinstance(cached, dict) else {}
+    profile, rows = cached.get("profile"), _cached_rows(cached.get("supplies"))
+    identity = {"sys_descr": cached.get("sys_descr"), "name": cached.get("name")}
+    walked_at = cached.get("walked_at", 0)
+    now = time.time()
+    due = now - walked_at >= SUPPLY_REWALK_SECONDS
+    if due or snmp_profiles.plan(profile) is None or identity["sys_descr"] is None:
+        info = await snmp_identify(ip, community)
+        if not info:
             return None
-        return varBinds[0][1] if varBinds else None
-    except Exception:
+        profile = info["profile"]
+        identity = {"sys_descr": info["sys_descr"], "name": info["name"]}
+
+    supplies = None
+    if rows is None or due:
+        walked = await _walk_supplies(ip, community)
+        if walked is not None:
+            rows, walked_at = sorted((row for row, _ in walked), key=lambda row: row[0]), now
+            supplies = [_supply(row, level) for row, level in walked]
+    plan = snmp_profiles.plan(profile, () if supplies is not None or rows is None else tuple(r[0] for r in rows))
+
+    values = await _snmp_client.get(ip, plan.oids, community)
+    if not values:
         return None
+    if supplies is None and rows is not None:
+        supplies = [
+            _supply(row, values[level]) for row, (_, level) in zip(rows, plan.supplies) if level in values
+        ]
+        if len(supplies) < len(rows):
+            rows = None  # a row went away: walk again next poll
 
-async def is_printer_via_snmp(ip, community="public"):
-    sys_descr = await perform_snmp_get(ip, SYS_DESCR_OID, community)
-    if sys_descr:
-        text = str(sys_descr).lower()
-        for kw in ["printer", "laserjet", "deskjet", "canon", "epson", "brother"]:
-            if kw in text:
-                return text
-    return None
+    fields = {field: values.get(oid) for field, oid in plan.scalars}
+    page_count = fields.pop("page_count")
+    error_state = fields.pop("error_state")
+    result = {field: str(v) if v is not None else None for field, v in fields.items()}
+    result.update(
+        identity,
+        profile=profile,
+        page_count=int(page_count) if page_count is not None else None,
+        errors=snmp_profiles.printer_errors(error_state) if error_state is not None else [],
+        supplies=supplies,
+        plan={"profile": profile, **identity, "supplies": rows, "walked_at": walked_at},
+    )
+    return result
 
 # ----------------------- PING MODE ------------------------------
 
-async def is_device_online(ip: str) -> bool:
+LIVENESS_TCP_PORTS = (9100, 80, 443, 161)  # raw print, web UI, web UI (TLS), SNMP host
+
+
+def _icmp_checksum(data: bytes) -> int:
+    if len(data) % 2:
+        data += b"\0"
+    total = sum(struct.unpack(f"!{len(data) // 2}H", data))
+    total = (total >> 16) + (total & 0xFFFF)
+    total += total >> 16
+    return ~total & 0xFFFF
+
+
+def _icmp_echo(seq: int) -> bytes:
+    # Identifier 0: on ping (datagram) sockets the kernel substitutes its own
+    header = struct.pack("!BBHHH", 8, 0, 0, 0, seq)
+    payload = b"tonertrack"
+    return struct.pack("!BBHHH", 8, 0, _icmp_checksum(header + payload), 0, seq) + payload
+
+
+class LivenessProber:
     """
-    Simple async ping check to confirm if device is reachable.
+    Reachability for many hosts from one event loop — no subprocesses.
+
+    Per host, a TCP connect to each of `ports` (an accept or a refusal both
+    prove the host is up) races an ICMP echo sent over an unprivileged ping
+    socket when the OS allows one (Linux net.ipv4.ping_group_range, macOS);
+    otherwise TCP alone. Each host gets its own `timeout` deadline from when
+    its turn starts, and at most `concurrency` hosts are in flight, so a
+    whole allow-list resolves in about one timeout.
     """
-    param = "-n" if platform.system().lower() == "windows" else "-c"
-    cmd = ["ping", param, "1", "-W", "2", ip]
 
-    loop = asyncio.get_running_loop()
-    try:
-        result = await loop.run_in_executor(None, subprocess.run, cmd, capture_output := True)
-        return result.returncode == 0
-    except Exception:
-        return False
+    def __init__(self, ports=LIVENESS_TCP_PORTS, timeout: float = 2.0, concurrency: int = 128):
+        self.ports = tuple(ports)
+        self.timeout = timeout
+        self.concurrency = concurrency
+
+    async def is_online(self, ip: str) -> bool:
+        return (await self.probe_many([ip]))[ip]
+
+    async def probe_many(self, ips) -> dict:
+        """{ip: reachable} for every ip given."""
+        loop = asyncio.get_running_loop()
+        alive = {ip: loop.create_future() for ip in dict.fromkeys(ips)}
+        if not alive:
+            return {}
+        sock = self._icmp_socket()
+        sweep = asyncio.create_task(self._icmp_sweep(sock, alive)) if sock else None
+        sem = asyncio.Semaphore(self.concurrency)
+        try:
+            await asyncio.gather(*(self._probe_host(ip, fut, sem, sock is not None) for ip, fut in alive.items()))
+        finally:
+            if sweep:
+                sweep.cancel()
+        return {ip: fut.done() and not fut.cancelled() and fut.result() for ip, fut in alive.items()}
+
+    async def _probe_host(self, ip: str, fut: asyncio.Future, sem: asyncio.Semaphore, icmp: bool) -> None:
+        async with sem:
+            if fut.done():  # ICMP answered while this host was queued
+                return
+            tasks = [asyncio.create_task(self._connect(ip, port)) for port in self.ports]
+            pending = {*tasks, fut}
+            deadline = asyncio.get_running_loop().time() + self.timeout
+            try:
+                while not fut.done():
+                    remaining = deadline - asyncio.get_running_loop().time()
+                    if remaining <= 0 or (pending == {fut} and not icmp):
+                        break  # out of time, or every port failed and no echo is coming
+                    done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+                    if any(t is not fut and t.result() for t in done):
+                        fut.set_result(True)
+            finally:
+                for t in tasks:
+                    t.cancel()
+                if not fut.done():
+                    fut.set_result(False)
+
+    async def _connect(self, ip: str, port: int) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), self.timeout)
+        except ConnectionRefusedError:
+            return True  # RST: something answered
+        except (OSError, asyncio.TimeoutError):
+            return False
+        writer.close()
+        return True
+
+    @staticmethod
+    def _icmp_socket():
+        try:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+        except OSError:
+            return None  # ping sockets not permitted here; TCP only
+        sock.setblocking(False)
+        return sock
+
+    async def _icmp_sweep(self, sock: socket.socket, alive: dict) -> None:
+        """Echo every IPv4 host once over one ping socket; resolve futures as replies arrive."""
+        loop = asyncio.get_running_loop()
+        try:
+            for seq, ip in enumerate(alive, 1):
+                try:
+                    sock.sendto(_icmp_echo(seq & 0xFFFF), (ip, 0))
+                except OSError:
+                    continue  # hostname/IPv6 or unroutable: TCP decides
+            while not all(f.done() for f in alive.values()):
+                data, (src, _) = await loop.sock_recvfrom(sock, 2048)
+                if data and data[0] >> 4 == 4:  # macOS delivers the IP header too
+                    data = data[(data[0] & 0x0F) * 4:]
+                fut = alive.get(src)
+                if data[:1] == b"\0" and fut is not None and not fut.done():  # type 0: echo reply
+                    fut.set_result(True)
+        finally:
+            sock.close()
+
+
+_liveness_prober = LivenessProber()
+
+
+def get_liveness_prober() -> LivenessProber:
+    """Process-wide prober (ping mode and the probe fallback chain)."""
+    return _liveness_prober
+
+
+async def is_device_online(ip: str) -> bool:
+    """Async reachability check for one device (TCP connect / ICMP, no subprocess)."""
+    return await _liveness_prober.is_online(ip)
 
 # ---------------------- WEB SCRAPING MODE ---------------------------
 
-async def get_status_via_web(ip: str):
-    async with httpx.AsyncClient(verify=False, timeout=10) as client:
-        for proto in ["https", "http"]:
-            for port in ["", ":443", ":80"]:
-                if proto == "https" and port == ":80": continue
-                if proto == "http" and port == ":443": continue
+WEB_SCHEMES = ("https", "http")  # explicit :443 / :80 are the same URLs
+
+
+class WebClient:
+    """
+    Shared printer web UI scraper.
+
+    One pooled httpx.AsyncClient for every host (rebuilt if a new event loop
+    shows up, like SnmpClient). The https and http candidates are fetched
+    concurrently; the first page that parses to toner levels or errors wins
+    and the other request is cancelled, so a dead UI costs one timeout, not
+    one per candidate. Parsing (web_parsers.parse_status: vendor parser, then
+    generic selectors) runs in a process pool so a heavy page never blocks
+    the event loop.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 10,
+        connect_timeout: float = 3,
+        max_connections: int = 64,
+        parse_workers: int | None = None,
+    ):
+        self.timeout = httpx.Timeout(timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.parse_workers = parse_workers or min(4, os.cpu_count() or 1)
+        self._loop = None
+        self._client = None
+        self._executor = None
 
-                url = f"{proto}://{ip}{port}"
+    def _bind_loop(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._client = httpx.AsyncClient(
+                verify=False, timeout=self.timeout, limits=self.limits, follow_redirects=True,
+            )
+        return self._client
+
+    def _parse_pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.parse_workers)
+        return self._executor
+
+    async def _parse(self, html: str, server: str):
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._parse_pool(), parse_status, html, server)
+        except BrokenProcessPool:
+            self._executor = None  # a worker died; next page gets a fresh pool
+            raise
+
+    async def _fetch(self, client: httpx.AsyncClient, ip: str, scheme: str):
+        url = f"{scheme}://{ip}"
+        response = await client.get(url)
+        response.raise_for_status()
+        vendor, levels, errors = await self._parse(response.text, response.headers.get("server", ""))
+        if not (levels or errors):
+            raise ValueError(f"no status on {url}")
+        logger.debug("web status %s via %s parser", url, vendor or "generic")
+        return scheme, (levels, errors)
+
+    async def probe(self, ip: str, schemes=WEB_SCHEMES):
+        """(winning scheme, ({index: percent}, [error strings])) from the first candidate that has them."""
+        client = self._bind_loop()
+        tasks = [asyncio.create_task(self._fetch(client, ip, scheme)) for scheme in schemes]
+        try:
+            for done in asyncio.as_completed(tasks):
                 try:
-                    response = await client.get(url, follow_redirects=True)
-                    response.raise_for_status()
-                    soup = BeautifulSoup(response.text, "html.parser")
-
-                    toner_levels = {}
-                    errors = []
-
-                    for sel in [
-                        {'toner': 'div.tonerGauge span.level', 'error': 'div#alerts li'},
-                        {'toner': '.supply-level', 'error': '.alert-message'},
-                        {'toner': '[class*="toner"] [class*="level"]', 'error': '[class*="error"]'}
-                    ]:
-                        toner_elems = soup.select(sel['toner'])
-                        error_elems = soup.select(sel['error'])
-
-                        for e in toner_elems:
-                            match = re.search(r'(\d+)%', e.get_text())
-                            if match:
-                                toner_levels[len(toner_levels)] = int(match.group(1))
-
-                        for e in error_elems:
-                            txt = e.get_text().strip()
-                            if txt and txt not in errors:
-                                errors.append(txt)
-
-                        if toner_levels or errors:
-                            return toner_levels, errors
+                    return await done
                 except Exception:
                     continue
-    raise ValueError("No accessible web interface found")
+        finally:
+            for task in tasks:
+                task.cancel()
+        raise ValueError("No accessible web interface found")
+
+    async def get_status(self, ip: str):
+        """({index: percent}, [error strings]) from the first candidate that has them."""
+        _, result = await self.probe(ip)
+        return result
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = self._loop = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+_web_client = WebClient()
+
+
+def get_web_client() -> WebClient:
+    """Process-wide shared web scraper (one connection pool and parse pool)."""
+    return _web_client
+
+
+async def get_status_via_web(ip: str):
+    return await _web_client.get_status(ip)
+
+# ------------------- PROBE STRATEGY MEMORY --------------------------
+
+# Fallback order per connection mode
+PROBE_CHAINS = {"snmp": ("snmp", "web", "ping"), "web": ("web", "ping"), "ping": ("ping",)}
+STRATEGY_RETRY_BASE_SECONDS = 900
+STRATEGY_RETRY_MAX_SECONDS = 86400
+STRATEGY_STATE_VERSION = 1
+LATENCY_EWMA_ALPHA = 0.3
+
+
+def strategy_backoff(fail_streak: int) -> float:
+    """Seconds before a failed method is tried again, with jitter."""
+    delay = min(STRATEGY_RETRY_BASE_SECONDS * 2 ** (fail_streak - 1), STRATEGY_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+class ProbeStrategyCache:
+    """
+    Per-printer memory of which probe path works.
+
+    For each ip: the method that last succeeded, and per method the endpoint
+    that answered (SNMP profile and supply rows, web UI scheme), attempts,
+    failures, consecutive failures, a latency EWMA, the last success and
+    when a failure may be retried.
+    plan() keeps the fallback order but drops methods still backing off,
+    except the last good one, so a printer without SNMP stops paying the
+    SNMP timeout and steady-state polls cost one round-trip. Times are wall
+    clock so the state survives a restart (load() / save(), plain JSON).
+    """
+
+    def __init__(self):
+        self._entries: dict[str, dict] = {}
+
+    def _stats(self, ip: str, method: str) -> dict:
+        entry = self._entries.setdefault(ip, {"method": None, "methods": {}})
+        return entry["methods"].setdefault(method, {
+            "endpoint": None,
+            "attempts": 0,
+            "failures": 0,
+            "fail_streak": 0,
+            "latency_ms": None,
+            "last_ok": None,
+            "retry_at": 0,
+        })
+
+    def get(self, ip: str):
+        return self._entries.get(ip)
+
+    def endpoint(self, ip: str, method: str):
+        entry = self._entries.get(ip)
+        stats = entry["methods"].get(method) if entry else None
+        return stats["endpoint"] if stats else None
+
+    def plan(self, ip: str, connection_mode: str, now=None) -> list:
+        """Methods to try, in order: the chain minus those still backing off."""
+        chain = PROBE_CHAINS[connection_mode]
+        entry = self._entries.get(ip)
+        if entry is None:
+            return list(chain)
+        now = time.time() if now is None else now
+        order = [
+            m for m in chain
+            if m == entry["method"] or entry["methods"].get(m, {}).get("retry_at", 0) <= now
+        ]
+        # everything backing off and nothing ever worked: keep the cheapest check
+        return order or [chain[-1]]
+
+    def record(self, ip: str, method: str, ok: bool, latency: float, endpoint=None, now=None) -> None:
+        now = time.time() if now is None else now
+        stats = self._stats(ip, method)
+        stats["attempts"] += 1
+        if ok:
+            ms = latency * 1000
+            prev = stats["latency_ms"]
+            stats["latency_ms"] = round(ms if prev is None else prev + LATENCY_EWMA_ALPHA * (ms - prev), 1)
+            stats.update(endpoint=endpoint, fail_streak=0, last_ok=now, retry_at=0)
+            self._entries[ip]["method"] = method
+        else:
+            stats["failures"] += 1
+            stats["fail_streak"] += 1
+            stats["retry_at"] = now + strategy_backoff(stats["fail_streak"])
+
+    def load(self, path: str) -> None:
+        """Replace the cache with a saved state; a missing or unreadable file starts empty."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                state = json.load(f)
+            entries = state["printers"] if state.get("version") == STRATEGY_STATE_VERSION else {}
+        except FileNotFoundError:
+            entries = {}
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning("ignoring probe strategy state %s: %s", path, e)
+            entries = {}
+        self._entries = entries
+
+    def save(self, path: str) -> None:
+        """Write atomically (temp file + rename) so a crash never leaves half a file."""
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": STRATEGY_STATE_VERSION, "printers": self._entries}, f)
+        os.replace(tmp, path)
+
+
+_probe_strategies = ProbeStrategyCache()
+
+
+def get_probe_strategies() -> ProbeStrategyCache:
+    """Process-wide strategy memory used by get_printer_status (the agent persists it)."""
+    return _probe_strategies
 
 # --- MAIN STATUS RETRIEVAL---
 
+async def _probe_web(ip: str, pinned):
+    """Known-good scheme alone first; the full race only if it stopped answering."""
+    if pinned:
+        try:
+            return await _web_client.probe(ip, (pinned,))
+        except Exception:
+            pass
+    return await _web_client.probe(ip)
+
+
+async def _probe_method(method: str, ip: str, community: str, endpoint):
+    """(result or None if this method failed, endpoint that answered)."""
+    if method == "snmp":
+        info = await snmp_poll(ip, community, endpoint)
+        if not info:
+            return None, None
+        return {
+            "method": "snmp",
+            "status": "online",
+            "details": info["sys_descr"],
+            "name": info["name"],
+            "display": info["display"],
+            "profile": info["profile"],
+            "page_count": info["page_count"],
+            "errors": info["errors"],
+            "supplies": info["supplies"],
+        }, info["plan"]
+    if method == "web":
+        scheme, result = await _probe_web(ip, endpoint)
+        return result, scheme
+    online = await is_device_online(ip)
+    return ({"method": "ping", "status": "online"} if online else None), None
+
+
 async def get_printer_status(ip: str, connection_mode: str, community: str = "public"):
     """
-    Tries SNMP, WEB, or PING depending on connection_mode.
+    Tries SNMP, WEB, or PING depending on connection_mode, in the order the
+    probe strategy memory suggests (see ProbeStrategyCache).
     """
-    try:
-        if connection_mode == "snmp":
-            info = await is_printer_via_snmp(ip, community)
-            if info: return {"method": "snmp", "status": "online", "details": info}
-            return await get_status_via_web(ip)
-        elif connection_mode == "web":
-            return await get_status_via_web(ip)
-        elif connection_mode == "ping":
-            online = await is_device_online(ip)
-            return {"method": "ping", "status": "online" if online else "offline"}
-        else:
-            raise ValueError(f"Invalid mode: {connection_mode}")
-    except Exception as e:
-        # fallback chain
-        if connection_mode != "ping":
-            online = await is_device_online(ip)
-            if online:
-                return {"method": "ping", "status": "online", "fallback_error": str(e)}
-        raise HTTPException(status_code=500, detail=f"All methods failed: {e}")
+    if connection_mode not in PROBE_CHAINS:
+        raise HTTPException(status_code=500, detail=f"All methods failed: Invalid mode: {connection_mode}")
+    strategies = _probe_strategies
+    error = None
+    for method in strategies.plan(ip, connection_mode):
+        started = time.monotonic()
+        try:
+            result, endpoint = await _probe_method(method, ip, community, strategies.endpoint(ip, method))
+        except Exception as e:
+            result, endpoint, error = None, None, e
+        strategies.record(ip, method, result is not None, time.monotonic() - started, endpoint)
+        if result is not None:
+            if method == "ping" and error is not None:
+                result["fallback_error"] = str(error)
+            return result
+        if error is None:
+            error = ValueError("SNMP did not identify a printer" if method == "snmp" else "Device is offline")
+    if connection_mode == "ping":
+        return {"method": "ping", "status": "offline"}
+    raise HTTPException(status_code=500, detail=f"All methods failed: {error}")
 
 # ---- CUPS PRINT JOB HELPERS ---
 
@@ -0,0 +1,143 @@
+"""
+Printer web UI status-page parsers (used by utils.get_status_via_web).
+
+Kept free of network/SNMP imports: parse_status() runs in a worker process
+pool, and every worker imports this module.
+
+Each vendor parser is registered with a signature (regex over the page and
+the Server header); parse_status() tries the matching vendor first, then the
+generic selector sets. A parser returns ({index: percent}, [error strings]);
+empty means "nothing recognised here".
+"""
+from __future__ import annotations
+
+import re
+from typing import Callable, Optional
+
+from bs4 import BeautifulSoup
+
+try:
+    import lxml  # noqa: F401  (bs4 backend, several times faster than html.parser)
+    PARSER_BACKEND = "lxml"
+except ImportError:
+    PARSER_BACKEND = "html.parser"
+
+Result = tuple[dict[int, int], list[str]]
+
+_PERCENT = re.compile(r"(\d{1,3})\s*%")
+
+# name -> (signature, parser); insertion order is the detection order
+VENDOR_PARSERS: dict[str, tuple[re.Pattern, Callable[[BeautifulSoup], Result]]] = {}
+
+
+def register(name: str, signature: str):
+    def wrap(fn: Callable[[BeautifulSoup], Result]):
+        VENDOR_PARSERS[name] = (re.compile(signature, re.I), fn)
+        return fn
+    return wrap
+
+
+def _percent(text: str) -> Optional[int]:
+    m = _PERCENT.search(text)
+    if m and int(m.group(1)) <= 100:
+        return int(m.group(1))
+    return None
+
+
+def _select(soup: BeautifulSoup, toner: tuple[str, ...], error: tuple[str, ...]) -> Result:
+    levels: dict[int, int] = {}
+    errors: list[str] = []
+    for sel in toner:
+        for e in soup.select(sel):
+            pct = _percent(e.get_text())
+            if pct is not None:
+                levels[len(levels)] = pct
+    for sel in error:
+        for e in soup.select(sel):
+            txt = e.get_text().strip()
+            if txt and txt not in errors:
+                errors.append(txt)
+    return levels, errors
+
+
+def _gauges(soup: BeautifulSoup, selector: str, full_px: int) -> dict[int, int]:
+    """Bar-image gauges whose height attribute is the fill level."""
+    levels: dict[int, int] = {}
+    for img in soup.select(selector):
+        try:
+            height = int(img.get("height", ""))
+        except ValueError:
+            continue
+        levels[len(levels)] = max(0, min(100, round(height * 100 / full_px)))
+    return levels
+
+
+@register("hp", r"HP (?:Embedded Web Server|EWS)|LaserJet|OfficeJet|PageWide|hp-ews")
+def parse_hp(soup: BeautifulSoup) -> Result:
+    return _select(
+        soup,
+        toner=('[id^="SupplyPLR"]', ".SupplyPLR", ".consumable-block .plr", "div.tonerGauge span.level"),
+        error=("#MessageText", ".statusMessage", "div#alerts li"),
+    )
+
+
+@register("canon", r"Remote UI|Canon|imageRUNNER|i-SENSYS")
+def parse_canon(soup: BeautifulSoup) -> Result:
+    return _select(
+        soup,
+        toner=(".tonerRemain", "[class*='Remain'] [class*='value']", "#tonerInfo td"),
+        error=(".ErrorMessage", "#deviceStatus .error", ".alarmText"),
+    )
+
+
+# Brother / Epson draw levels as bar images; heights are out of these maxima
+BROTHER_GAUGE_PX = 56
+EPSON_GAUGE_PX = 50
+
+
+@register("brother", r"Brother")
+def parse_brother(soup: BeautifulSoup) -> Result:
+    levels, errors = _select(soup, toner=(".tonerremain + span", ".tonerLevel"), error=("#moni_data .error", ".errorMessage"))
+    return levels or _gauges(soup, "img.tonerremain", BROTHER_GAUGE_PX), errors
+
+
+@register("epson", r"EPSON|Web Config")
+def parse_epson(soup: BeautifulSoup) -> Result:
+    levels, errors = _select(soup, toner=(".ink-level", ".tank .level"), error=(".errorMessage", "#INFO_PRTINFO .error"))
+    return levels or _gauges(soup, ".tank img.color", EPSON_GAUGE_PX), errors
+
+
+_GENERIC = (
+    (("div.tonerGauge span.level",), ("div#alerts li",)),
+    ((".supply-level",), (".alert-message",)),
+    (('[class*="toner"] [class*="level"]',), ('[class*="error"]',)),
+)
+
+
+def parse_generic(soup: BeautifulSoup) -> Result:
+    """Selector sets that fit many embedded UIs; first set that finds anything wins."""
+    for toner, error in _GENERIC:
+        levels, errors = _select(soup, toner, error)
+        if levels or errors:
+            return levels, errors
+    return {}, []
+
+
+def detect_vendor(html: str, server: str = "") -> Optional[str]:
+    head = html[:4096]
+    for name, (signature, _) in VENDOR_PARSERS.items():
+        if signature.search(server) or signature.search(head):
+            return name
+    return None
+
+
+def parse_status(html: str, server: str = "") -> tuple[Optional[str], dict[int, int], list[str]]:
+    """(vendor or None, toner levels, errors). CPU-bound; safe to run in a worker process."""
+    soup = BeautifulSoup(html, PARSER_BACKEND)
+    vendor = detect_vendor(html, server)
+    if vendor:
+        levels, errors = VENDOR_PARSERS[vendor][1](soup)
+        if levels or errors:
+            return vendor, levels, errors
+    levels, errors = parse_generic(soup)
+    return None, levels, errors